@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import tempfile
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 
@@ -48,6 +51,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'main.instrumentation.ServerTimingMiddleware',  # First, so its timings cover the other middleware
+    'main.routers.ReplicaPinMiddleware',  # Routes the request's reads to a replica or the primary
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,14 +62,22 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# MessagePack is negotiated (Accept / Content-Type: application/msgpack) when msgpack is installed
+MSGPACK_ENABLED = find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
-        'rest_framework.parsers.JSONParser',
+        'main.renderers.FastJSONParser',  # orjson when installed
+    ] + (['main.renderers.MessagePackParser'] if MSGPACK_ENABLED else []),
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.renderers.FastJSONRenderer',  # orjson when installed, same output as JSONRenderer
+    ] + (['main.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []) + [
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'main.authentication.ClaimsJWTAuthentication',  # Trusts role/ownership claims until they are invalidated (main.tokens)
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
@@ -73,11 +86,53 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
 }
 
+# Raise when a view runs more queries than its declared query_budget
+ENFORCE_QUERY_BUDGETS = DEBUG
+
+# Sampled slow-request profiler (main.instrumentation): a share of requests runs under cProfile,
+# and those over the threshold log their SQL and a profile summary to `main.requests.slow`
+SLOW_REQUEST_PROFILING = os.environ.get('SLOW_REQUEST_PROFILING', '') == '1'
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', '0.01'))
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', '500'))
+
+# Per-route Prometheus metrics (main.metrics), served at /metrics. Every worker process writes its own
+# file in METRICS_DIR; point all workers on a host at one local directory. Unless DEBUG is on, scrapes
+# must send `Authorization: Bearer <METRICS_TOKEN>` or come from INTERNAL_IPS
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'volunteerapp-metrics')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+INTERNAL_IPS = list(filter(None, os.environ.get('INTERNAL_IPS', '').split(',')))
+
+# Server-Timing header with each response's phase timings and query count (main.instrumentation);
+# it tells clients how the server spends its time, so it is only on with DEBUG unless SERVER_TIMING=1
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1' if DEBUG else '') == '1'
+
+# The same timings as one `main.requests` DEBUG line per request, with REQUEST_LOG_LEVEL=DEBUG
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'main.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Seconds a worker may keep trusting token claims, or accepting a blacklisted token, after another worker changed them
+CLAIMS_SYNC_SECONDS = float(os.environ.get('CLAIMS_SYNC_SECONDS', '1'))
+BLACKLIST_SYNC_SECONDS = float(os.environ.get('BLACKLIST_SYNC_SECONDS', '1'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,                
+    'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'main.serializers.ClaimsTokenRefreshSerializer',
 }
 
 SWAGGER_SETTINGS = {
@@ -120,9 +175,61 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers run alongside the writer; IMMEDIATE takes the write lock at BEGIN,
+            # so concurrent writers queue on the busy timeout instead of failing to upgrade a read lock
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file rather than shared-cache memory, so tests running requests in threads lock like the real database
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'volunteerapp-test.sqlite3')},
     }
 }
 
+# Read replicas (main.routers): DATABASE_REPLICAS=<path>[=<weight>],... adds SQLite replicas that
+# serve the reads of GET/HEAD/OPTIONS requests, picked by weight. A client that writes reads from
+# the primary for REPLICA_PIN_SECONDS, and replicas lagging more than REPLICA_MAX_LAG_SECONDS are skipped
+# (lag is read from the cache generations on SQLite). Lists read data written less than that long ago from the primary.
+# API clients are pinned in the REPLICA_PIN_CACHE_ALIAS cache, which must be shared between processes:
+# replicas are refused with a per-process cache, so set RESPONSE_CACHE_URL along with DATABASE_REPLICAS.
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+DATABASE_REPLICA_WEIGHTS = {}
+for number, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    path, _, weight = replica.partition('=')
+    DATABASES['replica%d' % number] = dict(DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICA_WEIGHTS['replica%d' % number] = float(weight or 1)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', str(REPLICA_PIN_SECONDS)))
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', '5'))
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Set RESPONSE_CACHE_URL (e.g. redis://127.0.0.1:6379/1) to share cached
+# responses between worker processes. Cached responses are keyed on model
+# generations kept in the database (main.caching), so a per-process cache
+# is only colder, never stale.
+
+RESPONSE_CACHE_ALIAS = 'responses'
+REPLICA_PIN_CACHE_ALIAS = RESPONSE_CACHE_ALIAS
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+    },
+}
+
+if os.environ.get('RESPONSE_CACHE_URL'):
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['RESPONSE_CACHE_URL'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -165,7 +272,5 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-import os
-
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Compare sync (WSGI) and async (ASGI) throughput of the read-only list views.
+
+The sync path drives Django's WSGI handler from a thread pool; the async
+path drives the ASGI handler from one event loop. Both run in-process
+against the same seeded SQLite file, at the same concurrency.
+
+    python -m benchmarks.async_views --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import access_token, report, seed, setup_django, summarize
+
+ROUTES = [
+    'opportunities/all/',
+    'events/all/',
+    'organization/all/',
+    'organization/{org_id}/reviews/',
+    'organization/{org_id}/events/all/',
+]
+
+def run_sync(paths, token, concurrency):
+    from django.test import Client
+
+    def fetch(path):
+        start = time.perf_counter()
+        response = Client().get(path, headers={'Authorization': 'Bearer ' + token})
+        assert response.status_code == 200, (path, response.status_code)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(fetch, paths))
+    return summarize(latencies, time.perf_counter() - start)
+
+def run_async(paths, token, concurrency):
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(path):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers={'Authorization': 'Bearer ' + token})
+                assert response.status_code == 200, (path, response.status_code)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[fetch(path) for path in paths])
+        return summarize(latencies, time.perf_counter() - start)
+
+    return asyncio.run(main())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per route and mode')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--opportunities', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    volunteer, company, org_ids = seed(opportunities=args.opportunities, events=args.opportunities)
+    token = access_token(volunteer)
+
+    results = {'concurrency': args.concurrency, 'routes': {}}
+    for route in ROUTES:
+        route = route.format(org_id=org_ids[0])
+        results['routes'][route] = {
+            'wsgi': run_sync(['/api/' + route] * args.requests, token, args.concurrency),
+            'asgi': run_async(['/api/async/' + route] * args.requests, token, args.concurrency),
+        }
+    report(results)
+
+if __name__ == '__main__':
+    main()
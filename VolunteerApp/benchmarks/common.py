@@ -0,0 +1,134 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite file (never db.sqlite3) or an
+empty Postgres database, migrated from scratch and seeded with bulk inserts so no model save() hooks run.
+Run them from the VolunteerApp directory, e.g. `python -m benchmarks.async_views`.
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+from datetime import timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup_django(db_path=None, postgres=None):
+    # Point the default database at a scratch file (or an empty Postgres database) and run migrations
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'VolunteerApp.settings')
+    from django.conf import settings
+    if postgres:
+        # Host, user and password come from the usual PGHOST/PGUSER/PGPASSWORD variables
+        settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.postgresql', 'NAME': postgres}
+        db_path = postgres
+    else:
+        db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='volunteer-bench-'), 'bench.sqlite3')
+        settings.DATABASES['default']['NAME'] = db_path
+    settings.DEBUG = False
+    settings.ENFORCE_QUERY_BUDGETS = False
+    settings.ALLOWED_HOSTS = ['*']
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+def seed(organizations=10, opportunities=1000, events=1000, skills=20, volunteers=0, applications=0, reviews=0, registrations=0):
+    """
+    Insert a synthetic dataset and return (volunteer user, company user, organization ids).
+
+    `volunteers` extra users with profiles are spread over the optional
+    applications, reviews and event registrations; the rating and seat
+    aggregates are rebuilt afterwards.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.utils import timezone
+    from main import ratings, registrations as seats, search
+    from main.models import (User, userProfile, Organization, CauseArea, Skill, Opportunity, Event,
+                             Application, Review, EventRegistration)
+
+    password = make_password('bench-password')
+    volunteer = User.objects.bulk_create([User(username='bench-volunteer', email='volunteer@bench.local', is_user=True, password=password)])[0]
+    company = User.objects.bulk_create([User(username='bench-org-0', email='org0@bench.local', is_company=True, password=password)])[0]
+    userProfile.objects.bulk_create([userProfile(name='bench-volunteer', email='volunteer@bench.local', password=password, city='Pune')])
+    orgs = Organization.objects.bulk_create([
+        Organization(name='bench-org-%d' % i, password=password, email='org%d@bench.local' % i, address='%d Main Road' % i,
+                     city='Pune', postal_code='411001', country='India', phone='000', mission='Mission %d' % i,
+                     description='Description %d' % i)
+        for i in range(organizations)
+    ])
+    cause = CauseArea.objects.create(title='Environment')
+    skill_rows = Skill.objects.bulk_create([Skill(name='skill %d' % i) for i in range(skills)])
+    opps = Opportunity.objects.bulk_create([
+        Opportunity(title='Opportunity %d' % i, organization=orgs[i % organizations], opportunity_type='volunteer',
+                    start_date='2024-01-01', end_date='2024-12-31', location='Pune', cause_area=cause,
+                    description='Help the community ' * 10, requirements='None')
+        for i in range(opportunities)
+    ])
+    Opportunity.skills.through.objects.bulk_create([
+        Opportunity.skills.through(opportunity_id=opp.id, skill_id=skill_rows[(opp.id + k) % skills].id)
+        for opp in opps for k in range(3)
+    ])
+    now = timezone.now()
+    event_rows = Event.objects.bulk_create([
+        Event(title='Event %d' % i, description='Community event', date=now + timedelta(hours=i),
+              location='Pune', Organization=orgs[i % organizations])
+        for i in range(events)
+    ])
+
+    if volunteers:
+        users = User.objects.bulk_create([
+            User(username='bench-volunteer-%d' % i, email='volunteer%d@bench.local' % i, is_user=True, password=password)
+            for i in range(volunteers)
+        ])
+        profiles = userProfile.objects.bulk_create([
+            userProfile(name='bench-volunteer-%d' % i, email='volunteer%d@bench.local' % i, password=password, city='Pune')
+            for i in range(volunteers)
+        ])
+        Application.objects.bulk_create([
+            Application(user=profiles[i % volunteers], opportunity=opps[i % len(opps)],
+                        status=('pending', 'accepted', 'rejected')[i % 3])
+            for i in range(applications if opps else 0)
+        ])
+        Review.objects.bulk_create([
+            Review(user=users[i % volunteers], org=orgs[i % organizations], rating=i % 5 + 1, message='Review %d' % i)
+            for i in range(reviews)
+        ])
+        # Every volunteer registers for the earliest events, so (event, volunteer) pairs never repeat
+        EventRegistration.objects.bulk_create([
+            EventRegistration(event=event_rows[i // volunteers], user=profiles[i % volunteers])
+            for i in range(min(registrations, volunteers * len(event_rows)))
+        ])
+        ratings.rebuild_ratings()
+        seats.rebuild_registered_counts()
+    search.rebuild_index()
+    return volunteer, company, [org.id for org in orgs]
+
+def access_token(user):
+    from rest_framework_simplejwt.tokens import AccessToken
+    return str(AccessToken.for_user(user))
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies, elapsed):
+    # Latency percentiles in milliseconds plus throughput
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+def report(results):
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,71 @@
+"""
+Payload size and serialization time of full list pages against sparse ones.
+
+Fetches 100-item pages of the opportunity and organization lists with every
+field and with the fields a list card shows (`?fields=`), and reports the
+bytes, query time and the view and render time spent outside queries,
+read from the Server-Timing header.
+
+    python -m benchmarks.fieldsets --opportunities 5000 --requests 50
+"""
+import argparse
+import os
+import re
+
+from benchmarks.common import access_token, report, seed, setup_django
+
+CASES = {
+    'opportunities': ('/api/opportunities/all/?limit=100', 'id,title,location,organization,date_posted,status'),
+    'opportunities_expanded': ('/api/opportunities/all/?limit=100&expand=organization',
+                               'id,title,location,date_posted,status,organization.id,organization.name'),
+    'organizations': ('/api/organization/all/?limit=100', 'id,name,city,rating_average,rating_count'),
+}
+
+def timings(response):
+    # Server-Timing durations in milliseconds by phase
+    return {name: float(value) for name, value in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])}
+
+def measure(client, path, token, requests):
+    sizes, db, serialize = [], [], []
+    for i in range(requests):
+        # A throwaway parameter skips the response cache
+        response = client.get('%s&nocache=%d' % (path, i), HTTP_AUTHORIZATION='Bearer ' + token)
+        assert response.status_code == 200, response.content[:200]
+        phases = timings(response)
+        sizes.append(len(response.content))
+        db.append(phases.get('db', 0.0))
+        serialize.append(phases.get('view', 0.0) + phases.get('render', 0.0) - phases.get('db', 0.0))
+    return {
+        'bytes': sum(sizes) // len(sizes),
+        'db_ms': round(sum(db) / len(db), 3),
+        'serialize_render_ms': round(sum(serialize) / len(serialize), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--opportunities', type=int, default=5000)
+    parser.add_argument('--organizations', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['SERVER_TIMING'] = '1'
+    setup_django()
+    from django.test import Client
+
+    volunteer, _, _ = seed(organizations=args.organizations, opportunities=args.opportunities, events=0)
+    token = access_token(volunteer)
+    client = Client()
+    results = {}
+    for name, (path, fields) in CASES.items():
+        full = measure(client, path, token, args.requests)
+        sparse = measure(client, '%s&fields=%s' % (path, fields), token, args.requests)
+        results[name] = {
+            'full': full,
+            'sparse': sparse,
+            'bytes_ratio': round(full['bytes'] / float(sparse['bytes']), 1),
+            'serialize_ratio': round(full['serialize_render_ms'] / max(sparse['serialize_render_ms'], 1e-3), 1),
+        }
+    report(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Cost of recording request metrics, and aggregation across worker processes.
+
+Times Registry.record() and record_response() per call, then forks worker
+processes that record concurrently into a scratch METRICS_DIR and checks
+that the /metrics totals add up. Exits 1 if any count is lost.
+
+    python -m benchmarks.metrics --calls 200000 --workers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import report, setup_django
+
+ROUTES = ['all-opportunities', 'opportunity-detail', 'all-events', 'event-detail-update-delete', 'user-login']
+
+def time_calls(function, calls):
+    began = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return round((time.perf_counter() - began) / calls * 1e6, 3)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--per-worker', type=int, default=50000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    from main import metrics
+
+    directory = tempfile.mkdtemp(prefix='metrics-bench-')
+    try:
+        registry = metrics.registry
+        registry.directory = directory
+        record_us = time_calls(lambda i: registry.record(ROUTES[i % 5], 'GET', 200, 0.012, queries=3, db_seconds=0.002), args.calls)
+
+        request = RequestFactory().get('/api/opportunities/all/')
+        request.resolver_match = resolve(request.path)
+        response = HttpResponse()
+        response['X-Cache'] = 'HIT'
+        record_response_us = time_calls(lambda i: metrics.record_response(request, response, 0.012), args.calls)
+
+        shutil.rmtree(directory)
+        children = []
+        for worker in range(args.workers):
+            pid = os.fork()
+            if pid == 0:
+                for i in range(args.per_worker):
+                    registry.record(ROUTES[i % 5], 'GET', 200, 0.012, queries=1)
+                os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
+
+        began = time.perf_counter()
+        totals = metrics.collect(directory)
+        body = metrics.render(totals)
+        scrape_ms = round((time.perf_counter() - began) * 1000, 2)
+        requests = sum(value for key, value in totals.items() if key.startswith('["api_requests_total"'))
+        expected = args.workers * args.per_worker
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report({
+        'record_us': record_us,
+        'record_response_us': record_response_us,
+        'workers': args.workers,
+        'requests_recorded': int(requests),
+        'requests_expected': expected,
+        'scrape_ms': scrape_ms,
+        'scrape_bytes': len(body),
+    })
+    if requests != expected:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
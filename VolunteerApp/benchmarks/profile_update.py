@@ -0,0 +1,55 @@
+"""
+Profile-update throughput with and without hashing on every save.
+
+"legacy" submits the password with every update, so each save hashes it
+as every save of a User, userProfile or Organization used to. "tracked"
+updates the profile without a password, so save() leaves the stored hash
+alone.
+
+    python -m benchmarks.profile_update --requests 200
+"""
+import argparse
+import time
+
+from benchmarks.common import access_token, report, setup_django, summarize
+
+def create_volunteer():
+    from django.contrib.auth.hashers import make_password
+    from main.models import User, userProfile
+
+    password = make_password('bench-password')
+    user = User.objects.bulk_create([User(username='bench-profile', email='profile@bench.local', is_user=True, password=password)])[0]
+    profile = userProfile.objects.bulk_create([userProfile(name='bench-profile', email='profile@bench.local', password=password)])[0]
+    return user, profile
+
+def run(user, profile, requests, password=False):
+    from django.test import Client
+
+    client = Client()
+    headers = {'Authorization': 'Bearer ' + access_token(user)}
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        began = time.perf_counter()
+        data = {'city': 'City %d' % i}
+        if password:
+            data['password'] = 'bench-password'
+        response = client.put('/api/user/%d/' % profile.id, data, content_type='application/json', headers=headers)
+        assert response.status_code == 200, response.content
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+
+    user, profile = create_volunteer()
+    results = {'legacy': run(user, profile, args.requests, password=True), 'tracked': run(user, profile, args.requests)}
+    results['speedup'] = round(results['tracked']['throughput_rps'] / results['legacy']['throughput_rps'], 1)
+    report(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Recommendation scoring over a large in-memory opportunity matrix.
+
+Builds the matrix from synthetic opportunities (no database rows needed),
+then times top-k queries for random user vectors, with and without an
+incremental delta on top of the base matrix.
+
+    python -m benchmarks.recommendations --opportunities 1000000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import report, setup_django, summarize
+
+def synthetic_opportunities(count, skills, cause_areas, organizations, cities, rng, start=0):
+    # (id, is_open, feature keys) rows shaped like load_opportunities() output
+    for opportunity_id in range(start, start + count):
+        keys = [('cause_area', rng.randrange(cause_areas)), ('organization', rng.randrange(organizations)),
+                ('city', 'city %d' % rng.randrange(cities))]
+        keys += [('skill', skill) for skill in rng.sample(range(skills), rng.randint(1, 4))]
+        yield opportunity_id, rng.random() < 0.9, keys
+
+def random_vector(args, rng):
+    vector = {('skill', skill): rng.random() for skill in rng.sample(range(args.skills), 5)}
+    vector[('cause_area', rng.randrange(args.cause_areas))] = rng.random()
+    vector[('organization', rng.randrange(args.organizations))] = rng.random()
+    vector[('city', 'city %d' % rng.randrange(args.cities))] = 0.75
+    return vector
+
+def time_queries(matrix, args, rng):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        vector = random_vector(args, rng)
+        began = time.perf_counter()
+        matrix.top_k(vector, args.k, exclude=[rng.randrange(args.opportunities) for _ in range(10)])
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--opportunities', type=int, default=1000000)
+    parser.add_argument('--skills', type=int, default=500)
+    parser.add_argument('--cause-areas', type=int, default=30)
+    parser.add_argument('--organizations', type=int, default=5000)
+    parser.add_argument('--cities', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=40)
+    parser.add_argument('--delta', type=int, default=10000, help='Opportunities re-appended as an incremental sync')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from main.recommendations import OpportunityMatrix
+
+    rng = random.Random(args.seed)
+    shape = (args.skills, args.cause_areas, args.organizations, args.cities, rng)
+    matrix = OpportunityMatrix()
+    began = time.perf_counter()
+    matrix.build(synthetic_opportunities(args.opportunities, *shape))
+    results = {
+        'opportunities': args.opportunities,
+        'features': len(matrix.features),
+        'nonzeros': len(matrix.column_rows),
+        'build_seconds': round(time.perf_counter() - began, 2),
+        'base': time_queries(matrix, args, rng),
+    }
+    began = time.perf_counter()
+    matrix.update(synthetic_opportunities(args.delta, *shape, start=rng.randrange(args.opportunities - args.delta)))
+    results['update_seconds'] = round(time.perf_counter() - began, 2)
+    results['with_delta'] = dict(time_queries(matrix, args, rng), delta_rows=args.delta)
+    report(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrent registrations for one popular event.
+
+Many threads register distinct volunteers at once through the API, then a
+share of the registered volunteers cancel at once so the waitlist is
+promoted. The run fails (exit status 1) if the event is ever overbooked, if
+the stored count drifts from the registrations table, or if any request
+errors, e.g. on a database lock timeout.
+
+    python -m benchmarks.registration_contention --registrants 500 --capacity 100
+    python -m benchmarks.registration_contention --postgres volunteer_bench
+"""
+import argparse
+import sys
+import threading
+import time
+
+from benchmarks.common import report, setup_django, summarize
+
+def create_registrants(count):
+    # Users with a matching profile each, returned as (user, profile) pairs
+    from django.contrib.auth.hashers import make_password
+    from main.models import User, userProfile
+
+    password = make_password('bench-password')
+    users = User.objects.bulk_create([
+        User(username='bench-registrant-%d' % i, email='registrant%d@bench.local' % i, is_user=True, password=password)
+        for i in range(count)
+    ])
+    profiles = userProfile.objects.bulk_create([
+        userProfile(name='bench-registrant-%d' % i, email='registrant%d@bench.local' % i, password=password)
+        for i in range(count)
+    ])
+    return list(zip(users, profiles))
+
+def create_event(capacity):
+    from django.utils import timezone
+    from main.models import Event, Organization
+
+    org = Organization.objects.bulk_create([
+        Organization(name='bench-org', password='x', email='org@bench.local', address='1 Main Road', city='Pune',
+                     postal_code='411001', country='India', phone='000', mission='Mission', description='Description')
+    ])[0]
+    return Event.objects.create(title='Popular event', description='Limited seats', date=timezone.now(),
+                                location='Pune', Organization=org, capacity=capacity)
+
+def fire(method, event_id, tokens, threads):
+    # Send one request per token from `threads` threads released at the same instant
+    from django.db import connection
+    from django.test import Client
+
+    barrier = threading.Barrier(threads)
+    results, lock = [], threading.Lock()
+
+    def worker(share):
+        client = Client()
+        barrier.wait()
+        for token in share:
+            began = time.perf_counter()
+            response = getattr(client, method)('/api/events/%d/register' % event_id, headers={'Authorization': 'Bearer ' + token})
+            with lock:
+                results.append((response.status_code, time.perf_counter() - began))
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(tokens[i::threads],)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    statuses = {}
+    for code, _ in results:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    return dict(summarize([latency for _, latency in results], elapsed), statuses=statuses)
+
+def check_invariants(event_id, capacity):
+    from main.models import Event, EventRegistration, EventWaitlistEntry
+
+    event = Event.objects.get(id=event_id)
+    registered = EventRegistration.objects.filter(event_id=event_id).count()
+    waiting = EventWaitlistEntry.objects.filter(event_id=event_id).count()
+    return {
+        'registered_count': event.registered_count,
+        'registrations': registered,
+        'waitlisted': waiting,
+        'overbooked': registered > capacity,
+        'count_drift': registered != event.registered_count,
+        'seats_left_with_waitlist': registered < capacity and waiting > 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registrants', type=int, default=500)
+    parser.add_argument('--capacity', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--cancellations', type=int, default=25, help='Registered volunteers who cancel afterwards')
+    parser.add_argument('--postgres', metavar='DBNAME', help='Run against this empty Postgres database instead of SQLite')
+    args = parser.parse_args()
+
+    setup_django(postgres=args.postgres)
+    from django.db import connection
+    from main.models import EventRegistration
+    from main.tokens import ClaimsRefreshToken
+
+    pairs = create_registrants(args.registrants)
+    event = create_event(args.capacity)
+    tokens = {profile.id: str(ClaimsRefreshToken.for_user(user).access_token) for user, profile in pairs}
+
+    results = {'database': connection.vendor, 'registrants': args.registrants, 'capacity': args.capacity, 'threads': args.threads}
+    results['register'] = fire('post', event.id, list(tokens.values()), args.threads)
+    results['after_register'] = check_invariants(event.id, args.capacity)
+
+    cancelling = list(EventRegistration.objects.filter(event_id=event.id).values_list('user_id', flat=True)[:args.cancellations])
+    results['cancel'] = fire('delete', event.id, [tokens[profile_id] for profile_id in cancelling], args.threads)
+    results['after_cancel'] = check_invariants(event.id, args.capacity)
+
+    failed = any(
+        state['overbooked'] or state['count_drift'] or state['seats_left_with_waitlist']
+        for state in (results['after_register'], results['after_cancel'])
+    ) or any(code.startswith('5') for phase in ('register', 'cancel') for code in results[phase]['statuses'])
+    results['ok'] = not failed
+    report(results)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Serialization and rendering time per 1,000 objects.
+
+Serializes the opportunity, organization and event lists with DRF's
+ListSerializer and with FastListSerializer, then renders the result with
+JSONRenderer, FastJSONRenderer and (when msgpack is installed)
+MessagePackRenderer, reporting the best of `--repeat` runs in milliseconds
+per 1,000 objects along with the output sizes. Exits 1 if the fast paths
+produce different data or bytes.
+
+    python -m benchmarks.renderers --objects 1000 --repeat 20
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.common import report, seed, setup_django
+
+def best_ms(function, repeat, objects):
+    # Best run, scaled to milliseconds per 1,000 objects
+    runs = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - began)
+    return round(min(runs) * 1000 * 1000 / objects, 3)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.serializers import ListSerializer
+
+    from main import renderers
+    from main.models import Event, Opportunity, Organization
+    from main.serializers import event_serializer, opportunity_serializer, organization_serializer
+
+    seed(organizations=args.objects, opportunities=args.objects, events=args.objects)
+    cases = {
+        'opportunities': (opportunity_serializer, Opportunity.objects.select_related('organization').prefetch_related('skills')),
+        'organizations': (organization_serializer, Organization.objects.all()),
+        'events': (event_serializer, Event.objects.all()),
+    }
+    results, same = {}, True
+    for name, (serializer, queryset) in cases.items():
+        instances = list(queryset[:args.objects])
+        slow = ListSerializer(child=serializer(), instance=instances).data
+        fast = serializer(instances, many=True).data
+        json_bytes = JSONRenderer().render(slow)
+        same = same and fast == slow and renderers.FastJSONRenderer().render(fast) == json_bytes
+        result = {
+            'objects': len(instances),
+            'serialize_ms': best_ms(lambda: ListSerializer(child=serializer(), instance=instances).data, args.repeat, len(instances)),
+            'fast_serialize_ms': best_ms(lambda: serializer(instances, many=True).data, args.repeat, len(instances)),
+            'json_render_ms': best_ms(lambda: JSONRenderer().render(slow), args.repeat, len(instances)),
+            'fast_json_render_ms': best_ms(lambda: renderers.FastJSONRenderer().render(fast), args.repeat, len(instances)),
+            'json_bytes': len(json_bytes),
+        }
+        if renderers.msgpack is not None:
+            result['msgpack_render_ms'] = best_ms(lambda: renderers.MessagePackRenderer().render(fast), args.repeat, len(instances))
+            result['msgpack_bytes'] = len(renderers.MessagePackRenderer().render(fast))
+        result['total_speedup'] = round(
+            (result['serialize_ms'] + result['json_render_ms']) / (result['fast_serialize_ms'] + result['fast_json_render_ms']), 1)
+        results[name] = result
+    results['identical_output'] = same
+    report(results)
+    if not same:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Read-replica routing against two local SQLite files.
+
+The primary is migrated and seeded, then copied to a replica file that is
+never updated again, so a read that reaches the replica after a write sees
+stale data. Checks that safe-method reads go to the replica and writes to
+the primary, that a client reads its own writes from the primary during the
+pin window, that other clients read just-written data from the primary, that
+a replica missing a write is skipped once it lags too far and used again
+after catching up, and that replicas are picked by weight. Exits 1 if any
+check fails.
+
+    python -m benchmarks.replicas --pin-seconds 1
+"""
+import argparse
+import collections
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+from benchmarks.common import access_token, report, seed, setup_django
+
+def copy_database(source, target):
+    # Online backup, consistent even with the primary in WAL mode
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+
+def run(client, method, path, token, **kwargs):
+    # Make a request and count its queries per database alias
+    from django.db import connections
+
+    counts = collections.Counter()
+
+    def counter(alias):
+        def wrapper(execute, sql, params, many, context):
+            counts[alias] += 1
+            return execute(sql, params, many, context)
+        return wrapper
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counter(alias)))
+        response = getattr(client, method)(path, HTTP_AUTHORIZATION='Bearer ' + token, **kwargs)
+    return response, dict(counts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pin-seconds', type=int, default=1)
+    parser.add_argument('--picks', type=int, default=4000, help='Replica choices drawn for the weighting check')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='volunteer-replicas-')
+    primary, replica = os.path.join(directory, 'primary.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+    # Two aliases on the one replica file, weighted 3:1
+    os.environ['DATABASE_REPLICAS'] = '%s=3,%s=1' % (replica, replica)
+    os.environ['REPLICA_PIN_SECONDS'] = str(args.pin_seconds)
+    os.environ['REPLICA_LAG_CHECK_SECONDS'] = '0'
+    setup_django(db_path=primary)
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from main import routers
+    from django.utils import timezone
+    from main.models import CacheGeneration, Opportunity, Organization
+
+    volunteer, company, org_ids = seed(organizations=2, opportunities=50, events=10)
+    # Seeded long enough ago for every replica to have it
+    CacheGeneration.objects.update(bumped_at=timezone.now() - timedelta(minutes=10))
+    organization = Organization.objects.get(name=company.username)
+    opportunity = Opportunity.objects.filter(organization=organization).first()
+    copy_database(primary, replica)
+
+    # Pins go to a file cache, shared by worker processes on one host like RESPONSE_CACHE_URL would be
+    pins = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(directory, 'pins')}
+    override_settings(CACHES=dict(settings.CACHES, pins=pins), REPLICA_PIN_CACHE_ALIAS='pins').enable()
+
+    checks = {}
+    volunteer_token, company_token = access_token(volunteer), access_token(company)
+    client = Client(raise_request_exception=True)
+    replicas = {'replica1', 'replica2'}
+
+    response, counts = run(client, 'get', '/api/opportunities/all/', volunteer_token)
+    checks['read_goes_to_replica'] = response.status_code == 200 and bool(replicas & set(counts))
+
+    detail = '/api/organization/%d/opportunities/%d/' % (organization.id, opportunity.id)
+    response, counts = run(client, 'patch', detail, company_token, data={'title': 'Renamed'}, content_type='application/json')
+    checks['write_goes_to_primary'] = response.status_code == 200 and not replicas & set(counts)
+
+    # Drop the cookie so the pin is found through the client's credentials, as for API clients
+    client.cookies.clear()
+    response, counts = run(client, 'get', detail, company_token)
+    checks['pinned_client_reads_its_write'] = response.status_code == 200 and response.json()['title'] == 'Renamed' and not replicas & set(counts)
+
+    # Not pinned, but the write is too recent for the replica to be trusted with it
+    response, counts = run(Client(), 'get', '/api/opportunities/all/?limit=100', volunteer_token)
+    checks['other_client_reads_recent_write'] = response.status_code == 200 and b'"Renamed"' in response.content
+
+    # The replica never received the write, and now lags more than REPLICA_MAX_LAG_SECONDS
+    time.sleep(args.pin_seconds + 0.5)
+    response, counts = run(client, 'get', detail, company_token)
+    checks['lagging_replica_skipped'] = response.status_code == 200 and response.json()['title'] == 'Renamed'
+
+    copy_database(primary, replica)
+    response, counts = run(client, 'get', detail, company_token)
+    checks['caught_up_replica_used'] = (response.status_code == 200 and response.json()['title'] == 'Renamed'
+                                        and bool(replicas & set(counts)))
+
+    picks = collections.Counter(routers.choose_replica({'replica1': 3, 'replica2': 1}) for _ in range(args.picks))
+    share = picks['replica1'] / float(args.picks)
+    checks['weighted_choice'] = abs(share - 0.75) < 0.05
+
+    report({'checks': checks, 'replica1_share': round(share, 3)})
+    if not all(checks.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
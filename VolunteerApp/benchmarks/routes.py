@@ -0,0 +1,348 @@
+"""
+Latency, throughput and queries per request for every named API route.
+
+Seeds a synthetic dataset (organizations, opportunities with skills,
+volunteers with applications, reviews and event registrations, events),
+then drives each route in main/urls.py and main/async_urls.py with
+authenticated requests from a thread pool. Routes that consume what they
+touch (deletes, logouts, registrations) get a fresh target per request.
+Results are printed as JSON and can be saved as a baseline; a later run
+(or two saved files) can be compared against it, and the run fails
+(exit status 1) when a route regressed.
+
+    python -m benchmarks.routes --requests 200 --concurrency 8 --output baseline.json
+    python -m benchmarks.routes --baseline baseline.json
+    python -m benchmarks.routes --compare baseline.json current.json
+    python -m benchmarks.routes --routes opportunities events --opportunities 20000
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import report, seed, setup_django, summarize
+
+# `build(ctx, i)` returns the i-th request: {'kwargs', 'data', 'query', 'token', 'cookies'}, all optional.
+# `prepare(ctx, n)`, when set, creates what n requests will consume before the clock starts.
+Route = namedtuple('Route', 'name method role build prepare', defaults=(None,))
+
+def _signup(ctx, i):
+    name = 'bench-signup-%s-%d' % (ctx['run'], i)
+    return {'data': {'name': name, 'email': '%s@bench.local' % name, 'password': 'bench-password', 'city': 'Pune'}}
+
+def _register_organization(ctx, i):
+    name = 'bench-register-%s-%d' % (ctx['run'], i)
+    return {'data': {'name': name, 'email': '%s@bench.local' % name, 'password': 'bench-password', 'address': '1 Main Road',
+                     'city': 'Pune', 'postal_code': '411001', 'country': 'India', 'phone': '000', 'mission': 'Mission',
+                     'description': 'Description'}}
+
+def _opportunity(ctx, i):
+    return {'title': 'Bench opportunity %d' % i, 'opportunity_type': 'volunteer', 'start_date': '2024-01-01',
+            'end_date': '2024-12-31', 'location': 'Pune', 'cause_area': ctx['cause_area'], 'description': 'Help out',
+            'requirements': 'None', 'skills': ctx['skills'][:2]}
+
+def _cycle(values, i):
+    return values[i % len(values)]
+
+def _prepare_logouts(role):
+    # One refresh token per request, since a logout blacklists it
+    def prepare(ctx, n):
+        from main.tokens import ClaimsRefreshToken
+
+        refresh = [ClaimsRefreshToken.for_user(ctx['users'][role]) for _ in range(n)]
+        ctx['logout_' + role] = [{'refresh_token': str(token), 'access_token': str(token.access_token)} for token in refresh]
+    return prepare
+
+def _prepare_refreshes(ctx, n):
+    # One refresh token per request, since a refresh rotates and blacklists it
+    from main.tokens import ClaimsRefreshToken
+
+    ctx['refresh_tokens'] = [str(ClaimsRefreshToken.for_user(ctx['users']['volunteer'])) for _ in range(n)]
+
+def _prepare_application_deletes(ctx, n):
+    from main.models import Application
+
+    rows = Application.objects.bulk_create([
+        Application(user_id=ctx['profile'], opportunity_id=_cycle(ctx['opportunities'], i)) for i in range(n)
+    ])
+    ctx['doomed_applications'] = [row.id for row in rows]
+
+def _prepare_review_deletes(ctx, n):
+    from main import ratings
+    from main.models import Review
+
+    rows = Review.objects.bulk_create([
+        Review(user=ctx['users']['both'], org_id=ctx['org'], rating=3, message='Doomed review') for i in range(n)
+    ])
+    ratings.rebuild_ratings()
+    ctx['doomed_reviews'] = [row.id for row in rows]
+
+def _prepare_registrations(ctx, n):
+    # Distinct volunteers register for one event with no capacity limit (repeats answer 409 once they run out)
+    from django.utils import timezone
+    from main.models import Event
+    from main.tokens import ClaimsRefreshToken
+
+    ctx['open_event'] = Event.objects.create(title='Open event', description='Everyone welcome', date=timezone.now(),
+                                             location='Pune', Organization_id=ctx['org']).id
+    ctx['registrant_tokens'] = [str(ClaimsRefreshToken.for_user(user).access_token) for user in ctx['volunteer_users'][:n]]
+
+ROUTES = [
+    Route('user-signup', 'post', None, _signup),
+    Route('user-login', 'post', None, lambda ctx, i: {'data': {'email': ctx['users']['volunteer'].email, 'password': 'bench-password'}}),
+    Route('user-detail-update-delete', 'get', 'volunteer', lambda ctx, i: {'kwargs': {'pk': ctx['profile']}}),
+    Route('user-detail-update-delete', 'put', 'volunteer', lambda ctx, i: {'kwargs': {'pk': ctx['profile']}, 'data': {'bio': 'Bio %d' % i}}),
+    Route('user-logout', 'post', 'volunteer', lambda ctx, i: {'cookies': ctx['logout_volunteer'][i]}, _prepare_logouts('volunteer')),
+    Route('token-refresh', 'post', None, lambda ctx, i: {'data': {'refresh': ctx['refresh_tokens'][i]}}, _prepare_refreshes),
+
+    Route('organization-register', 'post', None, _register_organization),
+    Route('organization-login', 'post', None, lambda ctx, i: {'data': {'email': ctx['users']['company'].email, 'password': 'bench-password'}}),
+    Route('organizations-list', 'get', 'volunteer', lambda ctx, i: {}),
+    Route('organization-detail-update-delete', 'get', 'company', lambda ctx, i: {'kwargs': {'pk': ctx['org']}}),
+    Route('organization-detail-update-delete', 'patch', 'company', lambda ctx, i: {'kwargs': {'pk': ctx['org']}, 'data': {'mission': 'Mission %d' % i}}),
+    Route('organization-logout', 'post', 'company', lambda ctx, i: {'cookies': ctx['logout_company'][i]}, _prepare_logouts('company')),
+
+    Route('organization-opportunities', 'get', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}}),
+    Route('opportunity-create', 'post', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}, 'data': dict(_opportunity(ctx, i), organization=ctx['org'])}),
+    Route('opportunity-bulk-create', 'post', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}, 'data': [_opportunity(ctx, i * 10 + k) for k in range(10)]}),
+    Route('opportunity-detail-update-delete', 'get', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': _cycle(ctx['opportunities'], i)}}),
+    Route('opportunity-detail-update-delete', 'patch', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': _cycle(ctx['opportunities'], i)}, 'data': {'requirements': 'Updated %d' % i}}),
+
+    Route('opportunity-applications', 'get', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': ctx['opportunities'][0]}}),
+    Route('opportunity-applications-export', 'get', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': ctx['opportunities'][0]}}),
+    Route('application-create', 'post', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': _cycle(ctx['opportunities'], i)}, 'data': {'status': 'pending'}}),
+    Route('application-update', 'put', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': ctx['opportunities'][0], 'app_id': _cycle(ctx['applications'], i)}, 'data': {'status': ('accepted', 'pending')[i % 2]}}),
+    Route('application-read', 'get', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': ctx['opportunities'][0], 'pk': _cycle(ctx['applications'], i)}}),
+    Route('application-delete', 'delete', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'opp_id': ctx['opportunities'][0], 'pk': ctx['doomed_applications'][i]}}, _prepare_application_deletes),
+    Route('application-bulk-status', 'post', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}, 'data': {'ids': ctx['applications'][:50], 'status': ('accepted', 'pending')[i % 2]}}),
+
+    Route('all-opportunities', 'get', 'volunteer', lambda ctx, i: {}),
+    Route('all-opportunities', 'get', 'volunteer', lambda ctx, i: {'query': {'near': 'Pune', 'radius': 25}}),
+    Route('recommended-opportunities', 'get', 'volunteer', lambda ctx, i: {}),
+
+    Route('organization-reviews', 'get', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}}),
+    Route('review-create', 'post', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}, 'data': {'rating': i % 5 + 1, 'message': 'Review %d' % i}}),
+    Route('review-update', 'put', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'pk': _cycle(ctx['own_reviews'], i)}, 'data': {'rating': i % 5 + 1}}),
+    Route('review-delete', 'delete', 'both', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'pk': ctx['doomed_reviews'][i]}}, _prepare_review_deletes),
+
+    Route('events', 'get', 'volunteer', lambda ctx, i: {}),
+    Route('organization-events', 'get', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}}),
+    Route('event-create', 'post', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}, 'data': {'title': 'Bench event %d' % i, 'description': 'Event', 'date': '2030-01-01T10:00:00Z', 'location': 'Pune'}}),
+    Route('event-detail-update-delete', 'get', 'both', lambda ctx, i: {'kwargs': {'org_id': ctx['both_org'], 'pk': ctx['both_event']}}),
+    Route('event-detail-update-delete', 'patch', 'both', lambda ctx, i: {'kwargs': {'org_id': ctx['both_org'], 'pk': ctx['both_event']}, 'data': {'description': 'Event %d' % i}}),
+    # Same URL pattern as event-detail-update-delete, which is matched first, so this times EventDetailView
+    Route('event-attendees-list', 'get', 'both', lambda ctx, i: {'kwargs': {'org_id': ctx['both_org'], 'event_id': ctx['both_event']}}),
+    Route('event-attendees-export', 'get', 'company', lambda ctx, i: {'kwargs': {'org_id': ctx['org'], 'event_id': ctx['busy_event']}}),
+    Route('event-register', 'post', 'volunteer', lambda ctx, i: {'kwargs': {'event_id': ctx['open_event']}, 'token': _cycle(ctx['registrant_tokens'], i)}, _prepare_registrations),
+
+    Route('swagger-schema', 'get', None, lambda ctx, i: {'query': {'format': 'openapi'}}),
+    Route('redoc', 'get', None, lambda ctx, i: {}),
+
+    Route('async-organizations-list', 'get', 'volunteer', lambda ctx, i: {}),
+    Route('async-all-opportunities', 'get', 'volunteer', lambda ctx, i: {}),
+    Route('async-organization-reviews', 'get', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}}),
+    Route('async-events', 'get', 'volunteer', lambda ctx, i: {}),
+    Route('async-organization-events', 'get', 'volunteer', lambda ctx, i: {'kwargs': {'org_id': ctx['org']}}),
+]
+
+def route_key(route):
+    return '%s %s' % (route.method.upper(), route.name)
+
+def named_routes():
+    # Every URL name the suite should cover
+    from main import async_urls, urls
+
+    return sorted({pattern.name for module in (urls, async_urls) for pattern in module.urlpatterns if getattr(pattern, 'name', None)})
+
+def build_context(args):
+    from django.contrib.auth.hashers import make_password
+    from main.models import (Application, CauseArea, Event, EventRegistration, Opportunity, Organization, Review, Skill,
+                             User, userProfile)
+    from main.tokens import ClaimsRefreshToken
+
+    seed(organizations=args.organizations, opportunities=args.opportunities, events=args.events, skills=args.skills,
+         volunteers=args.volunteers, applications=args.applications, reviews=args.reviews, registrations=args.registrations)
+    # The owner of the second organization is both a volunteer and a company, as a few views require
+    both = User.objects.bulk_create([User(username='bench-org-1', email='org1-owner@bench.local', is_user=True,
+                                          is_company=True, password=make_password('bench-password'))])[0]
+    volunteer = User.objects.get(username='bench-volunteer-0')
+    users = {'volunteer': volunteer, 'company': User.objects.get(username='bench-org-0'), 'both': both}
+    org, both_org = (Organization.objects.get(name=name).id for name in ('bench-org-0', 'bench-org-1'))
+    ctx = {
+        'run': '%x' % int(time.time()),
+        'users': users,
+        'tokens': {role: str(ClaimsRefreshToken.for_user(user).access_token) for role, user in users.items()},
+        'volunteer_users': list(User.objects.filter(username__startswith='bench-volunteer-').order_by('id')),
+        'profile': userProfile.objects.get(email=volunteer.email).id,
+        'org': org,
+        'both_org': both_org,
+        'opportunities': list(Opportunity.objects.filter(organization_id=org).order_by('id').values_list('id', flat=True)[:100]),
+        'applications': list(Application.objects.filter(opportunity__organization_id=org).order_by('id').values_list('id', flat=True)[:500]),
+        'own_reviews': list(Review.objects.filter(user=volunteer, org_id=org).values_list('id', flat=True)),
+        'both_event': Event.objects.filter(Organization_id=both_org).order_by('id').values_list('id', flat=True)[0],
+        'busy_event': (EventRegistration.objects.filter(event__Organization_id=org).values_list('event_id', flat=True).first()
+                       or Event.objects.filter(Organization_id=org).values_list('id', flat=True)[0]),
+        'cause_area': CauseArea.objects.values_list('id', flat=True)[0],
+        'skills': list(Skill.objects.order_by('id').values_list('id', flat=True)),
+    }
+    if not ctx['own_reviews']:
+        ctx['own_reviews'] = [Review.objects.create(user=volunteer, org_id=org, rating=4, message='Own review').id]
+    return ctx
+
+def run_route(route, ctx, requests, warmup, concurrency):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    if route.prepare:
+        route.prepare(ctx, warmup + requests)
+    local = threading.local()
+    lock = threading.Lock()
+    samples = []
+
+    def count_queries(execute, sql, params, many, context):
+        local.queries += 1
+        return execute(sql, params, many, context)
+
+    def fetch(i):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False)  # Server errors are counted, not raised
+        request = route.build(ctx, i)
+        token = request.get('token') or (ctx['tokens'][route.role] if route.role else None)
+        headers = {'Authorization': 'Bearer ' + token} if token else {}
+        path = reverse(route.name, kwargs=request.get('kwargs'))
+        if request.get('query'):
+            path += '?' + '&'.join('%s=%s' % item for item in request['query'].items())
+        for name, value in request.get('cookies', {}).items():
+            local.client.cookies[name] = value
+        body = json.dumps(request['data']) if 'data' in request else None
+        local.queries = 0
+        began = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = local.client.generic(route.method.upper(), path, body or '', content_type='application/json', headers=headers)
+            if response.streaming:
+                b''.join(response.streaming_content)  # Exports query while the body is read
+        latency = time.perf_counter() - began
+        if i >= warmup:
+            with lock:
+                samples.append((response.status_code, latency, local.queries))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fetch, range(warmup)))
+        start = time.perf_counter()
+        list(pool.map(fetch, range(warmup, warmup + requests)))
+        elapsed = time.perf_counter() - start
+    statuses = Counter(str(code) for code, _, _ in samples)
+    queries = [count for _, _, count in samples]
+    return dict(summarize([latency for _, latency, _ in samples], elapsed),
+                queries_per_request=round(sum(queries) / len(queries), 2) if queries else 0.0,
+                max_queries=max(queries, default=0), statuses=dict(sorted(statuses.items())))
+
+def compare(baseline, current, tolerance, min_ms):
+    """
+    Flag routes whose p95 latency or throughput got worse by more than
+    `tolerance` (ignoring latency changes under `min_ms`), that issue more
+    queries, or that started answering with server errors.
+    """
+    regressions, improvements = [], []
+    for key, now in sorted(current['routes'].items()):
+        before = baseline['routes'].get(key)
+        if before is None:
+            continue
+        problems = []
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance) and now['p95_ms'] - before['p95_ms'] > min_ms:
+            problems.append('p95 %.1f -> %.1f ms' % (before['p95_ms'], now['p95_ms']))
+        if now['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            problems.append('throughput %.1f -> %.1f rps' % (before['throughput_rps'], now['throughput_rps']))
+        if now['queries_per_request'] > before['queries_per_request'] + 0.5:
+            problems.append('queries %.2f -> %.2f' % (before['queries_per_request'], now['queries_per_request']))
+        errors_before = sum(count for code, count in before['statuses'].items() if code.startswith('5'))
+        errors_now = sum(count for code, count in now['statuses'].items() if code.startswith('5'))
+        if errors_now > errors_before:
+            problems.append('server errors %d -> %d' % (errors_before, errors_now))
+        if problems:
+            regressions.append({'route': key, 'problems': problems})
+        elif now['p95_ms'] < before['p95_ms'] * (1 - tolerance) and before['p95_ms'] - now['p95_ms'] > min_ms:
+            improvements.append({'route': key, 'p95_ms': [before['p95_ms'], now['p95_ms']]})
+    return {
+        'tolerance': tolerance,
+        'regressions': regressions,
+        'improvements': improvements,
+        'missing': sorted(set(baseline['routes']) - set(current['routes'])),
+        'ok': not regressions,
+    }
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route, sent first')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', nargs='*', help='Only run routes whose name contains one of these')
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--opportunities', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--skills', type=int, default=20)
+    parser.add_argument('--volunteers', type=int, default=500)
+    parser.add_argument('--applications', type=int, default=20000)
+    parser.add_argument('--reviews', type=int, default=2000)
+    parser.add_argument('--registrations', type=int, default=5000)
+    parser.add_argument('--postgres', metavar='DBNAME', help='Run against this empty Postgres database instead of SQLite')
+    parser.add_argument('--output', help='Also write the results to this file, e.g. to keep as a baseline')
+    parser.add_argument('--baseline', help='Compare the results with this earlier output')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='Only compare two saved outputs')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown before flagging a route')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='Ignore p95 changes smaller than this')
+    args = parser.parse_args()
+
+    if args.compare:
+        comparison = compare(load(args.compare[0]), load(args.compare[1]), args.tolerance, args.min_ms)
+        report(comparison)
+        sys.exit(0 if comparison['ok'] else 1)
+
+    setup_django(postgres=args.postgres)
+    from django.db import connection
+
+    # Failures are counted per route; one log line or traceback per failed request would bury the report
+    for name in ('django.request', 'drf_yasg'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+
+    ctx = build_context(args)
+    # Serving processes build the recommendation matrix from startup (VolunteerApp.wsgi); have it ready before timing
+    from main.recommendations import refresher
+    refresher.refresh()
+    routes = [route for route in ROUTES if not args.routes or any(part in route.name for part in args.routes)]
+    keys = Counter()
+    results = {
+        'config': {'database': connection.vendor, 'requests': args.requests, 'warmup': args.warmup, 'concurrency': args.concurrency},
+        'dataset': {name: getattr(args, name) for name in ('organizations', 'opportunities', 'events', 'skills', 'volunteers',
+                                                           'applications', 'reviews', 'registrations')},
+        'routes': {},
+        'uncovered': sorted(set(named_routes()) - {route.name for route in ROUTES}),
+    }
+    for route in routes:
+        key = route_key(route)
+        keys[key] += 1
+        if keys[key] > 1:
+            key += ' #%d' % keys[key]  # Same route and method with other parameters
+        results['routes'][key] = run_route(route, ctx, args.requests, args.warmup, args.concurrency)
+        print('%-60s p50 %8.2f ms  p99 %8.2f ms  %6.2f queries' % (
+            key, results['routes'][key]['p50_ms'], results['routes'][key]['p99_ms'], results['routes'][key]['queries_per_request']),
+            file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        results['comparison'] = compare(load(args.baseline), results, args.tolerance, args.min_ms)
+    report(results)
+    sys.exit(1 if args.baseline and not results['comparison']['ok'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -5,3 +5,6 @@ class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
 
+    def ready(self):
+        # Connect model signal handlers
+        from . import signals
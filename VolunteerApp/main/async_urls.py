@@ -0,0 +1,15 @@
+from django.urls import path
+
+from .async_views import (
+    AsyncAllOpportunitiesView, AsyncEventsView,
+    AsyncOrganizationListView, AsyncOrganizationReviews, AsyncOrganizationEventsView
+)
+
+# Async versions of the read-only endpoints, for deployments served over ASGI
+urlpatterns = [
+    path('organization/all/',AsyncOrganizationListView.as_view(),name="async-organizations-list"),
+    path('opportunities/all/',AsyncAllOpportunitiesView.as_view(),name="async-all-opportunities"),
+    path('organization/<int:org_id>/reviews/',AsyncOrganizationReviews.as_view(),name="async-organization-reviews"),
+    path('events/all/',AsyncEventsView.as_view(),name="async-events"),
+    path('organization/<int:org_id>/events/all/',AsyncOrganizationEventsView.as_view(),name="async-organization-events"),
+]
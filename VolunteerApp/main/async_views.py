@@ -0,0 +1,174 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter
+
+from .authentication import AsyncJWTAuthentication
+from .models import Opportunity, Organization, Review, Event
+from .pagination import AsyncLimitOffsetPagination, AsyncOpportunityCursorPagination, AsyncEventCursorPagination
+from .permissions import IsUser
+from .fieldsets import is_sparse, plan_queryset
+from .queryplans import get_plan
+from .renderers import FastJSONRenderer
+from .search import FullTextSearchFilter
+from .geo import NearbyFilter
+from .serializers import opportunity_serializer, organization_serializer, review_serializer, event_serializer
+
+class AsyncAPIView(View):
+    """
+    Minimal read-only API view for the ASGI code path.
+
+    DRF's APIView is synchronous, so this view authenticates with the async
+    ORM, runs the (database-free) permission classes and renders with
+    FastJSONRenderer. Handlers are `async def` and return the response data.
+    """
+    authentication_classes = [AsyncJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_class = FastJSONRenderer
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = Request(request)
+        try:
+            await self.authenticate(self.request)
+            self.check_permissions(self.request)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            data = await handler(self.request, *args, **kwargs)
+            return self.render(data, status.HTTP_200_OK)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    # Authenticate the request without blocking the event loop
+    async def authenticate(self, request):
+        for authenticator in [auth() for auth in self.authentication_classes]:
+            result = await authenticator.aauthenticate(request)
+            if result is not None:
+                request.user, request.auth = result
+                return
+        request.user, request.auth = AnonymousUser(), None
+
+    # IsUser/IsCompany only read attributes of request.user, so they run as is
+    def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.auth is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(detail=getattr(permission, 'message', None))
+
+    def handle_exception(self, exc):
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, exceptions.NotAuthenticated):
+            response['WWW-Authenticate'] = AsyncJWTAuthentication().authenticate_header(self.request)
+        return response
+
+    def render(self, data, status_code):
+        renderer = self.renderer_class()
+        content = renderer.render(data)
+        return HttpResponse(content, status=status_code, content_type=renderer.media_type)
+
+class AsyncListAPIView(AsyncAPIView):
+    """
+    Async counterpart of ListAPIView with filter backends, declared query plans
+    and pagination.
+    """
+    queryset = None
+    serializer_class = None
+    filter_backends = []
+    pagination_class = AsyncLimitOffsetPagination
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def get_serializer_class(self):
+        return self.serializer_class
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        if is_sparse(self.request):
+            # Only the columns and relations ?fields= and ?expand= select, plus the page order
+            serializer = self.get_serializer_class()(context=self.get_serializer_context())
+            return plan_queryset(queryset, serializer, required=getattr(self.pagination_class, 'ordering', ()))
+        select, prefetch = get_plan(self.serializer_class)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    async def get(self, request, *args, **kwargs):
+        # Filter forms may look up related rows, so build the queryset off the event loop
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        serializer_class = self.get_serializer_class()
+        # Related rows are prefetched, so serializing does no database access
+        if page is None:
+            rows = [obj async for obj in queryset]
+            return serializer_class(rows, many=True, context=self.get_serializer_context()).data
+        data = serializer_class(page, many=True, context=self.get_serializer_context()).data
+        return paginator.get_paginated_response(data).data
+
+class AsyncAllOpportunitiesView(AsyncListAPIView):
+    permission_classes = [IsAuthenticated, IsUser]
+    queryset = Opportunity.objects.all()
+    serializer_class = opportunity_serializer
+    pagination_class = AsyncOpportunityCursorPagination
+    filter_backends = [FullTextSearchFilter, DjangoFilterBackend, NearbyFilter]
+    search_fields = ['location']
+    filterset_fields = ['location', 'organization', 'cause_area', 'skills', 'status']
+
+class AsyncEventsView(AsyncListAPIView):
+    permission_classes = [IsAuthenticated, IsUser]
+    queryset = Event.objects.all()
+    serializer_class = event_serializer
+    pagination_class = AsyncEventCursorPagination
+    filter_backends = [FullTextSearchFilter, DjangoFilterBackend, NearbyFilter]
+    search_fields = ['location']
+    filterset_fields = ['location', 'Organization', 'date']
+
+class AsyncOrganizationListView(AsyncListAPIView):
+    permission_classes = [IsAuthenticated, IsUser]
+    queryset = Organization.objects.all()
+    serializer_class = organization_serializer
+    filter_backends = [FullTextSearchFilter, DjangoFilterBackend, OrderingFilter]
+    ordering_fields = ['name', 'rating_average', 'rating_count']
+    search_fields = ['=city', '^name', '^address']
+    filterset_fields = ['city']
+
+class AsyncOrganizationReviews(AsyncListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = review_serializer
+
+    # Retrieve reviews for a specific organization
+    def get_queryset(self):
+        return Review.objects.filter(org=self.kwargs['org_id'])
+
+class AsyncOrganizationEventsView(AsyncListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = event_serializer
+
+    # Retrieve events for a specific organization
+    def get_queryset(self):
+        return Event.objects.filter(Organization=self.kwargs['org_id'])
@@ -0,0 +1,74 @@
+from asgiref.sync import sync_to_async
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import blacklist_filter
+from .tokens import REFRESH_JTI_CLAIM, has_current_claims
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user built from the claims of a token issued by LoginView.
+    """
+
+    def __str__(self):
+        return self.username
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def is_user(self):
+        return self.token.get('is_user', False)
+
+    @cached_property
+    def is_company(self):
+        return self.token.get('is_company', False)
+
+    @cached_property
+    def organization_id(self):
+        return self.token.get('organization_id')
+
+    @cached_property
+    def profile_id(self):
+        return self.token.get('profile_id')
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticate from the token's role and ownership claims without a query.
+
+    Tokens without claims, or whose claims were invalidated since they were
+    issued (see main.tokens), fall back to loading the user from the
+    database. Access tokens whose refresh token was blacklisted are refused.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        # Revoked with the refresh token it came from; the filter only queries on a hit
+        refresh_jti = validated_token.get(REFRESH_JTI_CLAIM)
+        if refresh_jti is not None and blacklist_filter.is_blacklisted(refresh_jti):
+            raise InvalidToken(_("Token is blacklisted"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if has_current_claims(validated_token):
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
+
+class AsyncJWTAuthentication(ClaimsJWTAuthentication):
+    """
+    ClaimsJWTAuthentication for async views. The sync path runs off the event
+    loop as is, so the blacklist, claims and fallback user checks (including
+    CHECK_USER_IS_ACTIVE and CHECK_REVOKE_TOKEN) are the ones sync views make.
+    """
+
+    async def aauthenticate(self, request):
+        return await sync_to_async(self.authenticate)(request)
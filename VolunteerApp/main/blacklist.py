@@ -0,0 +1,131 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import CacheGeneration
+from .queryplans import unbudgeted
+
+BLACKLIST_LABEL = 'token_blacklist.blacklistedtoken'  # Database generation bumped on every blacklisting
+
+DEFAULT_CAPACITY = 100000
+ERROR_RATE = 0.001
+REBUILD_INTERVAL = 6 * 60 * 60  # Seconds between full rebuilds, which drop pruned tokens
+COMMIT_SKEW = timedelta(minutes=1)  # Re-read this far back to catch rows committed out of order
+
+class BloomFilter:
+    """
+    Fixed-size set of strings with no false negatives and a bounded false
+    positive rate.
+    """
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def is_full(self):
+        return self.count > self.capacity
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of blacklisted JTIs.
+
+    A JTI not in the filter was not blacklisted as of the last sync, so
+    only filter hits are confirmed against the database. At most every
+    BLACKLIST_SYNC_SECONDS the filter reads the BlacklistedToken generation
+    from the primary database, which every process bumps after committing a
+    blacklisting, and loads the rows blacklisted since its last sync when it
+    moved. Checks in between run no query, so a blacklisting by another
+    process takes effect here within that delay. The filter is also rebuilt
+    periodically or when full.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bloom = None
+        self.generation = None
+        self.synced_at = None
+        self.built_at = None
+        self.checked = float('-inf')
+
+    def sync(self):
+        interval = getattr(settings, 'BLACKLIST_SYNC_SECONDS', 1)
+        if time.monotonic() - self.checked < interval:
+            return
+        with self._lock, unbudgeted():
+            if time.monotonic() - self.checked < interval:
+                return  # Synced by another thread meanwhile
+            # Read first, so a blacklisting committed while loading moves it again
+            generation = CacheGeneration.objects.using(DEFAULT_DB_ALIAS).filter(label=BLACKLIST_LABEL).values_list('generation', flat=True).first()
+            if self.bloom is None or self.bloom.is_full() or time.monotonic() - self.built_at > REBUILD_INTERVAL:
+                self._rebuild()
+            elif generation != self.generation:
+                self._load(BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).filter(blacklisted_at__gte=self.synced_at - COMMIT_SKEW))
+            self.generation = generation
+            self.checked = time.monotonic()
+
+    def _rebuild(self):
+        now = timezone.now()
+        queryset = BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).filter(token__expires_at__gt=now)  # Expired tokens fail verification anyway
+        self.bloom = BloomFilter(max(DEFAULT_CAPACITY, 2 * queryset.count()))
+        self.built_at = time.monotonic()
+        self._load(queryset, now)
+
+    def _load(self, queryset, now=None):
+        self.synced_at = now or timezone.now()
+        for jti in queryset.values_list('token__jti', flat=True).iterator(chunk_size=2000):
+            self.bloom.add(jti)
+
+    def add(self, jti):
+        # Record a blacklisting made by this process without waiting for the next sync
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def is_blacklisted(self, jti):
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).filter(token__jti=jti).exists()  # Rule out a false positive
+
+blacklist_filter = BlacklistFilter()
+
+def prune_expired_tokens(batch_size=1000, now=None):
+    """
+    Delete expired outstanding tokens and their blacklist entries in batches
+    of `batch_size`, each in its own transaction. Returns the number of
+    outstanding tokens deleted.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            deleted += OutstandingToken.objects.filter(id__in=ids).delete()[1].get(OutstandingToken._meta.label, 0)
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from rest_framework.response import Response
+
+from . import routers
+from .models import CacheGeneration
+
+RESPONSE_KEY = 'response:%s'
+
+def get_cache():
+    # Cache backend holding cached responses
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+def model_label(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+def _new_generation():
+    # Seed from the clock, so a model's first generation never matches the 0 of a missing row
+    return time.time_ns()
+
+def get_generations(models, request=None):
+    """
+    Current generation of each model. Generations live in the primary
+    database, so every worker process sees a write as soon as it is
+    committed; models never written have generation 0. With a `request` they are read once
+    per request, so its ETag and cache key agree.
+    """
+    labels = tuple(model_label(model) for model in models)
+    memo = getattr(request, '_cache_generations', None) if request is not None else None
+    if memo is not None and labels in memo:
+        return memo[labels]
+    rows = {label: (generation, bumped_at) for label, generation, bumped_at in
+            CacheGeneration.objects.using(DEFAULT_DB_ALIAS).filter(label__in=labels).values_list('label', 'generation', 'bumped_at')}
+    generations = [rows.get(label, (0, None))[0] for label in labels]
+    # Replicas may not have rows this recent yet; they must not be cached under the new generations
+    routers.read_recent_writes_from_primary(max((bumped_at for _, bumped_at in rows.values()), default=None))
+    if request is not None:
+        if memo is None:
+            memo = request._cache_generations = {}
+        memo[labels] = generations
+    return generations
+
+def bump_generation(model):
+    # Invalidate every cached response and list ETag built from this model
+    label = model_label(model)
+    if not CacheGeneration.objects.using(DEFAULT_DB_ALIAS).filter(label=label).update(generation=F('generation') + 1, bumped_at=Now()):
+        CacheGeneration.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+            [CacheGeneration(label=label, generation=_new_generation())], ignore_conflicts=True)
+
+def bump_generation_on_commit(model, using=None):
+    # Bump only once the write is visible, so readers never cache stale rows under the new generation
+    transaction.on_commit(lambda: bump_generation(model), using=using)
+
+class CacheStats:
+    """
+    Per-process hit/miss counters for the response cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+stats = CacheStats()
+
+def get_role(user):
+    # Responses only differ by role, never by the individual user
+    if not user or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_company:
+        return 'company'
+    if user.is_user:
+        return 'user'
+    return 'authenticated'
+
+def build_cache_key(view, request, models):
+    """
+    Key a response on the view, its normalized query parameters, the caller's
+    role and the generation of every model it is built from.
+    """
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    parts = [
+        type(view).__name__,
+        request.get_host(),
+        repr(sorted(view.kwargs.items())),
+        repr(params),
+        get_role(request.user),
+        repr(get_generations(models, request)),
+    ]
+    return RESPONSE_KEY % hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+class CachedListMixin:
+    """
+    Serve list responses from the response cache.
+
+    Permission checks still run on every request. The cached payload is
+    invalidated when any model in `cache_models` is written. Keys carry the
+    database generations of those models, so a per-process cache never
+    serves a page older than the last committed write.
+    """
+    cache_models = []
+    cache_timeout = 300
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = build_cache_key(self, request, self.cache_models)
+        data = cache.get(key)
+        stats.record(data is not None)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,80 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .caching import get_generations, get_role
+
+def make_etag(view, request, parts):
+    # Strong validator for one representation: view, URL, query, role, renderer and data version
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    key = [
+        type(view).__name__,
+        repr(sorted(view.kwargs.items())),
+        repr(params),
+        get_role(request.user),
+        getattr(request, 'accepted_media_type', '') or '',
+    ] + [repr(part) for part in parts]
+    return '"%s"' % hashlib.md5('|'.join(key).encode()).hexdigest()
+
+class ConditionalListMixin:
+    """
+    Answer conditional GETs of a list with 304 Not Modified before serializing.
+
+    Views with `conditional_models` (by default their `cache_models`) are
+    validated by the cache generations of those models, read with one query
+    that CachedListMixin reuses. Others are validated by the row count and
+    latest `last_modified_field` of the filtered queryset, read with one
+    aggregate query.
+    """
+    last_modified_field = 'updated'
+
+    def get_conditional_models(self):
+        return getattr(self, 'conditional_models', None) or getattr(self, 'cache_models', [])
+
+    def get_list_validators(self, request):
+        # (etag, last_modified) for the current state of the list
+        models = self.get_conditional_models()
+        if models:
+            return make_etag(self, request, get_generations(models, request)), None
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(count=Count('pk'), last_modified=Max(self.last_modified_field))
+        last_modified = state['last_modified']
+        return make_etag(self, request, [state['count'], last_modified]), last_modified
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+class ConditionalRetrieveMixin:
+    """
+    Answer conditional GETs of a single object from its `updated` timestamp.
+
+    The object is loaded (permission checks need it) but not serialized when
+    the client's copy is current.
+    """
+    last_modified_field = 'updated'
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = getattr(instance, self.last_modified_field)
+        etag = make_etag(self, request, [instance.pk, last_modified])
+        timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+        return response
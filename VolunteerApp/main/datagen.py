@@ -0,0 +1,267 @@
+import csv
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from . import caching, ratings, search
+from .geo import GAZETTEER_PATH
+from .models import (Application, CauseArea, Event, EventRegistration, Opportunity, Organization, Review, Skill, User,
+                     userProfile)
+
+# Synthetic volunteer/organization graphs for load testing. Rows go in with bulk_create, so no
+# save() override, signal or per-row password hash runs; the derived data those would maintain
+# (coordinates, search index, seat counts, rating aggregates, cache generations) is filled in here.
+
+FIRST_NAMES = ['Aarav', 'Ana', 'Chen', 'Diego', 'Fatima', 'Hana', 'Ivan', 'Kofi', 'Lena', 'Maya', 'Noah', 'Omar',
+               'Priya', 'Rahul', 'Sara', 'Tomas', 'Wei', 'Yuki', 'Zara', 'Leo']
+LAST_NAMES = ['Patel', 'Garcia', 'Kim', 'Singh', 'Okafor', 'Silva', 'Novak', 'Haddad', 'Sato', 'Khan', 'Muller',
+              'Rossi', 'Nair', 'Ivanova', 'Mensah', 'Lopez']
+ORGANIZATION_WORDS = [['Green', 'Helping', 'Bright', 'Open', 'Shared', 'River', 'City', 'Future', 'Kind', 'Unity'],
+                      ['Hands', 'Hearts', 'Roots', 'Paths', 'Futures', 'Harvest', 'Bridges', 'Sparks'],
+                      ['Foundation', 'Trust', 'Collective', 'Network', 'Society', 'Initiative']]
+CAUSE_AREAS = ['Environment', 'Education', 'Health', 'Animal Welfare', 'Elderly Care', 'Disaster Relief',
+               'Arts & Culture', 'Homelessness', 'Youth', 'Food Security']
+SKILLS = ['Teaching', 'First Aid', 'Cooking', 'Driving', 'Photography', 'Web Development', 'Fundraising', 'Carpentry',
+          'Translation', 'Accounting', 'Event Planning', 'Gardening', 'Counselling', 'Social Media', 'Nursing',
+          'Graphic Design', 'Public Speaking', 'Data Entry', 'Mentoring', 'Logistics']
+OPPORTUNITY_TYPES = ['volunteer', 'internship', 'remote', 'weekend', 'one-off']
+ACTIVITIES = ['Community clean-up', 'Reading club', 'Food drive', 'Health camp', 'Tree planting', 'Coding workshop',
+              'Shelter support', 'Fundraising gala', 'Beach clean-up', 'Tutoring session']
+APPLICATION_STATUSES = ['pending'] * 5 + ['accepted'] * 3 + ['rejected'] * 2
+RATING_WEIGHTS = [1, 1, 2, 3, 6, 7]  # Stars 0-5, skewed positive like real reviews
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)  # Fixed, so the same seed gives the same rows
+
+DEFAULT_BATCH_SIZE = 2000
+
+def load_places():
+    # (city, country) pairs from the gazetteer, so generated rows geocode
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+        return [(row['name'], row['country']) for row in csv.DictReader(f)]
+
+def split(total, parts):
+    # Spread `total` rows over `parts` partitions as evenly as possible
+    size, extra = divmod(total, parts)
+    return [size + (1 if part < extra else 0) for part in range(parts)]
+
+def ensure_lookups():
+    # Create the cause areas and skills that are missing; return their ids
+    lookups = []
+    for model, field, names in ((CauseArea, 'title', CAUSE_AREAS), (Skill, 'name', SKILLS)):
+        existing = set(model.objects.filter(**{field + '__in': names}).values_list(field, flat=True))
+        model.objects.bulk_create([model(**{field: name}) for name in names if name not in existing])
+        lookups.append(list(model.objects.filter(**{field + '__in': names}).order_by('id').values_list('id', flat=True)))
+    return lookups
+
+def insert(model, objects, batch_size, after=None):
+    """
+    bulk_create an iterable of unsaved rows in chunks, each in its own transaction.
+
+    `after(chunk)` runs inside the chunk's transaction, e.g. to add M2M or
+    index rows. Returns the ids of the inserted rows.
+    """
+    ids = []
+    objects = iter(objects)
+    while True:
+        chunk = list(itertools.islice(objects, batch_size))
+        if not chunk:
+            return ids
+        with transaction.atomic():
+            model.objects.bulk_create(chunk)
+            if after:
+                after(chunk)
+        ids.extend(obj.pk for obj in chunk)
+
+def plan_registrations(rng, events, total, volunteers):
+    # Registrations per event: random events, never past capacity or the number of volunteers
+    limits = [volunteers if capacity is None else min(capacity, volunteers) for capacity in events]
+    counts = [0] * len(events)
+    for _ in range(min(total, sum(limits))):
+        event = rng.randrange(len(events))
+        while counts[event] >= limits[event]:
+            event = (event + 1) % len(events)  # Probe onwards from a full event
+        counts[event] += 1
+    return counts
+
+def generate_partition(partition, sizes, options):
+    """
+    Generate one self-contained partition of the graph.
+
+    `sizes` holds this partition's row counts; rows only reference rows of
+    the same partition (plus the shared cause areas and skills), so
+    partitions can be generated in parallel. Returns the rows created.
+    """
+    rng = random.Random('%s:%d' % (options['seed'], partition))
+    batch_size, password = options['batch_size'], options['password']
+    cause_area_ids, skill_ids, places = options['cause_area_ids'], options['skill_ids'], options['places']
+    tag = '%s-%d' % (options['prefix'], partition)  # Keeps unique names unique across partitions and runs
+
+    def place():
+        return rng.choice(places)
+
+    # Organizations, each with the company account that owns it
+    def organizations():
+        for i in range(sizes['organizations']):
+            name = '%s %s %s' % tuple(rng.choice(words) for words in ORGANIZATION_WORDS)
+            city, country = place()
+            yield Organization(
+                name='%s %s-%d' % (name, tag, i), password=password, email='org-%s-%d@example.org' % (tag, i),
+                website='https://%s-%d.example.org' % (tag, i), address='%d %s Road' % (rng.randint(1, 999), rng.choice(LAST_NAMES)),
+                city=city, postal_code='%06d' % rng.randrange(10 ** 6), country=country, phone='+%011d' % rng.randrange(10 ** 11),
+                mission='We bring %s to %s.' % (rng.choice(CAUSE_AREAS).lower(), city),
+                description='%s is run by volunteers in %s.' % (name, city),
+            )
+
+    def add_owners(chunk):
+        User.objects.bulk_create([User(username=org.name, email=org.email, password=password, is_company=True) for org in chunk])
+        search.index_objects(Organization, chunk)
+
+    org_ids = insert(Organization, organizations(), batch_size, add_owners)
+
+    # Volunteers: an account and a profile with the same name and email
+    def volunteers():
+        for i in range(sizes['volunteers']):
+            name = '%s.%s.%s-%d' % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), tag, i)
+            yield User(username=name, email='%s@example.org' % name.lower(), password=password, is_user=True)
+
+    profile_ids = []
+
+    def add_profiles(chunk):
+        profiles = userProfile.objects.bulk_create([
+            userProfile(name=user.username, email=user.email, password=password, city=place()[0],
+                        phone_number='%010d' % rng.randrange(10 ** 10), bio='Happy to help.')
+            for user in chunk
+        ])
+        profile_ids.extend(profile.pk for profile in profiles)
+
+    user_ids = insert(User, volunteers(), batch_size, add_profiles)
+
+    # Opportunities with one to four skills each
+    def opportunities():
+        for i in range(sizes['opportunities'] if org_ids else 0):
+            start = EPOCH.date() + timedelta(days=rng.randrange(365))
+            activity = rng.choice(ACTIVITIES)
+            opportunity = Opportunity(
+                title='%s #%d' % (activity, i), organization_id=rng.choice(org_ids),
+                opportunity_type=rng.choice(OPPORTUNITY_TYPES), start_date=start,
+                end_date=start + timedelta(days=rng.randint(1, 120)), location=place()[0],
+                cause_area_id=rng.choice(cause_area_ids), description='%s with local volunteers.' % activity,
+                requirements='Bring %s skills.' % rng.choice(SKILLS).lower(), status='open' if rng.random() < 0.9 else 'closed',
+            )
+            opportunity.fill_coordinates()  # bulk_create skips save()
+            yield opportunity
+
+    def add_skills(chunk):
+        Opportunity.skills.through.objects.bulk_create([
+            Opportunity.skills.through(opportunity_id=opportunity.pk, skill_id=skill_id)
+            for opportunity in chunk
+            for skill_id in rng.sample(skill_ids, rng.randint(1, min(4, len(skill_ids))))
+        ])
+        search.index_objects(Opportunity, chunk)
+
+    opportunity_ids = insert(Opportunity, opportunities(), batch_size, add_skills)
+
+    # Events, with seat counts planned up front so they match the registrations inserted below
+    capacities = [None if rng.random() < 0.4 else rng.randint(20, 200) for _ in range(sizes['events'] if org_ids else 0)]
+    registered = plan_registrations(rng, capacities, sizes['registrations'], len(profile_ids)) if capacities else []
+
+    def events():
+        for i, capacity in enumerate(capacities):
+            activity = rng.choice(ACTIVITIES)
+            event = Event(
+                title='%s #%d' % (activity, i), description='Join us for a %s.' % activity.lower(),
+                date=EPOCH + timedelta(hours=rng.randrange(24 * 365)), location=place()[0],
+                Organization_id=rng.choice(org_ids), capacity=capacity, registered_count=registered[i],
+            )
+            event.fill_coordinates()
+            yield event
+
+    event_ids = insert(Event, events(), batch_size, lambda chunk: search.index_objects(Event, chunk))
+
+    def registrations():
+        for event_id, count in zip(event_ids, registered):
+            for profile in rng.sample(profile_ids, count):
+                yield EventRegistration(event_id=event_id, user_id=profile)
+
+    def applications():
+        for _ in range(sizes['applications'] if profile_ids and opportunity_ids else 0):
+            yield Application(user_id=rng.choice(profile_ids), opportunity_id=rng.choice(opportunity_ids),
+                              status=rng.choice(APPLICATION_STATUSES))
+
+    def reviews():
+        for _ in range(sizes['reviews'] if user_ids and org_ids else 0):
+            rating = rng.choices(range(6), RATING_WEIGHTS)[0]
+            yield Review(user_id=rng.choice(user_ids), org_id=rng.choice(org_ids), rating=rating,
+                         message='%d stars: %s' % (rating, rng.choice(ACTIVITIES).lower()))
+
+    created = {
+        'organizations': len(org_ids),
+        'volunteers': len(user_ids),
+        'opportunities': len(opportunity_ids),
+        'events': len(event_ids),
+        'registrations': len(insert(EventRegistration, registrations(), batch_size)),
+        'applications': len(insert(Application, applications(), batch_size)),
+        'reviews': len(insert(Review, reviews(), batch_size)),
+    }
+    return created
+
+def _generate_in_worker(partition, sizes, options):
+    try:
+        return generate_partition(partition, sizes, options)
+    finally:
+        connections.close_all()  # Worker processes hold their own connections
+
+def finish():
+    # Rebuild what bulk inserts skipped: rating aggregates and cached responses
+    ratings.rebuild_ratings()
+    for model in (User, userProfile, Organization, Opportunity, Skill, CauseArea, Application, Review, Event, EventRegistration):
+        caching.bump_generation(model)
+
+def generate(counts, partitions=8, workers=1, seed=0, prefix='gen', password='volunteer', batch_size=DEFAULT_BATCH_SIZE,
+             progress=None):
+    """
+    Generate a synthetic graph with `counts` rows of each kind.
+
+    The rows are split over `partitions` independent partitions, generated by
+    up to `workers` processes; the data depends on the seed and partition
+    count, not on the number of workers. `progress(partition, created)` is
+    called as each partition finishes. Returns the total rows created.
+    """
+    cause_area_ids, skill_ids = ensure_lookups()
+    options = {
+        'seed': seed,
+        'prefix': prefix,
+        'password': make_password(password),  # Hashed once, shared by every generated account
+        'batch_size': batch_size,
+        'cause_area_ids': cause_area_ids,
+        'skill_ids': skill_ids,
+        'places': load_places(),
+    }
+    shares = {name: split(total, partitions) for name, total in counts.items()}
+    jobs = [(partition, {name: share[partition] for name, share in shares.items()}) for partition in range(partitions)]
+    totals = dict.fromkeys(counts, 0)
+
+    def record(partition, created):
+        for name, count in created.items():
+            totals[name] += count
+        if progress:
+            progress(partition, created)
+
+    if workers <= 1:
+        for partition, sizes in jobs:
+            record(partition, generate_partition(partition, sizes, options))
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Forked workers inherit the configured Django; open connections must not be shared with them
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = {pool.submit(_generate_in_worker, partition, sizes, options): partition for partition, sizes in jobs}
+            for future in futures:
+                record(futures[future], future.result())
+    finish()
+    return totals
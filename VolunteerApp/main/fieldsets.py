@@ -0,0 +1,122 @@
+from importlib import import_module
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+ALL = '__all__'  # Every field of a nested serializer
+
+def parse_paths(value):
+    # 'id,organization.name' -> {'id': {}, 'organization': {'name': {}}}
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for part in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+def requested_fieldsets(request):
+    # (fields, expand) trees from a read request's query string; fields is ALL when not given
+    if request is None or request.method not in SAFE_METHODS:
+        return ALL, {}
+    params = getattr(request, 'query_params', request.GET)
+    fields = parse_paths(params.get(FIELDS_PARAM)) if params.get(FIELDS_PARAM) else ALL
+    return fields, parse_paths(params.get(EXPAND_PARAM))
+
+def is_sparse(request):
+    fields, expand = requested_fieldsets(request)
+    return fields is not ALL or bool(expand)
+
+class SparseFieldsMixin:
+    """
+    Serializer that renders only the fields named in `?fields=` and nests
+    the related objects named in `?expand=` instead of their primary keys.
+
+    Both take comma-separated names, dotted for nested serializers:
+    `?fields=id,title,organization.name&expand=organization`. Expandable
+    fields are listed in `Meta.expandable` as {field: (serializer class name
+    in the serializer's module, many)}. Fields computed by methods declare
+    the model fields they read in `Meta.field_sources`, so querysets can be
+    restricted with `plan_queryset()`. Writes always use every field.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            fields, expand = requested_fieldsets(self.context.get('request'))
+        expandable = getattr(self.Meta, 'expandable', {})
+        unknown = set(expand or {}) - set(expandable)
+        if unknown:
+            raise serializers.ValidationError({EXPAND_PARAM: 'Cannot expand: %s' % ', '.join(sorted(unknown))})
+        if fields is not ALL:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({FIELDS_PARAM: 'Unknown fields: %s' % ', '.join(sorted(unknown))})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        module = import_module(type(self).__module__)
+        for name, nested_expand in (expand or {}).items():
+            if name not in self.fields:
+                continue  # Left out by ?fields=
+            serializer_name, many = expandable[name]
+            nested_fields = fields[name] if fields is not ALL and fields[name] else ALL
+            self.fields[name] = getattr(module, serializer_name)(
+                many=many, read_only=True, fields=nested_fields, expand=nested_expand)
+
+def _plan(serializer, model, prefix):
+    # (columns, select_related, prefetches) needed to render the serializer's fields
+    serializer = getattr(serializer, 'child', serializer)
+    sources = getattr(serializer.Meta, 'field_sources', {})
+    columns, select, prefetch = {prefix + model._meta.pk.name}, [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in sources:
+            columns.update(prefix + source for source in sources[name])
+            continue
+        if field.source == '*':
+            return None  # Reads the whole object
+        try:
+            model_field = model._meta.get_field(field.source.split('.')[0])
+        except FieldDoesNotExist:
+            continue  # Annotations such as distance_km, and properties
+        nested = getattr(field, 'child', field)
+        path = prefix + model_field.name
+        if isinstance(nested, SparseFieldsMixin) and not (model_field.many_to_many or model_field.one_to_many):
+            planned = _plan(nested, model_field.related_model, path + '__')
+            if planned is None:
+                return None
+            columns.add(path)
+            columns.update(planned[0])
+            select += [path] + planned[1]
+            prefetch += planned[2]
+        elif isinstance(nested, SparseFieldsMixin):
+            back = [model_field.field.name] if model_field.one_to_many else []  # Prefetching matches rows on it
+            prefetch.append(Prefetch(path, queryset=plan_queryset(model_field.related_model.objects.all(), nested, required=back)))
+        elif model_field.many_to_many or model_field.one_to_many:
+            prefetch.append(Prefetch(path, queryset=model_field.related_model.objects.only('pk')))  # Rendered as keys
+        else:
+            columns.add(path)
+    return columns, select, prefetch
+
+def plan_queryset(queryset, serializer, required=(), restrict=True):
+    """
+    Load only what a sparse serializer renders: its columns with `.only()`
+    (plus `required` ones, e.g. the pagination order), joined relations of
+    expanded foreign keys and prefetches of many-valued fields. With
+    `restrict` off every column is still loaded.
+    """
+    planned = _plan(serializer, queryset.model, '')
+    if planned is None:
+        return queryset
+    columns, select, prefetch = planned
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if restrict:
+        queryset = queryset.only(*columns, *(field.lstrip('-') for field in required))
+    return queryset
@@ -0,0 +1,162 @@
+import csv
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ACos, Cos, Least, Radians, Sin
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Grid index: the world is cut into CELL_DEGREES x CELL_DEGREES cells numbered row by row,
+# so the cells of one grid row that a bounding box touches form a contiguous range.
+CELL_DEGREES = 0.1
+GRID_COLUMNS = int(round(360 / CELL_DEGREES))
+
+DISTANCE_ANNOTATION = 'distance_km'
+
+def normalize(text):
+    # Lower-case ASCII words, so 'São Paulo ' and 'sao paulo' match
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path=GAZETTEER_PATH):
+    # Normalized place name or alias -> (latitude, longitude)
+    places = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['latitude']), float(row['longitude']))
+            for name in [row['name']] + [alias for alias in row['aliases'].split('|') if alias]:
+                places.setdefault(normalize(name), point)
+    return places
+
+def geocode(text):
+    """
+    Resolve free-text location to (latitude, longitude) with the bundled gazetteer.
+
+    The longest run of words naming a known place wins, so 'Koregaon Park,
+    Pune' resolves to Pune and 'Navi Mumbai' is not mistaken for Mumbai.
+    Returns None when no place is recognized.
+    """
+    places = load_gazetteer()
+    words = normalize(text).split()
+    for size in range(len(words), 0, -1):
+        for start in range(len(words) - size + 1):
+            point = places.get(' '.join(words[start:start + size]))
+            if point is not None:
+                return point
+    return None
+
+def grid_cell(latitude, longitude):
+    row = int(math.floor((latitude + 90) / CELL_DEGREES))
+    column = int(math.floor((longitude + 180) / CELL_DEGREES)) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+def bounding_box(latitude, longitude, radius_km):
+    # (south, west, north, east) of a circle; west > east when it crosses the antimeridian
+    delta_lat = radius_km / KM_PER_DEGREE
+    south, north = max(-90.0, latitude - delta_lat), min(90.0, latitude + delta_lat)
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    if cos_lat < 1e-6 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return south, -180.0, north, 180.0  # Reaches a pole: every longitude
+    delta_lng = radius_km / (KM_PER_DEGREE * cos_lat)
+    west, east = longitude - delta_lng, longitude + delta_lng
+    return south, (west + 540) % 360 - 180, north, (east + 540) % 360 - 180
+
+def cell_ranges(south, west, north, east):
+    # Contiguous (first, last) cell ranges covering a bounding box, one or two per grid row
+    first_row = grid_cell(south, 0) // GRID_COLUMNS
+    last_row = grid_cell(min(north, 90 - CELL_DEGREES / 2), 0) // GRID_COLUMNS
+    first_col, last_col = grid_cell(0, west) % GRID_COLUMNS, grid_cell(0, min(east, 180 - CELL_DEGREES / 2)) % GRID_COLUMNS
+    if west <= east:
+        spans = [(first_col, last_col)]
+    else:
+        spans = [(first_col, GRID_COLUMNS - 1), (0, last_col)]
+    return [(row * GRID_COLUMNS + a, row * GRID_COLUMNS + b) for row in range(first_row, last_row + 1) for a, b in spans]
+
+def within_box_q(south, west, north, east):
+    """
+    Q matching rows inside a bounding box.
+
+    The grid-cell ranges are answered from the `geo_cell` index; the exact
+    latitude/longitude comparison only runs on the rows those ranges return.
+    """
+    cells = Q()
+    for first, last in cell_ranges(south, west, north, east):
+        cells |= Q(geo_cell__range=(first, last)) if first != last else Q(geo_cell=first)
+    longitude = Q(longitude__gte=west, longitude__lte=east) if west <= east else Q(longitude__gte=west) | Q(longitude__lte=east)
+    return cells & Q(latitude__gte=south, latitude__lte=north) & longitude
+
+def distance_expression(latitude, longitude):
+    # Great-circle distance in km (spherical law of cosines), evaluated only on pre-filtered rows
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    cosine = (Cos(Radians(F('latitude'))) * math.cos(lat) * Cos(Radians(F('longitude')) - lng)
+              + Sin(Radians(F('latitude'))) * math.sin(lat))
+    return ACos(Least(cosine, 1.0), output_field=FloatField()) * EARTH_RADIUS_KM
+
+def geocode_existing(model):
+    # Fill coordinates of stored rows, one UPDATE per distinct location; returns rows located
+    located = 0
+    for location in model.objects.values_list('location', flat=True).distinct().order_by():
+        point = geocode(location)
+        if point:
+            located += model.objects.filter(location=location).update(
+                latitude=point[0], longitude=point[1], geo_cell=grid_cell(*point))
+    return located
+
+def is_by_distance(queryset):
+    # Check if a queryset is ordered by distance from a point
+    return DISTANCE_ANNOTATION in queryset.query.annotations
+
+class NearbyFilter(BaseFilterBackend):
+    """
+    Radius search: `?near=<lat>,<lng>` or `?near=<place name>`, with
+    `?radius=<km>` (default 20). Results are ordered nearest first and carry
+    their `distance_km`.
+    """
+    near_param = 'near'
+    radius_param = 'radius'
+    default_radius_km = 20.0
+    max_radius_km = 500.0
+
+    def get_point(self, request):
+        near = request.query_params.get(self.near_param, '').strip()
+        if not near:
+            return None
+        match = re.match(r'^(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)$', near)
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValidationError({self.near_param: 'Coordinates out of range.'})
+            return latitude, longitude
+        point = geocode(near)
+        if point is None:
+            raise ValidationError({self.near_param: 'Unknown place, pass "<latitude>,<longitude>" instead.'})
+        return point
+
+    def get_radius(self, request):
+        try:
+            radius = float(request.query_params.get(self.radius_param, self.default_radius_km))
+        except ValueError:
+            raise ValidationError({self.radius_param: 'A number of kilometres is required.'})
+        if not 0 < radius <= self.max_radius_km:
+            raise ValidationError({self.radius_param: 'Must be between 0 and %g km.' % self.max_radius_km})
+        return radius
+
+    def filter_queryset(self, request, queryset, view):
+        point = self.get_point(request)
+        if point is None:
+            return queryset
+        radius = self.get_radius(request)
+        queryset = queryset.filter(within_box_q(*bounding_box(point[0], point[1], radius)))
+        return queryset.annotate(**{DISTANCE_ANNOTATION: distance_expression(*point)}).filter(
+            **{DISTANCE_ANNOTATION + '__lte': radius}
+        ).order_by(DISTANCE_ANNOTATION, 'pk')
@@ -0,0 +1,87 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+from . import caching
+from .storage import content_addressed_storage, name_hash, content_hash
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = {'small': 64, 'medium': 256}  # Square edge in pixels
+THUMBNAIL_FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 6}), 'png': ('PNG', {'optimize': True})}
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2), thread_name_prefix='thumbnails')
+
+def thumbnail_name(digest, size, image_format):
+    return 'logos/thumbs/%s/%s-%s.%s' % (digest[:2], digest, size, image_format)
+
+def render_thumbnails(source):
+    """
+    Render every thumbnail size and format of an open image file.
+
+    Returns {size: {format: bytes}}. Logos are scaled to fit and padded with
+    transparency, so every thumbnail is exactly square.
+    """
+    with Image.open(source) as image:
+        largest = max(THUMBNAIL_SIZES.values())
+        image.draft('RGB', (largest, largest))  # Let JPEG decode at reduced scale
+        image = ImageOps.exif_transpose(image).convert('RGBA')
+        rendered = {}
+        for size, edge in THUMBNAIL_SIZES.items():
+            thumbnail = ImageOps.pad(image, (edge, edge), method=Image.LANCZOS, color=(0, 0, 0, 0))
+            rendered[size] = {}
+            for image_format, (pil_format, options) in THUMBNAIL_FORMATS.items():
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, pil_format, **options)
+                rendered[size][image_format] = buffer.getvalue()
+        return rendered
+
+def generate_logo_thumbnails(org_id, logo_name):
+    """
+    Store the thumbnails of an organization's logo and record their names.
+
+    Thumbnails are named by the logo's content hash, so organizations sharing
+    a logo share its thumbnails. Nothing is recorded if the logo changed in
+    the meantime.
+    """
+    from .models import Organization
+
+    storage = content_addressed_storage
+    with storage.open(logo_name) as source:
+        digest = name_hash(logo_name) or content_hash(source)
+        names = {
+            size: {image_format: thumbnail_name(digest, size, image_format) for image_format in THUMBNAIL_FORMATS}
+            for size in THUMBNAIL_SIZES
+        }
+        if not all(storage.exists(name) for formats in names.values() for name in formats.values()):
+            for size, formats in render_thumbnails(source).items():
+                for image_format, data in formats.items():
+                    storage.save(names[size][image_format], ContentFile(data))
+    thumbnails = {'source': logo_name, 'sizes': names}
+    # update() sends no save signals, so the listing cache is invalidated by hand
+    with transaction.atomic():
+        if Organization.objects.filter(pk=org_id, logo=logo_name).update(logo_thumbnails=thumbnails, updated=Now()):
+            caching.bump_generation_on_commit(Organization)
+    return thumbnails
+
+def _run_in_worker(org_id, logo_name):
+    try:
+        generate_logo_thumbnails(org_id, logo_name)
+    except Exception:
+        logger.exception('Could not generate thumbnails for organization %s', org_id)
+    finally:
+        connection.close()  # Worker threads hold their own connection
+
+def needs_thumbnails(organization):
+    return bool(organization.logo) and organization.logo_thumbnails.get('source') != organization.logo.name
+
+def schedule_logo_thumbnails(organization, using=None):
+    # Render in the background once the new logo is committed
+    org_id, logo_name = organization.pk, organization.logo.name
+    transaction.on_commit(lambda: executor.submit(_run_in_worker, org_id, logo_name), using=using)
@@ -0,0 +1,285 @@
+import itertools
+import json
+import os
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, migrations, models
+from django.db.backends.utils import names_digest
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test import RequestFactory
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .pagination import FeedCursorPagination
+from .views import AllOpportunitiesView, EventsView, OrganizationListView
+
+ADVISED_VIEWS = [AllOpportunitiesView, EventsView, OrganizationListView]  # List views with client-chosen filters and orderings
+
+SEARCH_TERM = 'community'
+PARTIAL_INDEX_VALUES = {'status': 'open'}  # Low-cardinality filters served by partial indexes instead of a column
+
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (\S+)(?: AS \S+)?$')
+_SQLITE_INDEX_SCAN = re.compile(r'^SCAN (\S+)(?: AS \S+)? USING (?:COVERING )?INDEX (\S+)')
+
+class Case:
+    """
+    One way of calling a list view: its filters, search, ordering and
+    pagination mode, with the SQL it ran and the problems found in the plans.
+    """
+
+    def __init__(self, view_class, filters, search, ordering, pagination):
+        self.view_class = view_class
+        self.filters = filters          # Filter field names, in filterset order
+        self.search = search
+        self.ordering = ordering        # ?ordering= value, or None
+        self.pagination = pagination    # 'cursor', 'offset' or None (the view's default)
+        self.statements = []            # (sql, plan lines)
+        self.issues = []
+
+    @property
+    def model(self):
+        return self.view_class.queryset.model
+
+    def params(self, values):
+        params = {name: values[name] for name in self.filters}
+        if self.search:
+            params['search'] = SEARCH_TERM
+        if self.ordering:
+            params['ordering'] = self.ordering
+        if self.pagination == 'offset':
+            params[FeedCursorPagination.mode_query_param] = FeedCursorPagination.offset_mode
+        return params
+
+    def page_ordering(self):
+        # Column order the page query sorts by
+        if self.search:
+            return None  # Ranked by relevance
+        if self.ordering:
+            return [self.ordering]
+        if self.pagination == 'cursor':
+            return list(self.view_class.pagination_class.ordering)
+        return []
+
+    def describe(self):
+        parts = ['%s=...' % name for name in self.filters]
+        if self.search:
+            parts.append('search=%s' % SEARCH_TERM)
+        if self.ordering:
+            parts.append('ordering=%s' % self.ordering)
+        if self.pagination:
+            parts.append('pagination=%s' % self.pagination)
+        return '%s ?%s' % (self.view_class.__name__, '&'.join(parts) if parts else '(no parameters)')
+
+def cases(view_class):
+    # Every combination of filters, search, ordering and pagination mode the view accepts
+    filters = list(view_class.filterset_fields)
+    searches = [False, True] if any(issubclass(backend, SearchFilter) for backend in view_class.filter_backends) else [False]
+    orderings = [None]
+    if any(issubclass(backend, OrderingFilter) for backend in view_class.filter_backends):
+        orderings += [prefix + field for field in view_class.ordering_fields for prefix in ('', '-')]
+    paginations = [None]
+    if view_class.pagination_class and issubclass(view_class.pagination_class, FeedCursorPagination):
+        paginations = ['cursor', 'offset']
+    for size in range(len(filters) + 1):
+        for chosen in itertools.combinations(filters, size):
+            for search, ordering, pagination in itertools.product(searches, orderings, paginations):
+                yield Case(view_class, list(chosen), search, ordering, pagination)
+
+def sample_values(model, names):
+    # A value present in the data for every filter, as a query parameter
+    values = {}
+    for name in names:
+        if name in PARTIAL_INDEX_VALUES:
+            values[name] = PARTIAL_INDEX_VALUES[name]
+            continue
+        value = model.objects.exclude(**{'%s__isnull' % name: True}).values_list(name, flat=True).first()
+        values[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return values
+
+def distinct_counts(model, names):
+    # Number of distinct values per concrete column, to pick the most selective one
+    return {name: model.objects.values(name).distinct().count() for name in names}
+
+def run_case(case, values, using='default'):
+    """
+    Run the view's filtering and pagination for a case and record the SQL.
+    The view is driven directly, so permissions and response caching are skipped.
+    """
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    view = case.view_class()
+    request = view.initialize_request(RequestFactory().get('/', case.params(values), HTTP_HOST=host))
+    view.request, view.args, view.kwargs, view.format_kwarg = request, (), {}, None
+    view.headers = {}
+
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        page = view.paginate_queryset(view.filter_queryset(view.get_queryset()))
+        if page is not None:
+            list(page)
+    return statements
+
+def explain(sql, params, using='default'):
+    """
+    Return (plan lines, issues) for a statement. Issues are full scans of
+    filtered tables, scans of a whole index to apply a filter it does not
+    cover, and sorts in a temporary B-tree (SQLite) or Sort node (PostgreSQL).
+    """
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return _postgres_issues(plan[0]['Plan'])
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        lines = [row[-1] for row in cursor.fetchall()]
+    issues = []
+    filtered = ' WHERE ' in sql.upper()  # Reading every row is expected when there is nothing to filter by
+    for line in lines:
+        if 'VIRTUAL TABLE' in line or 'SUBQUERY' in line.upper():
+            continue  # Full-text index lookups and derived tables (counts of DISTINCT pages)
+        full_scan = _SQLITE_FULL_SCAN.match(line)
+        index_scan = _SQLITE_INDEX_SCAN.match(line)
+        if full_scan and filtered:
+            issues.append('full scan of %s' % full_scan.group(1))
+        elif index_scan and filtered and index_scan.group(2) not in partial_indexes():
+            issues.append('scan of %s through %s' % index_scan.groups())
+        elif line.startswith('USE TEMP B-TREE'):
+            issues.append('temp B-tree ' + line[len('USE TEMP B-TREE '):].lower())
+    return lines, issues
+
+def partial_indexes():
+    # Names of partial indexes: scanning one whole is reading only the rows its condition selects
+    return {index.name for model in apps.get_models() for index in model._meta.indexes if index.condition is not None}
+
+def _postgres_issues(node, lines=None, issues=None, depth=0):
+    lines = [] if lines is None else lines
+    issues = [] if issues is None else issues
+    relation = node.get('Relation Name', '')
+    lines.append('%s%s %s' % ('  ' * depth, node['Node Type'], relation).rstrip())
+    if node['Node Type'] == 'Seq Scan' and 'Filter' in node:
+        issues.append('full scan of %s' % relation)
+    elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+        issues.append('sort by %s' % ', '.join(node.get('Sort Key', [])))
+    for child in node.get('Plans', []):
+        _postgres_issues(child, lines, issues, depth + 1)
+    return lines, issues
+
+def existing_indexes(model):
+    # (fields, condition) of the indexes the model already has, including those Django adds for keys
+    found = set()
+    for index in model._meta.indexes:
+        found.add((tuple(field.lstrip('-') for field in index.fields), _condition_key(index.condition)))
+    for constraint in model._meta.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields:
+            found.add((tuple(constraint.fields), _condition_key(constraint.condition)))
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.unique or field.db_index:
+            found.add(((field.name,), None))
+    return found
+
+def _condition_key(condition):
+    return None if condition is None else tuple(sorted(condition.children))
+
+def recommend(case, selectivity):
+    """
+    Return (fields, condition) for an index serving the case's page query,
+    or None when no single index would help.
+
+    The most selective equality filter leads, followed by the page order, so
+    the index answers both the WHERE and the ORDER BY. Filters listed in
+    PARTIAL_INDEX_VALUES become the index condition instead of a column.
+    """
+    ordering = case.page_ordering()
+    if ordering is None:
+        return None
+    condition = {name: PARTIAL_INDEX_VALUES[name] for name in case.filters if name in PARTIAL_INDEX_VALUES}
+    columns = [name for name in case.filters if name not in condition and not case.model._meta.get_field(name).many_to_many]
+    fields = []
+    if columns:
+        fields.append(max(columns, key=lambda name: (selectivity[name], -columns.index(name))))
+    # Direction is dropped: an index serves an ORDER BY scanned either way when all columns share a direction
+    fields += [field.lstrip('-') for field in ordering if field.lstrip('-') not in fields]
+    if not fields:
+        return None
+    return tuple(fields), tuple(sorted(condition.items())) or None
+
+def prune(recommendations, model):
+    # Drop indexes made redundant by a longer one with the same leading columns, or by an existing index
+    existing = existing_indexes(model)
+    kept = []
+    for fields, condition in sorted(set(recommendations), key=lambda item: -len(item[0])):
+        covered = any(other[:len(fields)] == fields and other_condition == condition
+                      for other, other_condition in list(existing) + kept)
+        if not covered:
+            kept.append((fields, condition))
+    return sorted(kept, key=lambda item: (item[1] is not None, item[0]))
+
+def build_index(model, fields, condition):
+    # Named like Index.set_name_with_model(), with the condition in the digest so partial and full indexes differ
+    digest = names_digest(model._meta.db_table, *fields, repr(condition), length=6)
+    name = '%s_%s_%s_idx' % (model._meta.db_table[:11], fields[0][:7], digest)
+    return models.Index(fields=list(fields), condition=models.Q(*condition) if condition else None, name=name)
+
+def advise(views=ADVISED_VIEWS, using='default'):
+    """
+    Run every case of the views against the database and collect the plan
+    issues, leaving out filters no row has a value for. Returns (cases,
+    {model: [recommended models.Index]}).
+    """
+    results = []
+    recommendations = {}
+    for view_class in views:
+        model = view_class.queryset.model
+        names = list(view_class.filterset_fields)
+        values = sample_values(model, names)
+        selectivity = distinct_counts(model, [name for name in names if not model._meta.get_field(name).many_to_many])
+        for case in cases(view_class):
+            if any(values[name] is None for name in case.filters):
+                continue  # No row holds a value to filter by
+            for sql, params in run_case(case, values, using):
+                lines, issues = explain(sql, params, using)
+                case.statements.append((sql, lines))
+                case.issues += issues
+            results.append(case)
+            recommended = recommend(case, selectivity) if case.issues else None
+            if recommended:
+                recommendations.setdefault(model, []).append(recommended)
+    indexes = {model: [build_index(model, *item) for item in prune(items, model)] for model, items in recommendations.items()}
+    indexes = {model: model_indexes for model, model_indexes in indexes.items() if model_indexes}
+    return results, indexes
+
+def index_source(index):
+    # How the index reads in a model's Meta.indexes
+    source = 'models.Index(fields=%r' % index.fields
+    if index.condition is not None:
+        source += ', condition=models.Q(%s)' % ', '.join('%s=%r' % child for child in index.condition.children)
+    return source + ', name=%r)' % index.name
+
+def write_migration(indexes, name, app_label='main'):
+    """
+    Write a migration adding the indexes after the app's latest migration.
+    Returns the path of the new file.
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    leaf = max(loader.graph.leaf_nodes(app_label))
+    number = int(leaf[1].split('_')[0]) + 1
+    migration = migrations.Migration('%04d_%s' % (number, name), app_label)
+    migration.dependencies = [leaf]
+    migration.operations = [
+        migrations.AddIndex(model_name=model._meta.model_name, index=index)
+        for model, model_indexes in indexes.items() for index in model_indexes
+    ]
+    writer = MigrationWriter(migration)
+    os.makedirs(os.path.dirname(writer.path), exist_ok=True)
+    with open(writer.path, 'w') as f:
+        f.write(writer.as_string())
+    return writer.path
@@ -0,0 +1,192 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('main.requests')
+slow_logger = logging.getLogger('main.requests.slow')
+
+PHASES = ['view', 'db', 'render']  # Server-Timing order; db overlaps the view and render phases running queries
+
+_current = ContextVar('request_timings', default=None)
+_profiler_lock = threading.Lock()  # Only one cProfile profiler may be active at a time, so sampled requests take turns
+
+class RequestTimings:
+    """
+    Phase durations and SQL statistics of one request: `view` from the call
+    of the view until it returns, `render` for rendering its response after
+    that, and `db` for the SQL run during either.
+    """
+
+    def __init__(self, record_statements=False):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.statements = [] if record_statements else None  # (sql, seconds) for the slow-request profiler
+        self.view_started = None
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+
+    def end_view(self):
+        # Once per request, when the view returned a response to render or else when the response is complete
+        if self.view_started is not None:
+            self.durations['view'] = time.perf_counter() - self.view_started
+            self.view_started = None
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.durations['db'] += seconds
+        if self.statements is not None:
+            self.statements.append((sql, seconds))
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        # Server-Timing header value, durations in milliseconds
+        entries = []
+        for name, seconds in self.durations.items():
+            if seconds or name == 'db':
+                entry = '%s;dur=%.2f' % (name, seconds * 1000)
+                entries.append(entry + (';desc="%d queries"' % self.queries if name == 'db' else ''))
+        entries.append('total;dur=%.2f' % (total * 1000))
+        return ', '.join(entries)
+
+    def log_fields(self, request, response, total):
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': self.queries,
+        }
+        fields.update(('%s_ms' % name, round(seconds * 1000, 2)) for name, seconds in self.durations.items())
+        return fields
+
+def _record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.record_query(sql, time.perf_counter() - began)
+
+@contextmanager
+def recording_queries():
+    # Report the SQL of this thread's connections to the current request while the block runs
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(_record_query))
+        yield
+
+class ServerTimingMiddleware:
+    """
+    Time each request's phases and SQL, and report them to the per-route
+    metrics, as a Server-Timing header with SERVER_TIMING on, and as one
+    `main.requests` DEBUG log line.
+
+    With SLOW_REQUEST_PROFILING on, a sample of synchronous requests runs
+    under cProfile; those slower than SLOW_REQUEST_THRESHOLD_MS log their
+    SQL statements and a profile summary to `main.requests.slow`.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profiler = self.start_profiler()
+        timings = RequestTimings(record_statements=profiler is not None)
+        token = _current.set(timings)
+        try:
+            with recording_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                _profiler_lock.release()
+        return self.finish(request, response, timings, profiler)
+
+    async def __acall__(self, request):
+        # cProfile would see every request sharing the event loop, so async requests are never profiled
+        timings = RequestTimings()
+        token = _current.set(timings)
+        # The ORM runs in the request's thread-sensitive thread, so the recorder is added to its connections there
+        queries = recording_queries()
+        await sync_to_async(queries.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.__exit__)(None, None, None)
+            _current.reset(token)
+        return self.finish(request, response, timings, None)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.start_view()
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns; time that too
+        timings = _current.get()
+        if timings is not None:
+            timings.end_view()
+            began = time.perf_counter()
+
+            def rendered(response):
+                timings.durations['render'] += time.perf_counter() - began
+            response.add_post_render_callback(rendered)
+        return response
+
+    def start_profiler(self):
+        if not getattr(settings, 'SLOW_REQUEST_PROFILING', False):
+            return None
+        if random.random() >= getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 0.01) or not _profiler_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, request, response, timings, profiler):
+        timings.end_view()
+        total = timings.total()
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = timings.server_timing(total)
+        if logger.isEnabledFor(logging.DEBUG):
+            fields = timings.log_fields(request, response, total)
+            logger.debug(' '.join('%s=%s' % item for item in fields.items()), extra={'timings': fields})
+        metrics.record_response(request, response, total, timings)
+        if profiler is not None and total * 1000 >= getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500):
+            self.dump_profile(request, total, timings, profiler)
+        return response
+
+    def dump_profile(self, request, total, timings, profiler):
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).strip_dirs().sort_stats('cumulative').print_stats(25)
+        statements = sorted(timings.statements, key=lambda statement: statement[1], reverse=True)
+        sql = '\n'.join('%8.2f ms  %s' % (seconds * 1000, statement) for statement, seconds in statements[:50])
+        slow_logger.warning(
+            'Slow request %s %s took %.0f ms with %d queries\n-- SQL (slowest first)\n%s\n-- Profile\n%s',
+            request.method, request.get_full_path(), total * 1000, timings.queries, sql, summary.getvalue(),
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main import datagen, indexadvisor
+
+SEED_COUNTS = {
+    'organizations': 50,
+    'volunteers': 200,
+    'opportunities': 5000,
+    'events': 2000,
+    'applications': 0,
+    'reviews': 500,
+    'registrations': 0,
+}
+
+class Command(BaseCommand):
+    help = ('Explain every filter, search and ordering combination of the list views, report full scans and sorts, '
+            'and recommend indexes for them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to explain against')
+        parser.add_argument('--seed', action='store_true', help='Explain against a temporary test database filled by generate_data, instead of the existing data')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiplier of the seeded row counts')
+        parser.add_argument('--write-migration', action='store_true', help='Write a migration adding the recommended indexes')
+        parser.add_argument('--name', default='advised_indexes', help='Name of the written migration')
+        parser.add_argument('--plans', action='store_true', help='Print the SQL and query plan of every problem statement')
+
+    def handle(self, *args, **options):
+        conn = connections[options['database']]
+        old_name = None
+        if options['seed']:
+            old_name = conn.creation.create_test_db(verbosity=0, autoclobber=True)
+            datagen.generate({name: int(count * options['scale']) for name, count in SEED_COUNTS.items()}, partitions=1)
+        try:
+            cases, indexes = indexadvisor.advise(using=options['database'])
+        finally:
+            if old_name is not None:
+                conn.creation.destroy_test_db(old_name, verbosity=0)
+
+        problems = [case for case in cases if case.issues]
+        for case in problems:
+            self.stdout.write('%s: %s' % (case.describe(), '; '.join(sorted(set(case.issues)))))
+            if options['plans']:
+                for sql, lines in case.statements:
+                    self.stdout.write('    %s' % sql)
+                    for line in lines:
+                        self.stdout.write('      %s' % line)
+        self.stdout.write('%d of %d combinations have full scans or sorts' % (len(problems), len(cases)))
+
+        if not indexes:
+            self.stdout.write(self.style.SUCCESS('No indexes to recommend'))
+            return
+        self.stdout.write('Recommended indexes (add them to the Meta.indexes of each model):')
+        for model, model_indexes in indexes.items():
+            self.stdout.write('  %s:' % model.__name__)
+            for index in model_indexes:
+                self.stdout.write('    %s,' % indexadvisor.index_source(index))
+        if options['write_migration']:
+            path = indexadvisor.write_migration(indexes, options['name'])
+            self.stdout.write(self.style.SUCCESS('Wrote %s' % path))
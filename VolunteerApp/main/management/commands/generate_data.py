@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import datagen
+
+COUNTS = {
+    'organizations': 100,
+    'volunteers': 2000,
+    'opportunities': 10000,
+    'events': 5000,
+    'applications': 50000,
+    'reviews': 10000,
+    'registrations': 50000,
+}
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic graph of volunteers, organizations and their activity with bulk inserts (for load testing)'
+
+    def add_arguments(self, parser):
+        for name, default in COUNTS.items():
+            parser.add_argument('--%s' % name, type=int, default=default, help='Number of %s (default %d)' % (name, default))
+        parser.add_argument('--partitions', type=int, default=8, help='Independent partitions the rows are split into')
+        parser.add_argument('--workers', type=int, default=1, help='Processes generating partitions in parallel (SQLite takes one writer at a time, so this pays off on PostgreSQL)')
+        parser.add_argument('--seed', type=int, default=0, help='Same seed and partitions give the same rows')
+        parser.add_argument('--prefix', default='gen', help='Tag in generated names, change it to generate into a non-empty database again')
+        parser.add_argument('--password', default='volunteer', help='Password of every generated account')
+        parser.add_argument('--batch-size', type=int, default=datagen.DEFAULT_BATCH_SIZE, help='Rows per INSERT transaction')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(partition, created):
+            self.stdout.write('Partition %d: %s' % (partition, ', '.join('%d %s' % (count, name) for name, count in created.items())))
+
+        totals = datagen.generate(
+            {name: options[name] for name in COUNTS}, partitions=max(options['partitions'], 1), workers=options['workers'],
+            seed=options['seed'], prefix=options['prefix'], password=options['password'],
+            batch_size=options['batch_size'], progress=progress,
+        )
+        rows = sum(totals.values())
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS('Generated %d rows in %.1fs (%.0f rows/s): %s' % (
+            rows, elapsed, rows / elapsed if elapsed else 0, ', '.join('%d %s' % (count, name) for name, count in totals.items()))))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main.images import generate_logo_thumbnails, needs_thumbnails
+from main.models import Organization
+
+class Command(BaseCommand):
+    help = 'Render missing logo thumbnails (e.g. for logos uploaded before the thumbnail pipeline)'
+
+    def handle(self, *args, **options):
+        rendered = 0
+        for organization in Organization.objects.exclude(logo='').exclude(logo__isnull=True).only('id', 'logo', 'logo_thumbnails').iterator():
+            if needs_thumbnails(organization):
+                generate_logo_thumbnails(organization.id, organization.logo.name)
+                rendered += 1
+        self.stdout.write(self.style.SUCCESS('Rendered thumbnails for %d organizations' % rendered))
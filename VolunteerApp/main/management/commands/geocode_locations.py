@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main import geo
+from main.models import Event, Opportunity
+
+class Command(BaseCommand):
+    help = 'Fill coordinates of opportunities and events from the bundled gazetteer (e.g. after it was extended)'
+
+    def handle(self, *args, **options):
+        for model in (Opportunity, Event):
+            located = geo.geocode_existing(model)
+            self.stdout.write(self.style.SUCCESS('Located %d %s rows' % (located, model._meta.verbose_name)))
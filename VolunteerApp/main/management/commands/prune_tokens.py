@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from main.blacklist import prune_expired_tokens
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted refresh tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens deleted per transaction')
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Pruned %d expired tokens' % deleted))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.ratings import rebuild_ratings
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized review aggregates of every organization'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Organizations written per UPDATE batch')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt ratings for %d organizations' % updated))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.registrations import rebuild_registered_counts
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized registration count of every event'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = rebuild_registered_counts()
+        self.stdout.write(self.style.SUCCESS('Corrected registration counts of %d events' % changed))
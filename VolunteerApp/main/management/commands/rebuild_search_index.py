@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from main import search
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for opportunities, organizations and events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        conn = connections[options['database']]
+        if not search.is_supported(conn):
+            raise CommandError('Full-text search is not supported on %s' % conn.vendor)
+        with transaction.atomic(using=options['database']):
+            search.rebuild_index(conn)
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,121 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import name_hash
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # Content-addressed files never change
+MUTABLE_MAX_AGE = 24 * 60 * 60
+
+DIGEST_CACHE_SIZE = 4096  # Digests of legacy files kept per process, least recently used dropped first
+
+# Compressed copies that may be stored next to a file (e.g. logo.svg.gz), served with their
+# Content-Encoding to clients that accept it; preferred first
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+
+def file_digest(path, stat):
+    # sha256 of a legacy (not content-addressed) file, cached until it changes
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _digests_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            _digests.move_to_end(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+            while len(_digests) > DIGEST_CACHE_SIZE:
+                _digests.popitem(last=False)
+    return digest
+
+def accepted_encodings(request):
+    # Content codings the client accepts, leaving out those refused with q=0
+    encodings = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        try:
+            refused = any(param.startswith('q=') and float(param[2:]) == 0 for param in params)
+        except ValueError:
+            refused = True
+        if coding and not refused:
+            encodings.add(coding.lower())
+    return encodings
+
+def find_precompressed(full_path, encodings):
+    """
+    Return (encoding, path, stat) of a compressed copy of `full_path` in one of
+    `encodings`, and whether any compressed copy is stored at all.
+    """
+    found, stored = None, False
+    for encoding, suffix in PRECOMPRESSED:
+        try:
+            stat = os.stat(full_path + suffix)
+        except OSError:
+            continue
+        stored = True
+        if found is None and encoding in encodings:
+            found = (encoding, full_path + suffix, stat)
+    return found, stored
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve an uploaded file with a strong ETag and long-lived caching headers.
+
+    Content-addressed files carry their hash in their name, so the ETag costs
+    nothing and the file is cached as immutable. A compressed copy stored
+    next to the file is served instead to clients accepting its encoding.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    content_type = mimetypes.guess_type(full_path)[0]
+    precompressed, vary = find_precompressed(full_path, accepted_encodings(request))
+    encoding = None
+    if precompressed is not None:
+        encoding, full_path, stat = precompressed
+
+    digest = name_hash(path)
+    immutable = digest is not None
+    if digest and encoding:
+        digest = '%s-%s' % (digest, encoding)  # Each representation has its own strong ETag
+    etag = '"%s"' % (digest or file_digest(full_path, stat))
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if encoding:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type or 'application/octet-stream')
+            response['Content-Encoding'] = encoding
+        else:
+            response = FileResponse(open(full_path, 'rb'))  # Typed by name; a stored .gz is served as application/gzip
+        response['Content-Length'] = stat.st_size
+    if vary:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        response['Cache-Control'] = 'public, max-age=%d, immutable' % IMMUTABLE_MAX_AGE
+    else:
+        response['Cache-Control'] = 'public, max-age=%d' % MUTABLE_MAX_AGE
+    return response
@@ -0,0 +1,296 @@
+import bisect
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+# Prometheus metrics shared by every worker process. Each process appends to its own memory-mapped
+# file in METRICS_DIR (one writer per file, so no cross-process locking); /metrics sums the files
+# of all processes. Files of exited processes are folded into one merged file, so restarts keep
+# their counts without the directory growing. Files are named by process id, so the directory
+# must be local to one host.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds; +Inf is implied
+
+METRICS = {
+    # name: (type, help)
+    'api_requests_total': ('counter', 'Requests handled, by route, method and status code.'),
+    'api_request_duration_seconds': ('histogram', 'Time spent handling requests, by route and method.'),
+    'api_db_queries_total': ('counter', 'Database queries run by requests, by route and method.'),
+    'api_db_duration_seconds_total': ('counter', 'Time spent in database queries, by route and method.'),
+    'api_cache_requests_total': ('counter', 'Response cache lookups, by route and result (hit or miss).'),
+}
+
+UNMATCHED_ROUTE = 'unmatched'  # Requests that resolved to no named route, e.g. 404s
+
+MERGED_FILE = 'merged.db'  # Samples of exited processes
+LOCK_FILE = 'merge.lock'   # Held exclusively while merging, shared while reading
+
+_HEADER = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+class MmapValues:
+    """
+    Append-only table of float64 values keyed by strings, in a memory-mapped file.
+
+    Entries are [key length][key, padded to 8 bytes][value]; the first 8
+    bytes hold the number of bytes used. Only the owning process writes;
+    any process may read the file with `read()`.
+    """
+    initial_size = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.initial_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.values = memoryview(self._map).cast('d')  # Values are 8-byte aligned: value i is at byte 8 * i
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or 8
+        self.positions = {key: position for key, _, position in self._entries(self._map, self._used)}
+
+    @staticmethod
+    def _entries(data, used):
+        offset = 8
+        while offset < used:
+            length = _HEADER.unpack_from(data, offset)[0]
+            key_end = offset + 4 + length
+            position = key_end + (-(4 + length) % 8)
+            yield bytes(data[offset + 4:key_end]).decode(), _VALUE.unpack_from(data, position)[0], position
+            offset = position + 8
+
+    @classmethod
+    def read(cls, path):
+        # (key, value) pairs of a file another process may be writing
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < 8:
+            return []
+        return [(key, value) for key, value, _ in cls._entries(data, _HEADER.unpack_from(data, 0)[0])]
+
+    def index(self, key):
+        # Index of the key's value in `values`, appending a zero entry the first time
+        position = self.positions.get(key)
+        if position is None:
+            encoded = key.encode()
+            padding = -(4 + len(encoded)) % 8
+            size = 4 + len(encoded) + padding + 8
+            while self._used + size > len(self._map):
+                self._grow()
+            _HEADER.pack_into(self._map, self._used, len(encoded))
+            self._map[self._used + 4:self._used + 4 + len(encoded)] = encoded
+            position = self._used + 4 + len(encoded) + padding
+            _VALUE.pack_into(self._map, position, 0.0)
+            self._used += size
+            _HEADER.pack_into(self._map, 0, self._used)  # Published last, so readers never see half an entry
+            self.positions[key] = position
+        return position // 8
+
+    def close(self):
+        self.values.release()
+        self._map.close()
+        self._file.close()
+
+    def _grow(self):
+        self.values.release()
+        self._map.close()
+        self._file.truncate(os.fstat(self._file.fileno()).st_size * 2)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.values = memoryview(self._map).cast('d')
+
+def sample_key(name, labels):
+    return json.dumps([name, labels], separators=(',', ':'))
+
+class Registry:
+    """
+    Per-process writer of the API metrics.
+
+    Value indexes are resolved once per label set, so recording a request
+    is a handful of in-place float additions.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._values = None
+        self._indexes_by_series = {}
+        os.register_at_fork(after_in_child=self._reset)  # Forked workers must not write to their parent's file
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = None
+
+    def get_directory(self):
+        return self.directory or settings.METRICS_DIR
+
+    def _open(self):
+        directory = self.get_directory()
+        os.makedirs(directory, exist_ok=True)
+        merge_exited_processes(directory)  # Workers start when others exited, e.g. on a restart
+        self._values = MmapValues(os.path.join(directory, '%d.db' % os.getpid()))
+        self._indexes_by_series = {}
+
+    def _indexes(self, route, method, status):
+        values, labels = self._values, {'route': route, 'method': method}
+        buckets = [values.index(sample_key('api_request_duration_seconds_bucket', dict(labels, le=repr(bound))))
+                   for bound in LATENCY_BUCKETS + (float('inf'),)]
+        return (
+            values.index(sample_key('api_requests_total', dict(labels, status=str(status)))),
+            buckets,
+            values.index(sample_key('api_request_duration_seconds_sum', labels)),
+            values.index(sample_key('api_request_duration_seconds_count', labels)),
+            values.index(sample_key('api_db_queries_total', labels)),
+            values.index(sample_key('api_db_duration_seconds_total', labels)),
+            values.index(sample_key('api_cache_requests_total', {'route': route, 'result': 'hit'})),
+            values.index(sample_key('api_cache_requests_total', {'route': route, 'result': 'miss'})),
+        )
+
+    def record(self, route, method, status, seconds, queries=0, db_seconds=0.0, cache_hit=None):
+        with self._lock:
+            if self._values is None:
+                self._open()
+            indexes = self._indexes_by_series.get((route, method, status))
+            if indexes is None:
+                indexes = self._indexes_by_series[(route, method, status)] = self._indexes(route, method, status)
+            requests, buckets, total, count, query_count, db_time, hits, misses = indexes
+            values = self._values.values
+            values[requests] += 1
+            values[buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)]] += 1  # Stored per bucket, summed on export
+            values[total] += seconds
+            values[count] += 1
+            if queries:
+                values[query_count] += queries
+                values[db_time] += db_seconds
+            if cache_hit is not None:
+                values[hits if cache_hit else misses] += 1
+
+registry = Registry()
+
+def record_response(request, response, seconds, timings=None):
+    # Record a finished request under its route name
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return
+    match = getattr(request, 'resolver_match', None)
+    route = match.view_name if match is not None and match.url_name else UNMATCHED_ROUTE
+    cache = response.get('X-Cache')
+    registry.record(
+        route, request.method, response.status_code, seconds,
+        queries=timings.queries if timings else 0,
+        db_seconds=timings.durations['db'] if timings else 0.0,
+        cache_hit=None if cache is None else cache == 'HIT',
+    )
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running as another user
+    return True
+
+def _exited_process_files(directory):
+    paths = []
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        pid = os.path.basename(path)[:-len('.db')]
+        if pid.isdigit() and not _is_running(int(pid)):
+            paths.append(path)
+    return paths
+
+def merge_exited_processes(directory):
+    """
+    Add the samples of exited processes to the merged file and delete their
+    files. Returns the number of files merged.
+    """
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # Two merges of one file would count it twice
+        paths = _exited_process_files(directory)
+        if not paths:
+            return 0
+        merged = MmapValues(os.path.join(directory, MERGED_FILE))
+        try:
+            for path in paths:
+                for key, value in MmapValues.read(path):
+                    index = merged.index(key)  # May grow the file, replacing `values`
+                    merged.values[index] += value
+                os.remove(path)
+        finally:
+            merged.close()
+        return len(paths)
+
+def collect(directory):
+    # Sum every process file into {sample key: value}
+    totals = defaultdict(float)
+    if not os.path.isdir(directory):
+        return totals
+    merge_exited_processes(directory)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)  # A merge in progress would show its samples twice
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            for key, value in MmapValues.read(path):
+                totals[key] += value
+    return totals
+
+def _format_labels(labels):
+    escaped = ('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+               for name, value in labels.items())
+    return '{%s}' % ','.join(escaped)
+
+def _format_value(value):
+    return repr(int(value)) if value == int(value) else repr(value)
+
+def render(totals):
+    """
+    Render summed samples in the Prometheus text exposition format.
+    Histogram buckets are stored per bucket and made cumulative here.
+    """
+    samples = defaultdict(list)
+    for key, value in totals.items():
+        name, labels = json.loads(key)
+        samples[name].append((labels, value))
+
+    lines = []
+    for metric, (metric_type, help_text) in METRICS.items():
+        lines.append('# HELP %s %s' % (metric, help_text))
+        lines.append('# TYPE %s %s' % (metric, metric_type))
+        if metric_type != 'histogram':
+            for labels, value in sorted(samples[metric], key=lambda sample: tuple(sample[0].items())):
+                lines.append('%s%s %s' % (metric, _format_labels(labels), _format_value(value)))
+            continue
+        buckets = defaultdict(dict)
+        for labels, value in samples[metric + '_bucket']:
+            series = tuple((name, value) for name, value in labels.items() if name != 'le')
+            buckets[series][float(labels['le'])] = value
+        sums = {tuple(labels.items()): value for labels, value in samples[metric + '_sum']}
+        counts = {tuple(labels.items()): value for labels, value in samples[metric + '_count']}
+        for series in sorted(buckets):
+            cumulative = 0.0
+            for bound in sorted(buckets[series]):
+                cumulative += buckets[series][bound]
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket%s %s' % (metric, _format_labels(dict(series, le=le)), _format_value(cumulative)))
+            lines.append('%s_sum%s %s' % (metric, _format_labels(dict(series)), _format_value(sums.get(series, 0.0))))
+            lines.append('%s_count%s %s' % (metric, _format_labels(dict(series)), _format_value(counts.get(series, 0.0))))
+    return '\n'.join(lines) + '\n'
+
+def is_scrape_allowed(request):
+    # Open in debug mode; otherwise only for `Authorization: Bearer <METRICS_TOKEN>` or from INTERNAL_IPS
+    if settings.DEBUG or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), 'Bearer ' + token)
+
+def metrics_view(request):
+    # Prometheus scrape endpoint
+    if not is_scrape_allowed(request):
+        return HttpResponseForbidden()
+    body = render(collect(registry.get_directory()))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_alter_application_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'id'], name='event_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['date_posted', 'id'], name='opportunity_feed_idx'),
+        ),
+    ]
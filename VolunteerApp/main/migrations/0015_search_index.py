@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# Index tables as of this migration, frozen here so later changes to main.search cannot change its DDL:
+# (index table, source table, indexed fields), the first field weighted as the title
+SEARCH_DOCUMENTS = [
+    ('main_search_opportunity', 'main_opportunity', ['title', 'description', 'requirements', 'location']),
+    ('main_search_organization', 'main_organization', ['name', 'mission', 'description']),
+    ('main_search_event', 'main_event', ['title', 'description']),
+]
+
+
+def pg_document_sql(fields):
+    parts = []
+    for i, field in enumerate(fields):
+        weight = 'A' if i == 0 else 'B'
+        parts.append("setweight(to_tsvector('english', coalesce(%s, '')), '%s')" % (field, weight))
+    return ' || '.join(parts)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, source, fields in SEARCH_DOCUMENTS:
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, tokenize='porter unicode61')" % (table, ', '.join(fields))
+            )
+            schema_editor.execute(
+                'INSERT INTO %s (rowid, %s) SELECT id, %s FROM %s' % (table, ', '.join(fields), ', '.join(fields), source)
+            )
+        elif vendor == 'postgresql':
+            schema_editor.execute('CREATE TABLE IF NOT EXISTS %s (id bigint PRIMARY KEY, document tsvector NOT NULL)' % table)
+            schema_editor.execute('CREATE INDEX IF NOT EXISTS %s_document ON %s USING GIN (document)' % (table, table))
+            schema_editor.execute(
+                'INSERT INTO %s (id, document) SELECT id, %s FROM %s ON CONFLICT (id) DO NOTHING'
+                % (table, pg_document_sql(fields), source)
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    for table, _, _ in SEARCH_DOCUMENTS:
+        schema_editor.execute('DROP TABLE IF EXISTS %s' % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:11
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_ratings(apps, schema_editor):
+    Organization = apps.get_model('main', 'Organization')
+    Review = apps.get_model('main', 'Review')
+    stats = {}
+    for row in Review.objects.values('org_id', 'rating').annotate(count=Count('id')).order_by():
+        stats.setdefault(row['org_id'], {})[row['rating']] = row['count']
+    for org_id, histogram in stats.items():
+        count = sum(histogram.values())
+        total = sum(rating * n for rating, n in histogram.items())
+        fields = {'rating_%d' % rating: n for rating, n in histogram.items()}
+        Organization.objects.filter(id=org_id).update(
+            rating_count=count, rating_sum=total, rating_average=total / count, **fields
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='rating_0',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_average',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
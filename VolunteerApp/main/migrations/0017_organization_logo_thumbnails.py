@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:24
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_organization_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='logo_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='organization',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.ContentAddressedStorage(), upload_to=main.storage.logo_upload_to),
+        ),
+    ]
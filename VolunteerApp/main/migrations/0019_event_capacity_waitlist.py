@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def deduplicate_registrations(apps, schema_editor):
+    # Keep the earliest registration of each (event, user) pair so the unique constraint can be added
+    EventRegistration = apps.get_model('main', 'EventRegistration')
+    duplicates = (EventRegistration.objects.values('event_id', 'user_id')
+                  .annotate(first=Min('id'), rows=Count('id')).filter(rows__gt=1).order_by())
+    for row in duplicates:
+        EventRegistration.objects.filter(event_id=row['event_id'], user_id=row['user_id']).exclude(id=row['first']).delete()
+
+
+def backfill_registered_counts(apps, schema_editor):
+    Event = apps.get_model('main', 'Event')
+    EventRegistration = apps.get_model('main', 'EventRegistration')
+    for row in EventRegistration.objects.values('event_id').annotate(count=Count('id')).order_by():
+        Event.objects.filter(id=row['event_id']).update(registered_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_updated_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='registered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(deduplicate_registrations, migrations.RunPython.noop),
+        migrations.RunPython(backfill_registered_counts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eventregistration',
+            constraint=models.UniqueConstraint(fields=('event', 'user'), name='unique_event_registration'),
+        ),
+        migrations.CreateModel(
+            name='EventWaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='main.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='main.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'joined_at', 'id'], name='event_waitlist_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'user'), name='unique_event_waitlist_entry')],
+            },
+        ),
+    ]
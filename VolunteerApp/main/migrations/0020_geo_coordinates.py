@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:29
+
+import csv
+import math
+import os
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copies of main.geo as of this migration, so later changes to it never alter what this writes
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'gazetteer.csv')
+CELL_DEGREES = 0.1
+GRID_COLUMNS = 3600
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def load_gazetteer():
+    places = {}
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['latitude']), float(row['longitude']))
+            for name in [row['name']] + [alias for alias in row['aliases'].split('|') if alias]:
+                places.setdefault(normalize(name), point)
+    return places
+
+
+def geocode(places, text):
+    # The longest run of words naming a known place wins
+    words = normalize(text).split()
+    for size in range(len(words), 0, -1):
+        for start in range(len(words) - size + 1):
+            point = places.get(' '.join(words[start:start + size]))
+            if point is not None:
+                return point
+    return None
+
+
+def grid_cell(latitude, longitude):
+    row = int(math.floor((latitude + 90) / CELL_DEGREES))
+    column = int(math.floor((longitude + 180) / CELL_DEGREES)) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def geocode_locations(apps, schema_editor):
+    # Fill coordinates of existing rows from the bundled gazetteer, one UPDATE per distinct location
+    places = load_gazetteer()
+    for model_name in ('Opportunity', 'Event'):
+        model = apps.get_model('main', model_name)
+        for location in model.objects.values_list('location', flat=True).distinct().order_by():
+            point = geocode(places, location)
+            if point:
+                model.objects.filter(location=location).update(
+                    latitude=point[0], longitude=point[1], geo_cell=grid_cell(*point))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_event_capacity_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='geo_cell',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opportunity',
+            name='geo_cell',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='opportunity',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opportunity',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['geo_cell'], name='event_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['geo_cell'], name='opportunity_geo_idx'),
+        ),
+        migrations.RunPython(geocode_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_geo_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['cause_area', 'date_posted', 'id'], name='main_opport_cause_a_940e2e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['location', 'date_posted', 'id'], name='main_opport_locatio_ac8fd9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['organization', 'date_posted', 'id'], name='main_opport_organiz_f23bfd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['cause_area', 'date_posted', 'id'], name='main_opport_cause_a_568739_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['date_posted', 'id'], name='main_opport_date_po_3ebfe3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['location', 'date_posted', 'id'], name='main_opport_locatio_802f8b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['organization', 'date_posted', 'id'], name='main_opport_organiz_bda561_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['Organization', 'date', 'id'], name='main_event_Organiz_c196a0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['location', 'date', 'id'], name='main_event_locatio_c89645_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['city', 'name'], name='main_organi_city_e6a99a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['city', 'rating_average'], name='main_organi_city_8ab262_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['city', 'rating_count'], name='main_organi_city_ebe886_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['rating_count'], name='main_organi_rating__57b144_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_cache_generations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachegeneration',
+            name='bumped_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_cache_generation_bumped_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimsInvalidation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(unique=True)),
+                ('invalidated_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,26 +1,79 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.hashers import make_password
 from django.core.validators import MinValueValidator, MaxValueValidator 
+from django.utils import timezone
+
+from . import geo
+from .storage import content_addressed_storage, logo_upload_to
+
+# Geocodes `location` on save when it changed, and keeps the grid cell in step with the coordinates
+class GeocodedMixin:
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_location = instance.__dict__.get('location')
+        return instance
+
+    def fill_coordinates(self):
+        location = self.__dict__.get('location')
+        if location is not None and location != getattr(self, '_stored_location', None):
+            point = geo.geocode(location)
+            if point:
+                self.latitude, self.longitude = point
+            elif hasattr(self, '_stored_location'):
+                self.latitude = self.longitude = None  # Moved somewhere unknown; new rows keep coordinates given explicitly
+        has_point = self.latitude is not None and self.longitude is not None
+        self.geo_cell = geo.grid_cell(self.latitude, self.longitude) if has_point else None
+
+    def save(self, *args, **kwargs):
+        self.fill_coordinates()
+        result = super().save(*args, **kwargs)
+        self._stored_location = self.__dict__.get('location')
+        return result
+
+# Hashes the password on save when a new one was assigned since the row was loaded
+class PasswordTrackingMixin:
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_password = instance.__dict__.get('password')
+        return instance
+
+    def password_needs_hashing(self):
+        # Deferred, empty and unchanged passwords are left alone, as is the result of set_password()
+        password = self.__dict__.get('password')
+        return bool(password) and password not in (getattr(self, '_stored_password', None), getattr(self, '_hashed_password', None))
+
+    def save(self, *args, **kwargs):
+        if self.password_needs_hashing():
+            self.password = make_password(self.password)
+        result = super().save(*args, **kwargs)
+        self._stored_password = self.__dict__.get('password')
+        self._hashed_password = None
+        return result
 
 # Custom User model extending AbstractUser
-class User(AbstractUser):
+class User(PasswordTrackingMixin, AbstractUser):
     is_company = models.BooleanField(default=False)  # Indicates if the user is a company
     is_user = models.BooleanField(default=False)     # Indicates if the user is a regular user
     email = models.EmailField(unique=True)            # Unique email field
 
-    def save(self, *args, **kwargs):
-        # Hash password before saving if it's not None
-        if self.password is not None:
-            self.set_password(self.password)
-        return super(User, self).save(*args, **kwargs)
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        self._hashed_password = self.password  # Already hashed
+
+    def set_unusable_password(self):
+        super().set_unusable_password()
+        self._hashed_password = self.password
 
     def __str__(self):
         return self.username
 
 # Profile model for additional user information
-class userProfile(models.Model):
+class userProfile(PasswordTrackingMixin, models.Model):
     name = models.CharField(max_length=150, unique=True)  # Unique name field
-    password = models.CharField(max_length=255)            # Password field (hashed before saving)
+    password = models.CharField(max_length=255)            # Hashed on save when a new one is set
     email = models.EmailField(unique=True, blank=True, null=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
@@ -30,19 +83,13 @@ class userProfile(models.Model):
     bio = models.TextField(blank=True, null=True)
     phone_no = models.CharField(max_length=10, blank=True, null=True)
 
-    def save(self, *args, **kwargs):
-        # Hash password before saving if it's not None
-        if self.password is not None:
-            self.password = make_password(self.password)
-        return super(userProfile, self).save(*args, **kwargs)
-
     def __str__(self):
         return self.name
 
 # Model representing organizations
-class Organization(models.Model):
+class Organization(PasswordTrackingMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)   # Unique name for the organization
-    password = models.CharField(max_length=255)            # Password field (hashed before saving)
+    password = models.CharField(max_length=255)            # Hashed on save when a new one is set
     website = models.URLField(blank=True, null=True)
     email = models.EmailField(unique=True)                   # Unique email field
     address = models.TextField()
@@ -51,7 +98,8 @@ class Organization(models.Model):
     twitter_url = models.URLField(blank=True, null=True)
     city = models.CharField(max_length=100)
     postal_code = models.CharField(max_length=10)
-    logo = models.ImageField(upload_to='logos/', blank=True, null=True)
+    logo = models.ImageField(upload_to=logo_upload_to, storage=content_addressed_storage, blank=True, null=True)  # Stored by content hash
+    logo_thumbnails = models.JSONField(default=dict, blank=True, editable=False)  # Thumbnail names, filled in by main.images
     country = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
     mission = models.TextField()
@@ -59,11 +107,25 @@ class Organization(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
-    def save(self, *args, **kwargs):
-        # Hash password before saving if it's not None
-        if self.password is not None:
-            self.password = make_password(self.password)
-        return super(Organization, self).save(*args, **kwargs)
+    # Review aggregates, maintained by main.ratings (rebuild with `manage.py rebuild_ratings`)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0, db_index=True)
+    rating_0 = models.PositiveIntegerField(default=0)  # Number of reviews per star rating
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # List filters and orderings, recommended by `manage.py advise_indexes`
+            models.Index(fields=['city', 'name'], name='main_organi_city_e6a99a_idx'),
+            models.Index(fields=['city', 'rating_average'], name='main_organi_city_8ab262_idx'),
+            models.Index(fields=['city', 'rating_count'], name='main_organi_city_ebe886_idx'),
+            models.Index(fields=['rating_count'], name='main_organi_rating__57b144_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -83,7 +145,7 @@ class Skill(models.Model):
         return self.name
 
 # Model representing opportunities for users
-class Opportunity(models.Model):
+class Opportunity(GeocodedMixin, models.Model):
     STATUS_CHOICES = [
         ('open', 'open'),
         ('closed', 'closed'),
@@ -95,14 +157,32 @@ class Opportunity(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     location = models.CharField(max_length=255)
+    latitude = models.FloatField(blank=True, null=True)   # Geocoded from location by main.geo
+    longitude = models.FloatField(blank=True, null=True)
+    geo_cell = models.BigIntegerField(blank=True, null=True, editable=False)  # Grid cell of the coordinates, for radius queries
     cause_area = models.ForeignKey(CauseArea, on_delete=models.CASCADE, related_name='opportunities')
     skills = models.ManyToManyField(Skill)
     is_favorite = models.BooleanField(default=False)
     description = models.TextField()
     requirements = models.TextField(blank=True, null=True)
     date_posted = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)  # Bumped on every save, validates conditional GETs
     status = models.CharField(max_length=6, choices=STATUS_CHOICES, default='open')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_posted', 'id'], name='opportunity_feed_idx'),  # Keyset pagination of the feed
+            models.Index(fields=['geo_cell'], name='opportunity_geo_idx'),            # Bounding-box lookups
+            # Feed filters, recommended by `manage.py advise_indexes`
+            models.Index(fields=['cause_area', 'date_posted', 'id'], name='main_opport_cause_a_940e2e_idx'),
+            models.Index(fields=['location', 'date_posted', 'id'], name='main_opport_locatio_ac8fd9_idx'),
+            models.Index(fields=['organization', 'date_posted', 'id'], name='main_opport_organiz_f23bfd_idx'),
+            models.Index(fields=['cause_area', 'date_posted', 'id'], condition=models.Q(status='open'), name='main_opport_cause_a_568739_idx'),
+            models.Index(fields=['date_posted', 'id'], condition=models.Q(status='open'), name='main_opport_date_po_3ebfe3_idx'),
+            models.Index(fields=['location', 'date_posted', 'id'], condition=models.Q(status='open'), name='main_opport_locatio_802f8b_idx'),
+            models.Index(fields=['organization', 'date_posted', 'id'], condition=models.Q(status='open'), name='main_opport_organiz_bda561_idx'),
+        ]
+
     def __str__(self):
         return f'{self.title} - {self.organization}'
 
@@ -112,6 +192,7 @@ class Application(models.Model):
     opportunity = models.ForeignKey(Opportunity, on_delete=models.CASCADE, related_name='applications')
     status = models.CharField(max_length=20, default='pending')
     created_at = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+    updated = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Application by {self.user} for {self.opportunity}"
@@ -128,17 +209,33 @@ class Review(models.Model):
     )
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Review by {self.user} for {self.org}"
 
 # Model representing events organized by organizations
-class Event(models.Model):
+class Event(GeocodedMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     date = models.DateTimeField()
     location = models.CharField(max_length=255)
+    latitude = models.FloatField(blank=True, null=True)   # Geocoded from location by main.geo
+    longitude = models.FloatField(blank=True, null=True)
+    geo_cell = models.BigIntegerField(blank=True, null=True, editable=False)  # Grid cell of the coordinates, for radius queries
     Organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='events')
+    capacity = models.PositiveIntegerField(blank=True, null=True)  # Seats available, unlimited when empty
+    registered_count = models.PositiveIntegerField(default=0)      # Maintained by main.registrations
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='event_feed_idx'),  # Keyset pagination of the feed
+            models.Index(fields=['geo_cell'], name='event_geo_idx'),     # Bounding-box lookups
+            # Feed filters, recommended by `manage.py advise_indexes`
+            models.Index(fields=['Organization', 'date', 'id'], name='main_event_Organiz_c196a0_idx'),
+            models.Index(fields=['location', 'date', 'id'], name='main_event_locatio_c89645_idx'),
+        ]
 
     def __str__(self):
         return f'Event - {self.title}'
@@ -149,5 +246,44 @@ class EventRegistration(models.Model):
     user = models.ForeignKey(userProfile, on_delete=models.CASCADE, related_name="eventregistration")
     register_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_event_registration'),
+        ]
+
     def __str__(self):
         return f'{self.user.name} registered for {self.event.title}'
+
+# Model representing users waiting for a seat at a full event
+class EventWaitlistEntry(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="waitlist")
+    user = models.ForeignKey(userProfile, on_delete=models.CASCADE, related_name="waitlist")
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_event_waitlist_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'joined_at', 'id'], name='event_waitlist_idx'),  # Promotion order
+        ]
+
+    def __str__(self):
+        return f'{self.user.name} waiting for {self.event.title}'
+
+# Version of each model's data that cached responses and list ETags are keyed on, bumped by main.caching on every write
+class CacheGeneration(models.Model):
+    label = models.CharField(max_length=100, primary_key=True)  # Model label, e.g. main.opportunity
+    generation = models.BigIntegerField()
+    bumped_at = models.DateTimeField(default=timezone.now)  # Tells routers how recent the last write is
+
+    def __str__(self):
+        return f'{self.label} @ {self.generation}'
+
+# Users whose token claims changed (see main.tokens); claims read before `invalidated_at` are no longer trusted
+class ClaimsInvalidation(models.Model):
+    user_id = models.BigIntegerField(unique=True)  # Not a foreign key, so deleting the user keeps the row
+    invalidated_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'user {self.user_id} @ {self.invalidated_at}'
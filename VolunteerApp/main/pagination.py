@@ -0,0 +1,172 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination, _reverse_ordering
+
+from .geo import is_by_distance
+from .search import is_ranked
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the public feeds.
+
+    Pages are fetched with `WHERE <ordering> < cursor ORDER BY ... LIMIT n`,
+    so the cost of a page does not grow with its depth and no `COUNT(*)` is
+    issued. Old clients can keep using limit/offset by passing
+    `?pagination=offset`. Full-text search and radius search results are
+    ordered by relevance or distance rather than by the feed ordering, so they
+    are always paged by offset.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+    offset_mode = 'offset'
+
+    def __init__(self):
+        self.offset_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_offset(request, queryset):
+            self.offset_paginator = LimitOffsetPagination()
+            page = self.offset_paginator.paginate_queryset(self.offset_queryset(queryset), request, view)
+            self.display_page_controls = self.offset_paginator.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def use_offset(self, request, queryset):
+        # Limit/offset when the client opts in or results are ranked
+        return request.query_params.get(self.mode_query_param) == self.offset_mode or is_ranked(queryset) or is_by_distance(queryset)
+
+    def offset_queryset(self, queryset):
+        # Offset pages follow the feed ordering too, unless results are ranked
+        if is_ranked(queryset) or is_by_distance(queryset):
+            return queryset
+        return queryset.order_by(*self.ordering)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_html_context()
+        return super().get_html_context()
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.mode_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Set to "offset" to use limit/offset pagination instead of cursors.',
+            'schema': {'type': 'string', 'enum': [self.offset_mode]},
+        })
+        return parameters
+
+class OpportunityCursorPagination(FeedCursorPagination):
+    # Backed by the (date_posted, id) index on Opportunity
+    ordering = ('-date_posted', '-id')
+
+class EventCursorPagination(FeedCursorPagination):
+    # Backed by the (date, id) index on Event, soonest events first
+    ordering = ('date', 'id')
+
+class AsyncLimitOffsetPagination(LimitOffsetPagination):
+    """
+    LimitOffsetPagination for async views: count and page go through the async ORM.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Mirrors LimitOffsetPagination.paginate_queryset
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [obj async for obj in queryset[self.offset:self.offset + self.limit]]
+
+class AsyncFeedCursorPagination(FeedCursorPagination):
+    """
+    FeedCursorPagination for async views. Cursors are interchangeable with the
+    sync feed since both use the same encoding and ordering.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if self.use_offset(request, queryset):
+            self.offset_paginator = AsyncLimitOffsetPagination()
+            page = await self.offset_paginator.apaginate_queryset(self.offset_queryset(queryset), request, view)
+            self.display_page_controls = self.offset_paginator.display_page_controls
+            return page
+
+        # Mirrors CursorPagination.paginate_queryset with the page fetched asynchronously
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+            if self.cursor.reverse != is_reversed:
+                kwargs = {order_attr + '__lt': current_position}
+            else:
+                kwargs = {order_attr + '__gt': current_position}
+            queryset = queryset.filter(**kwargs)
+
+        # Fetch one extra item to know if a following page exists
+        results = [obj async for obj in queryset[offset:offset + self.page_size + 1]]
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+class AsyncOpportunityCursorPagination(AsyncFeedCursorPagination):
+    ordering = OpportunityCursorPagination.ordering
+
+class AsyncEventCursorPagination(AsyncFeedCursorPagination):
+    ordering = EventCursorPagination.ordering
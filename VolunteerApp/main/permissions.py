@@ -1,12 +1,14 @@
 from rest_framework.permissions import BasePermission
 
+from .models import Organization, userProfile
+
 class IsUser(BasePermission):
     """
     Custom permission to allow access only to users.
     """
 
     def has_permission(self, request, view):
-        # Check if their 'is_user' attribute is True
+        # Check if their 'is_user' attribute is True (read from the token claims when present)
         return request.user.is_user is True
 
 class IsCompany(BasePermission):
@@ -15,5 +17,42 @@ class IsCompany(BasePermission):
     """
 
     def has_permission(self, request, view):
-        # Check  if their 'is_company' attribute is True
+        # Check if their 'is_company' attribute is True (read from the token claims when present)
         return request.user.is_company is True
+
+def owns_organization(user, organization):
+    # From the token's ownership claim when there is one, else by name as organization registration links them
+    if hasattr(user, 'organization_id'):
+        return user.organization_id == organization.pk
+    return organization.name == user.username
+
+class IsOrganizationOwner(BasePermission):
+    """
+    Custom permission to allow access only to the company owning the organization
+    in the URL (`org_id`, or the view's `organization_kwarg`).
+    """
+    message = "You do not have permission to access this company's data"
+
+    def has_permission(self, request, view):
+        org_id = view.kwargs.get(getattr(view, 'organization_kwarg', 'org_id'))
+        if org_id is None:
+            return False
+        # Trust the token's ownership claim when there is one
+        if hasattr(request.user, 'organization_id'):
+            return request.user.organization_id == int(org_id)
+        return Organization.objects.filter(id=org_id, name=request.user.username).exists()
+
+class IsProfileOwner(BasePermission):
+    """
+    Custom permission to allow access only to the owner of the profile in the URL.
+    """
+    message = "You do not have permission to access this user's data."
+
+    def has_permission(self, request, view):
+        profile_id = view.kwargs.get(getattr(view, 'profile_kwarg', 'pk'))
+        if profile_id is None:
+            return False
+        # Trust the token's ownership claim when there is one
+        if hasattr(request.user, 'profile_id'):
+            return request.user.profile_id == int(profile_id)
+        return userProfile.objects.filter(id=profile_id, email=request.user.email).exists()
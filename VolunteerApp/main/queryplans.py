@@ -0,0 +1,109 @@
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.mixins import ListModelMixin
+
+from .fieldsets import SparseFieldsMixin, is_sparse, plan_queryset
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised in debug mode when a request runs more queries than its view declares.
+    """
+
+_unbudgeted = ContextVar('unbudgeted_queries', default=False)
+
+@contextmanager
+def unbudgeted():
+    # Queries of per-process upkeep (e.g. the periodic filter syncs) that merely happens to run in some request
+    token = _unbudgeted.set(True)
+    try:
+        yield
+    finally:
+        _unbudgeted.reset(token)
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts the queries it sees, except those
+    run under unbudgeted().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if _unbudgeted.get():
+            return execute(sql, params, many, context)
+        self.count += 1
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+def get_plan(serializer_class):
+    # Read the select/prefetch plan declared on a serializer's Meta
+    meta = getattr(serializer_class, 'Meta', None)
+    return (
+        list(getattr(meta, 'select_related', [])),
+        list(getattr(meta, 'prefetch_related', [])),
+    )
+
+class QueryPlanMixin:
+    """
+    Apply a declared select_related/prefetch_related plan to a view's queryset.
+
+    The plan is the union of the serializer's `Meta.select_related` and
+    `Meta.prefetch_related` (what it needs to render) and the view's own
+    attributes of the same name (what its permission checks need). Requests
+    with `?fields=` or `?expand=` load what those select instead. With
+    `ENFORCE_QUERY_BUDGETS` on, a request running more than `query_budget`
+    queries raises QueryBudgetExceeded.
+    """
+    select_related = []
+    prefetch_related = []
+    query_budget = None
+
+    def plan_queryset(self, queryset):
+        # Join and prefetch everything the view and its serializer will touch
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, SparseFieldsMixin) and is_sparse(self.request):
+            return self.plan_sparse_queryset(queryset)
+        select, prefetch = get_plan(serializer_class)
+        select += [field for field in self.select_related if field not in select]
+        prefetch += [field for field in self.prefetch_related if field not in prefetch]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def plan_sparse_queryset(self, queryset):
+        # ?fields= and ?expand= decide what is loaded. Lists read only the rendered columns (and the
+        # page order); other views and views joining for their permission checks keep every column
+        restrict = isinstance(self, ListModelMixin) and not self.select_related
+        ordering = getattr(getattr(self, 'paginator', None), 'ordering', None) or ()
+        ordering = [ordering] if isinstance(ordering, str) else ordering
+        queryset = plan_queryset(queryset, self.get_serializer(), required=ordering, restrict=restrict)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        return self.plan_queryset(super().filter_queryset(queryset))
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.query_budget is None or not getattr(settings, 'ENFORCE_QUERY_BUDGETS', False):
+            return super().dispatch(request, *args, **kwargs)
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(counter))
+            response = super().dispatch(request, *args, **kwargs)
+        if counter.count > self.query_budget:
+            raise QueryBudgetExceeded(
+                '%s ran %d queries, budget is %d:\n%s'
+                % (type(self).__name__, counter.count, self.query_budget, '\n'.join(counter.queries))
+            )
+        return response
@@ -0,0 +1,79 @@
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Greatest, Now
+
+from .caching import bump_generation_on_commit
+from .models import Organization, Review
+
+RATING_FIELDS = ['rating_%d' % stars for stars in range(6)]
+
+def histogram_field(rating):
+    # Name of the histogram column counting reviews with this rating
+    return 'rating_%d' % rating
+
+def apply_rating(org_id, rating, delta):
+    """
+    Add (delta=1) or remove (delta=-1) one review's rating from an organization.
+
+    Runs as a single UPDATE on the organization row, so it never reads the
+    reviews table. Call it inside the transaction that writes the review.
+    """
+    count = Greatest(F('rating_count') + delta, Value(0))
+    total = Greatest(F('rating_sum') + delta * rating, Value(0))
+    Organization.objects.filter(id=org_id).update(**{
+        'rating_count': count,
+        'rating_sum': total,
+        'rating_average': Cast(total, FloatField()) / Greatest(count, Value(1)),
+        histogram_field(rating): Greatest(F(histogram_field(rating)) + delta, Value(0)),
+        'updated': Now(),  # update() skips auto_now
+    })
+    bump_generation_on_commit(Organization)  # update() sends no save signals
+
+def add_rating(org_id, rating):
+    apply_rating(org_id, rating, 1)
+
+def remove_rating(org_id, rating):
+    apply_rating(org_id, rating, -1)
+
+def change_rating(old_org_id, old_rating, org_id, rating):
+    # Move a review's rating when it is edited
+    if (old_org_id, old_rating) == (org_id, rating):
+        return
+    remove_rating(old_org_id, old_rating)
+    add_rating(org_id, rating)
+
+def rating_histogram(org):
+    # Star rating -> number of reviews
+    return {stars: getattr(org, histogram_field(stars)) for stars in range(6)}
+
+def rebuild_ratings(batch_size=1000):
+    """
+    Recompute every organization's aggregates from the reviews table.
+
+    Returns the number of organizations written.
+    """
+    stats = {}
+    rows = Review.objects.values('org_id', 'rating').annotate(count=Count('id'), total=Sum('rating')).order_by()
+    for row in rows:
+        stats.setdefault(row['org_id'], []).append(row)
+
+    organizations = []
+    updated = 0
+    fields = ['rating_count', 'rating_sum', 'rating_average'] + RATING_FIELDS
+    for org in Organization.objects.only('id').iterator(chunk_size=batch_size):
+        for field in RATING_FIELDS:
+            setattr(org, field, 0)
+        for row in stats.get(org.id, []):
+            setattr(org, histogram_field(row['rating']), row['count'])
+        org.rating_count = sum(row['count'] for row in stats.get(org.id, []))
+        org.rating_sum = sum(row['total'] for row in stats.get(org.id, []))
+        org.rating_average = org.rating_sum / org.rating_count if org.rating_count else 0
+        organizations.append(org)
+        if len(organizations) >= batch_size:
+            Organization.objects.bulk_update(organizations, fields)
+            updated += len(organizations)
+            organizations = []
+    if organizations:
+        Organization.objects.bulk_update(organizations, fields)
+        updated += len(organizations)
+    bump_generation_on_commit(Organization)
+    return updated
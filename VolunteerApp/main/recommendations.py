@@ -0,0 +1,280 @@
+import copy
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import caching
+from .geo import normalize
+from .models import Application, EventRegistration, Opportunity, userProfile
+
+logger = logging.getLogger(__name__)
+
+# Relative importance of each kind of feature in a score
+FEATURE_WEIGHTS = {'skill': 1.0, 'cause_area': 1.0, 'organization': 0.5, 'city': 0.75}
+APPLICATION_WEIGHT = 1.0   # History weights: applying says more than attending an event
+REGISTRATION_WEIGHT = 0.5
+HOME_CITY_WEIGHT = 1.0
+
+REFRESH_INTERVAL = 5        # Seconds between the refresher's checks for opportunity writes
+REBUILD_INTERVAL = 60 * 60  # Seconds between full rebuilds, which drop deleted opportunities
+MAX_DELTA_FRACTION = 0.1    # Rebuild once incremental syncs appended this share of the base rows
+SYNC_SKEW = timedelta(minutes=1)  # Re-read this far back to catch rows committed out of order
+CHUNK_SIZE = 5000
+
+def opportunity_features(cause_area_id, organization_id, location, skill_ids):
+    # Feature keys describing one opportunity
+    features = [('cause_area', cause_area_id), ('organization', organization_id), ('city', normalize(location))]
+    return features + [('skill', skill_id) for skill_id in skill_ids]
+
+def load_opportunities(queryset):
+    """
+    Yield (id, is_open, feature keys) for every opportunity in `queryset`,
+    reading rows and their skills in chunks.
+    """
+    rows = queryset.order_by('id').values_list('id', 'status', 'cause_area_id', 'organization_id', 'location')
+    chunk = []
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield from _with_skills(chunk)
+            chunk = []
+    yield from _with_skills(chunk)
+
+def _with_skills(chunk):
+    if not chunk:
+        return
+    skills = defaultdict(list)
+    through = Opportunity.skills.through.objects.filter(opportunity_id__in=[row[0] for row in chunk])
+    for opportunity_id, skill_id in through.values_list('opportunity_id', 'skill_id').iterator(chunk_size=CHUNK_SIZE):
+        skills[opportunity_id].append(skill_id)
+    for opportunity_id, status, cause_area_id, organization_id, location in chunk:
+        yield opportunity_id, status == 'open', opportunity_features(cause_area_id, organization_id, location, skills[opportunity_id])
+
+class OpportunityMatrix:
+    """
+    Sparse opportunity x feature matrix kept in memory for scoring.
+
+    The matrix is stored column-major (CSC): for each feature, the rows of
+    the opportunities that have it. Scoring a user touches only the columns
+    of the user's features. Changed opportunities are masked out of the base
+    matrix and re-appended to a small row-major delta, which is folded back
+    into the base on the next full rebuild.
+    """
+
+    def __init__(self):
+        self.features = {}                                  # Feature key -> column
+        self.row_ids = np.zeros(0, dtype=np.int64)          # Row -> opportunity id
+        self.active = np.zeros(0, dtype=bool)               # Row is the current version of an open opportunity
+        self.rows = {}                                      # Opportunity id -> current row
+        self.column_ptr = np.zeros(1, dtype=np.int64)       # CSC base: rows of column c are column_rows[ptr[c]:ptr[c + 1]]
+        self.column_rows = np.zeros(0, dtype=np.int32)
+        self.delta_rows = np.zeros(0, dtype=np.int32)       # COO delta appended by incremental syncs
+        self.delta_columns = np.zeros(0, dtype=np.int32)
+        self.base_rows = 0
+        self.generation = None  # Opportunity generation and time of the data it holds
+        self.synced_at = None
+        self.built_at = None
+
+    def copy(self):
+        # Copy that update() can change without touching this matrix (the other arrays are replaced, not changed)
+        other = copy.copy(self)
+        other.features, other.rows, other.active = dict(self.features), dict(self.rows), self.active.copy()
+        return other
+
+    def _column(self, key):
+        column = self.features.get(key)
+        if column is None:
+            column = self.features[key] = len(self.features)
+        return column
+
+    def build(self, opportunities):
+        # Replace the matrix with the given (id, is_open, feature keys) rows
+        self.features, self.rows = {}, {}
+        row_ids, active, rows, columns = [], [], [], []
+        for row, (opportunity_id, is_open, keys) in enumerate(opportunities):
+            self.rows[opportunity_id] = row
+            row_ids.append(opportunity_id)
+            active.append(is_open)
+            for key in keys:
+                rows.append(row)
+                columns.append(self._column(key))
+        rows = np.asarray(rows, dtype=np.int32)
+        columns = np.asarray(columns, dtype=np.int32)
+        order = np.argsort(columns, kind='stable')
+        self.column_rows = rows[order]
+        self.column_ptr = np.concatenate([[0], np.cumsum(np.bincount(columns, minlength=len(self.features)))]).astype(np.int64)
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.active = np.asarray(active, dtype=bool)
+        self.base_rows = len(row_ids)
+        self.delta_rows = np.zeros(0, dtype=np.int32)
+        self.delta_columns = np.zeros(0, dtype=np.int32)
+        self.built_at = time.monotonic()
+
+    def update(self, opportunities):
+        # Mask out the old rows of changed opportunities and append their new versions to the delta
+        start = len(self.row_ids)
+        row_ids, active, rows, columns = [], [], [], []
+        for offset, (opportunity_id, is_open, keys) in enumerate(opportunities):
+            old = self.rows.get(opportunity_id)
+            if old is not None:
+                self.active[old] = False
+            self.rows[opportunity_id] = start + offset
+            row_ids.append(opportunity_id)
+            active.append(is_open)
+            for key in keys:
+                rows.append(start + offset)
+                columns.append(self._column(key))
+        if not row_ids:
+            return
+        self.row_ids = np.concatenate([self.row_ids, np.asarray(row_ids, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.asarray(active, dtype=bool)])
+        self.delta_rows = np.concatenate([self.delta_rows, np.asarray(rows, dtype=np.int32)])
+        self.delta_columns = np.concatenate([self.delta_columns, np.asarray(columns, dtype=np.int32)])
+
+    def needs_rebuild(self):
+        if self.built_at is None or time.monotonic() - self.built_at > REBUILD_INTERVAL:
+            return True
+        return len(self.row_ids) - self.base_rows > MAX_DELTA_FRACTION * max(self.base_rows, 1000)
+
+    def scores(self, weights):
+        """
+        Score every row against a {feature key: weight} user vector.
+
+        Inactive rows score -inf. Only the base columns of the user's features
+        and the (small) delta are read.
+        """
+        scores = np.zeros(len(self.row_ids), dtype=np.float32)
+        dense = np.zeros(len(self.features), dtype=np.float32)
+        for key, weight in weights.items():
+            column = self.features.get(key)
+            if column is None:
+                continue
+            dense[column] = weight
+            if column + 1 < len(self.column_ptr):
+                scores[self.column_rows[self.column_ptr[column]:self.column_ptr[column + 1]]] += weight
+        if len(self.delta_rows):
+            np.add.at(scores, self.delta_rows, dense[self.delta_columns])  # Unbuffered, cost follows the delta size
+        scores[~self.active] = -np.inf
+        return scores
+
+    def top_k(self, weights, k, exclude=()):
+        """
+        Return up to k (opportunity id, score) pairs with the highest positive
+        scores, best first, skipping opportunity ids in `exclude`.
+        """
+        scores = self.scores(weights)
+        excluded = [self.rows[opportunity_id] for opportunity_id in exclude if opportunity_id in self.rows]
+        scores[excluded] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.row_ids[row]), float(scores[row])) for row in top if scores[row] > 0]
+
+class MatrixRefresher:
+    """
+    Keeps a ready OpportunityMatrix snapshot for requests to read.
+
+    A daemon thread per process, started by its first recommend() call
+    rather than at import, checks the Opportunity generation every
+    REFRESH_INTERVAL seconds and publishes a new snapshot when it moved:
+    rebuilt in full when due, otherwise a copy of the current snapshot with
+    the changed rows appended. Published snapshots are never changed, so
+    requests read them without locking and never build one themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self.snapshot = None
+
+    def refresh(self):
+        # Publish a snapshot up to date with opportunity writes (one generation query when nothing changed)
+        generation = caching.get_generations([Opportunity])[0]  # Read first, so a concurrent write forces a later refresh
+        with self._lock:
+            current = self.snapshot
+            if current is not None and generation == current.generation and not current.needs_rebuild():
+                return current
+            synced_at = timezone.now()
+            if current is None or current.needs_rebuild():
+                snapshot = OpportunityMatrix()
+                snapshot.build(load_opportunities(Opportunity.objects.all()))
+            else:
+                snapshot = current.copy()
+                snapshot.update(load_opportunities(Opportunity.objects.filter(updated__gte=current.synced_at - SYNC_SKEW)))
+            snapshot.generation, snapshot.synced_at = generation, synced_at
+            self.snapshot = snapshot
+            return snapshot
+
+    def start(self):
+        # Start this process's refresher thread; again in a forked worker, which inherits no threads
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='recommendations-refresher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            close_old_connections()
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Refreshing the recommendation matrix failed')
+            finally:
+                close_old_connections()
+            time.sleep(REFRESH_INTERVAL)
+
+refresher = MatrixRefresher()
+
+def user_vector(profile_id):
+    """
+    Build a user's {feature key: weight} vector from their applications,
+    event registrations and home city. Returns (vector, applied opportunity ids).
+    """
+    counts = defaultdict(float)
+    applications = list(Application.objects.filter(user_id=profile_id).values_list(
+        'opportunity_id', 'opportunity__cause_area_id', 'opportunity__organization_id', 'opportunity__location'))
+    applied = {row[0] for row in applications}
+    for _, cause_area_id, organization_id, location in applications:
+        for key in opportunity_features(cause_area_id, organization_id, location, []):
+            counts[key] += APPLICATION_WEIGHT
+    skills = Opportunity.skills.through.objects.filter(opportunity_id__in=applied).values_list('skill_id', flat=True)
+    for skill_id in skills:
+        counts[('skill', skill_id)] += APPLICATION_WEIGHT
+    registrations = EventRegistration.objects.filter(user_id=profile_id).values_list('event__Organization_id', 'event__location')
+    for organization_id, location in registrations:
+        counts[('organization', organization_id)] += REGISTRATION_WEIGHT
+        counts[('city', normalize(location))] += REGISTRATION_WEIGHT
+    history = APPLICATION_WEIGHT * len(applications) + REGISTRATION_WEIGHT * len(registrations) or 1
+    vector = {key: FEATURE_WEIGHTS[key[0]] * count / history for key, count in counts.items()}
+    city = userProfile.objects.filter(id=profile_id).values_list('city', flat=True).first()
+    if city:
+        key = ('city', normalize(city))
+        vector[key] = vector.get(key, 0.0) + FEATURE_WEIGHTS['city'] * HOME_CITY_WEIGHT
+    return vector, applied
+
+def recommend(profile_id, k=20):
+    """
+    Return up to k (opportunity id, score) pairs for a profile, best first,
+    or None while this process is still building its first matrix.
+
+    Scores come from the last published snapshot, up to REFRESH_INTERVAL
+    seconds behind. Deleted opportunities linger in it until its next
+    rebuild, so callers should ask for a few more than they show.
+    """
+    refresher.start()
+    snapshot = refresher.snapshot
+    if snapshot is None:
+        return None
+    vector, applied = user_vector(profile_id)
+    return snapshot.top_k(vector, k, exclude=applied)
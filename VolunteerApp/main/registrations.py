@@ -0,0 +1,119 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Now
+
+from .models import Event, EventRegistration, EventWaitlistEntry
+
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+ALREADY_REGISTERED = 'already_registered'
+ALREADY_WAITLISTED = 'already_waitlisted'
+
+PROMOTION_BATCH_SIZE = 100
+
+def claim_seats(event_id, seats=1):
+    """
+    Take `seats` seats of an event if that many are free.
+
+    Runs as a single conditional UPDATE, so concurrent registrations can
+    never push `registered_count` past `capacity`. Returns True on success.
+    Seat changes touch `updated`, so event ETags change with the count.
+    """
+    has_room = Q(capacity__isnull=True) | Q(registered_count__lte=F('capacity') - seats)
+    return Event.objects.filter(Q(id=event_id) & has_room).update(registered_count=F('registered_count') + seats, updated=Now()) == 1
+
+def release_seats(event_id, seats=1):
+    Event.objects.filter(id=event_id, registered_count__gte=seats).update(registered_count=F('registered_count') - seats, updated=Now())
+
+def register(event_id, profile_id):
+    """
+    Register a profile for an event, or put it on the waitlist when the event is full.
+
+    Returns one of REGISTERED, WAITLISTED, ALREADY_REGISTERED or
+    ALREADY_WAITLISTED. Raises Event.DoesNotExist for unknown events.
+    """
+    # The seat UPDATE is the first statement, so the write lock is taken up front and held only briefly
+    with transaction.atomic():
+        if claim_seats(event_id):
+            try:
+                with transaction.atomic():
+                    EventRegistration.objects.create(event_id=event_id, user_id=profile_id)
+            except IntegrityError:
+                release_seats(event_id)  # Give back the seat taken for the duplicate
+                return ALREADY_REGISTERED
+            EventWaitlistEntry.objects.filter(event_id=event_id, user_id=profile_id).delete()
+            return REGISTERED
+
+    # Full (or unknown) event: the slow path can afford extra queries
+    if not Event.objects.filter(id=event_id).exists():
+        raise Event.DoesNotExist()
+    if EventRegistration.objects.filter(event_id=event_id, user_id=profile_id).exists():
+        return ALREADY_REGISTERED
+    try:
+        with transaction.atomic():
+            EventWaitlistEntry.objects.create(event_id=event_id, user_id=profile_id)
+    except IntegrityError:
+        return ALREADY_WAITLISTED
+    promote_waitlist(event_id)  # A seat may have been freed since the UPDATE
+    return WAITLISTED
+
+def cancel(event_id, profile_id):
+    """
+    Cancel a registration (freeing its seat for the waitlist) or a waitlist entry.
+
+    Returns True if there was anything to cancel.
+    """
+    with transaction.atomic():
+        deleted, _ = EventRegistration.objects.filter(event_id=event_id, user_id=profile_id).delete()
+        if deleted:
+            release_seats(event_id, deleted)
+        else:
+            deleted, _ = EventWaitlistEntry.objects.filter(event_id=event_id, user_id=profile_id).delete()
+    if deleted:
+        promote_waitlist(event_id)
+    return bool(deleted)
+
+def promote_waitlist(event_id, batch_size=PROMOTION_BATCH_SIZE):
+    """
+    Move waitlisted profiles into free seats, oldest first, `batch_size` per transaction.
+
+    Seats are claimed with the same conditional UPDATE as registrations, so
+    promotion never overbooks. Returns the number of profiles promoted.
+    """
+    promoted = 0
+    while True:
+        event = Event.objects.filter(id=event_id).values('capacity', 'registered_count').first()
+        if event is None:
+            return promoted
+        free = batch_size if event['capacity'] is None else min(batch_size, event['capacity'] - event['registered_count'])
+        if free <= 0:
+            return promoted
+        try:
+            with transaction.atomic():
+                entries = list(EventWaitlistEntry.objects.filter(event_id=event_id).order_by('joined_at', 'id')[:free])
+                if not entries:
+                    return promoted
+                # Profiles that registered directly while waiting need no seat
+                registered = set(EventRegistration.objects.filter(
+                    event_id=event_id, user_id__in=[entry.user_id for entry in entries]).values_list('user_id', flat=True))
+                fresh = [entry for entry in entries if entry.user_id not in registered]
+                if fresh and not claim_seats(event_id, len(fresh)):
+                    continue  # Seats were taken concurrently, look again
+                EventRegistration.objects.bulk_create([EventRegistration(event_id=event_id, user_id=entry.user_id) for entry in fresh])
+                EventWaitlistEntry.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        except IntegrityError:
+            continue  # A profile registered concurrently, the whole batch was rolled back
+        promoted += len(fresh)
+
+def rebuild_registered_counts():
+    """
+    Recompute `registered_count` of every event from the registrations table.
+    Returns the number of events whose count changed.
+    """
+    changed = 0
+    counts = dict(EventRegistration.objects.values_list('event_id').annotate(count=Count('id')).order_by())
+    for event_id, stored in Event.objects.values_list('id', 'registered_count').iterator():
+        actual = counts.get(event_id, 0)
+        if actual != stored:
+            changed += Event.objects.filter(id=event_id).update(registered_count=actual, updated=Now())
+    return changed
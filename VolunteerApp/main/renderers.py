@@ -0,0 +1,79 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+from rest_framework.utils.mediatypes import parse_header_parameters
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib json is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: MessagePack is only offered when installed (see settings)
+    msgpack = None
+
+def encode_default(obj):
+    # Types orjson and msgpack leave to us (datetimes, decimals, lazy strings...) are encoded as DRF does
+    return encoders.JSONEncoder().default(obj)
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same bytes with orjson.
+
+    Indented output (`Accept: application/json; indent=4`, the browsable
+    API) and installs without orjson fall back to the stdlib encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        content = orjson.dumps(data, default=encode_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        # Escaped like JSONRenderer does, so the output stays a strict JavaScript subset
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser decoding UTF-8 bodies with orjson.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = parse_header_parameters(media_type or '')[1].get('charset', 'utf-8')
+        if orjson is None or encoding.lower() not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Render responses as MessagePack for `Accept: application/msgpack`
+    (or `?format=msgpack`).
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+class MessagePackParser(BaseParser):
+    """
+    Parse `Content-Type: application/msgpack` request bodies.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError('MessagePack parse error - %s' % (str(exc) or type(exc).__name__))
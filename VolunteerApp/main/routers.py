@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_pin'  # Expiry (unix time) of the client's read-your-writes window
+
+_state = ContextVar('replica_routing', default=None)
+
+class RoutingState:
+    """
+    Where the current request reads from. Reads start on a replica for
+    safe-method requests of unpinned clients and move to the primary for
+    good once the request writes.
+    """
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None  # Chosen on the first read, so one request reads one snapshot
+        self.wrote = False
+
+class ReplicaLag:
+    """
+    Per-process view of replica health, refreshed at most every
+    REPLICA_LAG_CHECK_SECONDS. A replica lagging more than
+    REPLICA_MAX_LAG_SECONDS, or failing the check, takes no reads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}   # alias -> monotonic time of the last check
+        self._healthy = {}
+
+    def measure(self, alias):
+        # Seconds the replica is behind
+        conn = connections[alias]
+        if conn.vendor == 'postgresql':
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+                )
+                return float(cursor.fetchone()[0])
+        return self.measure_generations(alias)
+
+    def measure_generations(self, alias):
+        # Elsewhere (e.g. SQLite stand-ins) compare the cache generations: a replica still
+        # missing a generation bump is at least as far behind as that bump is old
+        from .models import CacheGeneration
+
+        primary = CacheGeneration.objects.using(DEFAULT_DB_ALIAS).values_list('label', 'generation', 'bumped_at')
+        replica = dict(CacheGeneration.objects.using(alias).values_list('label', 'generation'))
+        missed = [bumped_at for label, generation, bumped_at in primary if replica.get(label) != generation]
+        return max(0.0, (timezone.now() - min(missed)).total_seconds()) if missed else 0.0
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked.get(alias, float('-inf')) < getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 5):
+                return self._healthy.get(alias, False)  # Being checked by another thread
+            self._checked[alias] = now
+        try:
+            lag = self.measure(alias)
+        except Exception:
+            logger.warning('Replica %s is unreachable, reading from the primary', alias, exc_info=True)
+            lag = float('inf')
+        healthy = lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+        if not healthy and lag != float('inf'):
+            logger.warning('Replica %s is %.1fs behind, reading from the primary', alias, lag)
+        self._healthy[alias] = healthy
+        return healthy
+
+lag = ReplicaLag()
+
+def choose_replica(weights):
+    # Weighted pick among healthy replicas, or None when there are none
+    healthy = [(alias, weight) for alias, weight in weights.items() if weight > 0 and lag.is_healthy(alias)]
+    if not healthy:
+        return None
+    aliases, alias_weights = zip(*healthy)
+    return random.choices(aliases, weights=alias_weights)[0]
+
+def read_recent_writes_from_primary(written_at):
+    """
+    Send the rest of the current request's reads to the primary when data it
+    reads was written at `written_at`, too recently for every replica to have
+    it: within REPLICA_MAX_LAG_SECONDS, plus REPLICA_LAG_CHECK_SECONDS for a
+    replica falling behind between two lag checks.
+    """
+    state = _state.get()
+    if state is None or not state.use_replica or written_at is None:
+        return
+    window = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5) + getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 5)
+    if timezone.now() - written_at < timedelta(seconds=window):
+        state.use_replica = False
+
+class ReplicaRouter:
+    """
+    Send reads of safe-method requests to the DATABASE_REPLICA_WEIGHTS
+    replicas and everything else to the primary.
+
+    Reads outside a request (commands, tasks), in a transaction, after the
+    request has written, or from a client pinned by ReplicaPinMiddleware go
+    to the primary, so nothing reads older data than it just wrote. Requests
+    reading cache generations bumped too recently for the replicas (see
+    read_recent_writes_from_primary()) move to the primary as well.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = choose_replica(getattr(settings, 'DATABASE_REPLICA_WEIGHTS', {})) or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Replicas hold copies of the primary's rows
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS  # Replicas get their schema by replication
+
+def _client_key(request):
+    # Identifies API clients that send no cookies; tokens rotate, so pins are short-lived anyway
+    credentials = request.headers.get('Authorization')
+    if not credentials:
+        return None
+    return 'replica-pin:%s' % hashlib.sha1(credentials.encode()).hexdigest()
+
+def pin_cache():
+    # Shared by every worker process, or a client's next request may miss its pin
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE_ALIAS', settings.RESPONSE_CACHE_ALIAS)]
+
+def is_pinned(request):
+    try:
+        if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    key = _client_key(request)
+    return key is not None and pin_cache().get(key) is not None
+
+def pin(request, response):
+    # Keep the client on the primary until its writes have reached the replicas
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    response.set_cookie(PIN_COOKIE, '%d' % (time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+    key = _client_key(request)
+    if key is not None:
+        pin_cache().set(key, 1, seconds)
+
+class ReplicaPinMiddleware:
+    """
+    Route each request's reads through ReplicaRouter, and pin clients that
+    wrote to the primary for REPLICA_PIN_SECONDS (read-your-writes).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        if getattr(settings, 'DATABASE_REPLICA_WEIGHTS', None) and isinstance(pin_cache(), (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'Read replicas need a pin cache shared between processes; set RESPONSE_CACHE_URL '
+                'or point REPLICA_PIN_CACHE_ALIAS at a shared cache'
+            )
+
+    def start(self, request):
+        use_replica = bool(getattr(settings, 'DATABASE_REPLICA_WEIGHTS', None)) and request.method in SAFE_METHODS and not is_pinned(request)
+        return RoutingState(use_replica)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            pin(request, response)
+        return response
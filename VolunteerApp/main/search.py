@@ -0,0 +1,152 @@
+import re
+
+from django.db import connection, connections
+from rest_framework.filters import SearchFilter
+
+# Full-text index definitions: model label -> (index table, indexed fields).
+# The first field is the title-like field and is ranked higher than the rest.
+SEARCH_DOCUMENTS = {
+    'main.opportunity': ('main_search_opportunity', ['title', 'description', 'requirements', 'location']),
+    'main.organization': ('main_search_organization', ['name', 'mission', 'description']),
+    'main.event': ('main_search_event', ['title', 'description']),
+}
+
+RANK_ANNOTATION = 'search_rank'
+
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+
+TITLE_WEIGHT = 10.0  # bm25 weight of the title column on SQLite
+
+def is_supported(conn=None):
+    # Check if the database backend has a full-text index
+    return (conn or connection).vendor in SUPPORTED_VENDORS
+
+def get_document(model):
+    # Return (table, fields) for an indexed model, or None
+    return SEARCH_DOCUMENTS.get(model._meta.label_lower)
+
+def tokenize(text):
+    # Split free text into safe search terms (no FTS operators survive)
+    return re.findall(r'\w+', text or '')
+
+def build_query(text, vendor):
+    # Turn free text into a match expression, prefix-matching the last term
+    terms = tokenize(text)
+    if not terms:
+        return None
+    if vendor == 'postgresql':
+        return ' & '.join(terms[:-1] + [terms[-1] + ':*'])
+    return ' '.join(['"%s"' % term for term in terms[:-1]] + ['"%s"*' % terms[-1]])
+
+def _pg_document_sql(fields, prefix=''):
+    # tsvector expression with the title weighted 'A' and the rest 'B'
+    parts = []
+    for i, field in enumerate(fields):
+        weight = 'A' if i == 0 else 'B'
+        parts.append("setweight(to_tsvector('english', coalesce(%s%s, '')), '%s')" % (prefix, field, weight))
+    return ' || '.join(parts)
+
+def rebuild_index(conn=None):
+    # Rebuild every index table from scratch (used after bulk writes)
+    conn = conn or connection
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for label, (table, fields) in SEARCH_DOCUMENTS.items():
+            cursor.execute('DELETE FROM %s' % table)
+            _fill_table(cursor, conn.vendor, table, fields, label.replace('.', '_'))
+
+def _fill_table(cursor, vendor, table, fields, source):
+    if vendor == 'sqlite':
+        cursor.execute(
+            'INSERT INTO %s (rowid, %s) SELECT id, %s FROM %s'
+            % (table, ', '.join(fields), ', '.join(fields), source)
+        )
+    else:
+        cursor.execute(
+            'INSERT INTO %s (id, document) SELECT id, %s FROM %s ON CONFLICT (id) DO NOTHING'
+            % (table, _pg_document_sql(fields), source)
+        )
+
+def index_objects(model, objs, conn=None):
+    # Insert or refresh the index rows for the given instances
+    conn = conn or connection
+    document = get_document(model)
+    if document is None or not objs or not is_supported(conn):
+        return
+    table, fields = document
+    rows = [[obj.pk] + [getattr(obj, field) for field in fields] for obj in objs]
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % table, [[row[0]] for row in rows])
+            cursor.executemany(
+                'INSERT INTO %s (rowid, %s) VALUES (%s)'
+                % (table, ', '.join(fields), ', '.join(['%s'] * (len(fields) + 1))),
+                rows,
+            )
+        else:
+            values = ', '.join(['%s::text AS %s' % ('%s', field) for field in fields])
+            cursor.executemany(
+                'INSERT INTO %s (id, document) SELECT %%s, %s FROM (SELECT %s) AS src '
+                'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document'
+                % (table, _pg_document_sql(fields, 'src.'), values),
+                rows,
+            )
+
+def remove_objects(model, pks, conn=None):
+    # Drop the index rows of deleted instances
+    conn = conn or connection
+    document = get_document(model)
+    if document is None or not pks or not is_supported(conn):
+        return
+    table, fields = document
+    column = 'rowid' if conn.vendor == 'sqlite' else 'id'
+    with conn.cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE %s = %%s' % (table, column), [[pk] for pk in pks])
+
+def search_queryset(queryset, text):
+    """
+    Restrict a queryset to rows matching `text` and annotate their relevance.
+
+    The index table is joined once on the primary key, so matching and
+    ranking happen in a single pass over the index. Higher `search_rank` is
+    more relevant.
+    """
+    conn = connections[queryset.db]
+    model = queryset.model
+    table, fields = get_document(model)
+    match = build_query(text, conn.vendor)
+    if match is None:
+        return queryset
+    pk_column = '%s.%s' % (model._meta.db_table, model._meta.pk.column)
+    if conn.vendor == 'sqlite':
+        weights = ', '.join([str(TITLE_WEIGHT)] + ['1.0'] * (len(fields) - 1))
+        where = ['{t}.rowid = {pk}'.format(t=table, pk=pk_column), '{t} MATCH %s'.format(t=table)]
+        rank, rank_params = '-bm25({t}, {w})'.format(t=table, w=weights), []
+    else:
+        where = ['{t}.id = {pk}'.format(t=table, pk=pk_column), "{t}.document @@ to_tsquery('english', %s)".format(t=table)]
+        rank, rank_params = "ts_rank({t}.document, to_tsquery('english', %s))".format(t=table), [match]
+    # No ORM model maps the index tables, so extra() is the only way to join them
+    return queryset.extra(
+        select={RANK_ANNOTATION: rank}, select_params=rank_params, tables=[table], where=where, params=[match],
+    ).order_by('-' + RANK_ANNOTATION, '-pk')
+
+def is_ranked(queryset):
+    # Check if a queryset carries a full-text relevance ordering
+    return RANK_ANNOTATION in queryset.query.extra
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Ranked full-text search over the model's search index.
+
+    Uses the same `?search=` parameter as DRF's SearchFilter and falls back to
+    its `search_fields` lookups on databases without a full-text index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if get_document(queryset.model) is None or not is_supported(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+        text = request.query_params.get(self.search_param, '')
+        if not tokenize(text):
+            return queryset
+        return search_queryset(queryset, text)
@@ -1,8 +1,77 @@
+from operator import attrgetter
+
 from .models import User, Organization, Opportunity, Review, Event, Application, CauseArea, Skill, userProfile, EventRegistration
-from rest_framework.serializers import ModelSerializer, PrimaryKeyRelatedField
+
+from rest_framework.fields import SkipField
+from rest_framework.relations import ManyRelatedField, PKOnlyObject
+from rest_framework.serializers import ListSerializer, ModelSerializer, PrimaryKeyRelatedField
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
+from django.db.models.manager import BaseManager
+
+from .fieldsets import SparseFieldsMixin
+from .ratings import RATING_FIELDS, rating_histogram
+from .tokens import ClaimsRefreshToken
+
+def _prefetched(name):
+    # Read a prefetched many-valued relation without building its related manager
+    def read(item):
+        try:
+            return item._prefetched_objects_cache[name]
+        except KeyError:
+            raise AttributeError(name)
+    return read
+
+class FastListSerializer(ListSerializer):
+    """
+    ListSerializer that works out once per page which fields to render and
+    how to read them, instead of per item. Fields of plain model columns are
+    read with attrgetter and prefetched relations from the prefetch cache;
+    other fields go through their get_attribute(). Datetime fields look up
+    the current timezone once per page.
+    """
 
-from django.contrib.auth.hashers import make_password
+    def to_representation(self, data):
+        child = self.child
+        if type(child).to_representation is not serializers.Serializer.to_representation:
+            return super().to_representation(data)  # The child renders items its own way
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        columns = {field.name for field in child.Meta.model._meta.concrete_fields if not field.is_relation}
+        plan, pinned = [], []
+        for field in child._readable_fields:
+            if type(field).get_attribute is serializers.Field.get_attribute and field.source in columns:
+                read = attrgetter(field.source)
+            elif type(field) is ManyRelatedField and len(field.source_attrs) == 1:
+                read = _prefetched(field.source)
+            else:
+                read = field.get_attribute
+            if isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone'):
+                field.timezone = field.default_timezone()
+                pinned.append(field)
+            plan.append((field.field_name, read, field.get_attribute, field.to_representation))
+        rows = []
+        try:
+            for item in iterable:
+                row = {}
+                for name, read, get_attribute, represent in plan:
+                    try:
+                        try:
+                            attribute = read(item)
+                        except AttributeError:
+                            attribute = get_attribute(item)  # Defaults, SkipField and relations that were not prefetched
+                    except SkipField:
+                        continue
+                    check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                    row[name] = None if check_for_none is None else represent(attribute)
+                rows.append(row)
+        finally:
+            for field in pinned:
+                del field.timezone
+        return rows
+
+# Review aggregates are maintained by main.ratings, never written by clients
+RATING_READ_ONLY_FIELDS = ['rating_count', 'rating_sum', 'rating_average'] + RATING_FIELDS
 
 # Serializer for user creation
 class user_create_serializer(ModelSerializer):
@@ -16,18 +85,30 @@ class user_create_serializer(ModelSerializer):
         user = User.objects.create(
             username=validated_data['name'],
             email=validated_data['email'],
+            password=validated_data['password'],  # Hashed by User.save()
             is_user=True,
             is_active=True
         )
-        user.set_password(validated_data['password'])
         userprofile = userProfile.objects.create(**validated_data)
         return userprofile
 
+# Serializer for token refresh, checked against the blacklist filter
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if 'refresh' in data:
+            # The token was rotated and the old one blacklisted; the access token must name the new one
+            data['access'] = str(self.token_class(data['refresh']).access_token)
+        return data
+
 # Serializer for user details (update and retrieve)
-class user_serializer(ModelSerializer):
+class user_serializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = userProfile
         fields = '__all__'
+        list_serializer_class = FastListSerializer
         extra_kwargs = {'password': {'write_only': True}}  # Ensure password is write-only
 
 # Serializer for user login
@@ -40,6 +121,7 @@ class organization_create_serializer(ModelSerializer):
     class Meta:
         model = Organization
         fields = '__all__'
+        read_only_fields = RATING_READ_ONLY_FIELDS
         extra_kwargs = {'password': {'write_only': True}, 'website': {'required': False}}  # Ensure password is write-only
 
     def create(self, validated_data):
@@ -52,32 +134,61 @@ class organization_create_serializer(ModelSerializer):
         return org
 
 # Serializer for organization details (update and retrieve)
-class organization_serializer(ModelSerializer):
+class organization_serializer(SparseFieldsMixin, ModelSerializer):
+    rating_histogram = serializers.SerializerMethodField()  # Star rating -> number of reviews
+    logo_thumbnails = serializers.SerializerMethodField()  # Size -> format -> URL, empty until rendered
+
     class Meta:
         model = Organization
         fields = '__all__'
+        list_serializer_class = FastListSerializer
+        read_only_fields = RATING_READ_ONLY_FIELDS
         extra_kwargs = {'password': {'write_only': True}}  # Ensure password is write-only
+        field_sources = {'rating_histogram': RATING_FIELDS, 'logo_thumbnails': ['logo', 'logo_thumbnails']}  # Columns the method fields read
+
+    def get_rating_histogram(self, obj):
+        return rating_histogram(obj)
+
+    def get_logo_thumbnails(self, obj):
+        if not obj.logo or obj.logo_thumbnails.get('source') != obj.logo.name:
+            return {}
+        request = self.context.get('request')
+        storage = Organization._meta.get_field('logo').storage
+        return {
+            size: {
+                image_format: request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+                for image_format, name in formats.items()
+            }
+            for size, formats in obj.logo_thumbnails['sizes'].items()
+        }
 
 # Serializer for cause areas
-class cause_area_serializer(ModelSerializer):
+class cause_area_serializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = CauseArea
         fields = '__all__'
+        list_serializer_class = FastListSerializer
 
 # Serializer for skills
-class skill_serializer(ModelSerializer):
+class skill_serializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = Skill
         fields = '__all__'
+        list_serializer_class = FastListSerializer
 
 # Serializer for opportunities
-class opportunity_serializer(ModelSerializer):
+class opportunity_serializer(SparseFieldsMixin, ModelSerializer):
     cause_area = PrimaryKeyRelatedField(queryset=CauseArea.objects.all())  # Associate with CauseArea
     skills = PrimaryKeyRelatedField(queryset=Skill.objects.all(), many=True)  # Associate with multiple Skills
+    distance_km = serializers.FloatField(read_only=True)  # Only present in ?near= radius searches
 
     class Meta:
         model = Opportunity
         fields = '__all__'
+        list_serializer_class = FastListSerializer
+        prefetch_related = ['skills']  # Fetched in one query per page by QueryPlanMixin views
+        expandable = {'organization': ('organization_serializer', False), 'cause_area': ('cause_area_serializer', False),
+                      'skills': ('skill_serializer', True)}  # ?expand= nests these instead of their ids
 
     def create(self, validated_data):
         # Create a new Opportunity instance
@@ -87,26 +198,71 @@ class opportunity_serializer(ModelSerializer):
         opportunity.skills.set(skills)  # Set multiple skills
         return opportunity
 
+# Serializer for one item of a bulk opportunity upload
+class opportunity_bulk_item_serializer(ModelSerializer):
+    # Related ids are checked against sets loaded once per batch (see context)
+    cause_area = serializers.IntegerField()
+    skills = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    class Meta:
+        model = Opportunity
+        exclude = ['organization', 'date_posted']  # Organization is taken from the URL
+
+    def validate_cause_area(self, value):
+        if value not in self.context['cause_area_ids']:
+            raise serializers.ValidationError('Invalid pk "%s" - object does not exist.' % value)
+        return value
+
+    def validate_skills(self, value):
+        missing = [pk for pk in value if pk not in self.context['skill_ids']]
+        if missing:
+            raise serializers.ValidationError('Invalid pk "%s" - object does not exist.' % missing[0])
+        return list(dict.fromkeys(value))  # Drop duplicate ids
+
 # Serializer for reviews
-class review_serializer(ModelSerializer):
+class review_serializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = Review
         fields = '__all__'
+        list_serializer_class = FastListSerializer
+        expandable = {'org': ('organization_serializer', False)}
 
 # Serializer for events
-class event_serializer(ModelSerializer):
+class event_serializer(SparseFieldsMixin, ModelSerializer):
+    distance_km = serializers.FloatField(read_only=True)  # Only present in ?near= radius searches
+
     class Meta:
         model = Event
         fields = '__all__'
+        list_serializer_class = FastListSerializer
+        read_only_fields = ['registered_count']  # Maintained by main.registrations
+        expandable = {'Organization': ('organization_serializer', False)}
 
 # Serializer for applications
-class application_serializer(ModelSerializer):
+class application_serializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = Application
         fields = '__all__'
+        list_serializer_class = FastListSerializer
+        expandable = {'user': ('user_serializer', False), 'opportunity': ('opportunity_serializer', False)}
+
+# Serializer for bulk application status changes
+class application_bulk_status_serializer(serializers.Serializer):
+    status = serializers.CharField(max_length=20)  # Target status
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=10000)
+    opportunity = serializers.IntegerField(required=False)  # Filter: applications to this opportunity
+    current_status = serializers.CharField(max_length=20, required=False)  # Filter: applications in this status
+
+    def validate(self, data):
+        has_filter = 'opportunity' in data or 'current_status' in data
+        if ('ids' in data) == has_filter:
+            raise serializers.ValidationError('Provide either ids or a filter (opportunity, current_status).')
+        return data
 
 # Serializer for event registrations
-class event_register_serializer(ModelSerializer):
+class event_register_serializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = EventRegistration
         fields = '__all__'
+        list_serializer_class = FastListSerializer
+        expandable = {'user': ('user_serializer', False), 'event': ('event_serializer', False)}
@@ -0,0 +1,105 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db import connections, transaction
+from django.db.models.functions import Now
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import blacklist, caching, images, registrations, search, tokens
+from .models import Opportunity, Organization, Event, Skill, CauseArea, User, userProfile
+
+# Keep the full-text search index in step with the indexed models
+@receiver(post_save, sender=Opportunity)
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Event)
+def update_search_index(sender, instance, using, **kwargs):
+    search.index_objects(sender, [instance], connections[using])
+
+@receiver(post_delete, sender=Opportunity)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Event)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    search.remove_objects(sender, [instance.pk], connections[using])
+
+# Render thumbnails of a newly uploaded logo in the background
+@receiver(post_save, sender=Organization)
+def schedule_logo_thumbnails(sender, instance, using, **kwargs):
+    if images.needs_thumbnails(instance):
+        images.schedule_logo_thumbnails(instance, using)
+
+# Fill seats added by raising an event's capacity
+@receiver(post_save, sender=Event)
+def promote_event_waitlist(sender, instance, created, using, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: registrations.promote_waitlist(instance.pk), using=using)
+
+# Invalidate cached listings built from these models
+@receiver(post_save, sender=Opportunity)
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Skill)
+@receiver(post_save, sender=CauseArea)
+@receiver(post_delete, sender=Opportunity)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Skill)
+@receiver(post_delete, sender=CauseArea)
+def bump_cache_generation(sender, using, **kwargs):
+    caching.bump_generation_on_commit(sender, using)
+
+# Skills are part of an opportunity's representation: touch `updated` so detail ETags (and the
+# recommendation matrix) see the change, and bump the generation for list ETags and cached lists
+@receiver(m2m_changed, sender=Opportunity.skills.through)
+def bump_opportunity_skills_generation(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # skill.opportunity_set.clear() reports no ids afterwards
+        instance._cleared_opportunity_ids = list(instance.opportunity_set.using(using).values_list('pk', flat=True))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            ids = [instance.pk]
+        elif action == 'post_clear':
+            ids = instance.__dict__.pop('_cleared_opportunity_ids', [])
+        else:
+            ids = pk_set or []
+        Opportunity.objects.using(using).filter(pk__in=ids).update(updated=Now())
+        caching.bump_generation_on_commit(Opportunity, using)
+
+# Deleting a skill drops its rows from the through table without an m2m_changed signal
+@receiver(pre_delete, sender=Skill)
+def touch_opportunities_of_deleted_skill(sender, instance, using, **kwargs):
+    if Opportunity.objects.using(using).filter(skills=instance).update(updated=Now()):
+        caching.bump_generation_on_commit(Opportunity, using)
+
+# Stop trusting token claims derived from these rows
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_claims(sender, instance, using, **kwargs):
+    tokens.invalidate_claims_on_commit([instance.pk], using)
+
+# Ownership follows the organization's name and the profile's email, so changing them also revokes the previous owner's claims
+@receiver(pre_save, sender=Organization)
+def remember_organization_owner(sender, instance, using, **kwargs):
+    if instance.pk is not None:
+        instance._stored_name = sender.objects.using(using).filter(pk=instance.pk).values_list('name', flat=True).first()
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_organization_owner_claims(sender, instance, using, **kwargs):
+    names = {instance.name, getattr(instance, '_stored_name', None)} - {None}
+    user_ids = User.objects.using(using).filter(username__in=names).values_list('id', flat=True)
+    tokens.invalidate_claims_on_commit(user_ids, using)
+
+@receiver(pre_save, sender=userProfile)
+def remember_profile_owner(sender, instance, using, **kwargs):
+    if instance.pk is not None:
+        instance._stored_email = sender.objects.using(using).filter(pk=instance.pk).values_list('email', flat=True).first()
+
+@receiver(post_save, sender=userProfile)
+@receiver(post_delete, sender=userProfile)
+def invalidate_profile_owner_claims(sender, instance, using, **kwargs):
+    emails = {instance.email, getattr(instance, '_stored_email', None)} - {None}
+    user_ids = User.objects.using(using).filter(email__in=emails).values_list('id', flat=True)
+    tokens.invalidate_claims_on_commit(user_ids, using)
+
+# Make every process's blacklist filter pick up new blacklisted tokens (the generation is kept in the database)
+@receiver(post_save, sender=BlacklistedToken)
+def bump_blacklist_generation(sender, using, **kwargs):
+    caching.bump_generation_on_commit(blacklist.BLACKLIST_LABEL, using)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}(-[a-z0-9]+)?$')  # A content hash, optionally with a variant suffix
+
+def content_hash(content):
+    # sha256 of a file's content, leaving it rewound for the next reader
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+def hashed_name(directory, digest, extension):
+    # Fan out over 256 subdirectories so no directory grows too large
+    return '%s/%s/%s%s' % (directory, digest[:2], digest, extension.lower())
+
+def name_hash(name):
+    # Content hash (plus variant) encoded in a content-addressed name, or None
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return stem if HASHED_NAME_RE.match(stem) else None
+
+def logo_upload_to(instance, filename):
+    return hashed_name('logos', content_hash(instance.logo), os.path.splitext(filename)[1])
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage where a file's name is derived from its content.
+
+    Saving content that is already stored is a no-op returning the existing
+    name, so duplicate uploads share one file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name  # The same name always means the same content
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file and rename it, so concurrent identical uploads never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                content.seek(0)
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+content_addressed_storage = ContentAddressedStorage()
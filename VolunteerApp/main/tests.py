@@ -1,3 +1,1183 @@
-from django.test import TestCase
+import collections
+import importlib
+import io
+import logging
+import math
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import caching, geo, media, metrics, ratings, recommendations, renderers, routers, tokens
+from .authentication import ClaimsJWTAuthentication, ClaimsUser
+from .blacklist import BlacklistFilter
+from .models import (Application, CacheGeneration, CauseArea, ClaimsInvalidation, Event, EventRegistration,
+                     EventWaitlistEntry, Opportunity, Organization, Review, Skill, User, userProfile)
+from .queryplans import QueryBudgetExceeded
+from .tokens import ClaimsRefreshToken
+from .views import OrganizationEventsView
+
+# Accounts created by the tests hash their passwords on save; MD5 keeps that quick
+fast_hashers = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+def setUpModule():
+    fast_hashers.enable()
+
+def tearDownModule():
+    fast_hashers.disable()
+
+# No cache entry written in the test is visible afterwards, as for a write made by another process
+NO_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'responses': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+def make_volunteer(name='volunteer', password='volunteer-password'):
+    # A volunteer account as user signup creates it
+    user = User.objects.create(username=name, email='%s@example.org' % name, is_user=True)
+    profile = userProfile.objects.create(name=name, email=user.email, password=password)
+    return user, profile
+
+def make_company(name='company'):
+    # A company account and its organization, as organization registration creates them
+    user = User.objects.create(username=name, email='%s@example.org' % name, is_company=True)
+    organization = Organization.objects.create(name=name, email=user.email, address='1 Main Road', city='Pune',
+                                               postal_code='411001', country='India', phone='1234567890',
+                                               mission='Help', description='Helps')
+    return user, organization
+
+def make_opportunity(organization, title='Beach cleanup', **kwargs):
+    cause_area = kwargs.pop('cause_area', None) or CauseArea.objects.get_or_create(title='Environment')[0]
+    fields = dict(opportunity_type='volunteer', start_date=date(2030, 1, 1), end_date=date(2030, 1, 2),
+                  location='Pune', description='Clean the beach', cause_area=cause_area)
+    fields.update(kwargs)
+    return Opportunity.objects.create(title=title, organization=organization, **fields)
+
+def api_client(user=None):
+    # Client sending an access token issued the way LoginView issues them
+    client = APIClient()
+    if user is not None:
+        client.credentials(HTTP_AUTHORIZATION='Bearer %s' % ClaimsRefreshToken.for_user(user).access_token)
+    return client
+
+class PasswordHashingTests(TestCase):
+    def test_signup_hashes_the_password(self):
+        response = api_client().post('/api/user/signup/', {'name': 'ana', 'password': 'secret-password',
+                                                           'email': 'ana@example.org'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        profile = userProfile.objects.get(name='ana')
+        user = User.objects.get(username='ana')
+        self.assertTrue(check_password('secret-password', profile.password))
+        self.assertTrue(user.check_password('secret-password'))
+
+    def test_hash_shaped_password_is_hashed(self):
+        for password in ['md5$x$y', 'pbkdf2_sha256$1000$salt$abc=']:
+            name = 'user-%d' % len(password)
+            response = api_client().post('/api/user/signup/', {'name': name, 'password': password,
+                                                               'email': '%s@example.org' % name}, format='json')
+            self.assertEqual(response.status_code, 200)
+            profile = userProfile.objects.get(name=name)
+            self.assertNotEqual(profile.password, password)
+            self.assertTrue(check_password(password, profile.password))
+            self.assertTrue(User.objects.get(username=name).check_password(password))
+
+    def test_organization_registration_hashes_the_password(self):
+        response = api_client().post('/api/organization/register/', {
+            'name': 'helpers', 'password': 'md5$x$y', 'email': 'helpers@example.org', 'address': '1 Main Road',
+            'city': 'Pune', 'postal_code': '411001', 'country': 'India', 'phone': '1234567890',
+            'mission': 'Help', 'description': 'Helps',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(check_password('md5$x$y', Organization.objects.get(name='helpers').password))
+        self.assertTrue(User.objects.get(username='helpers').check_password('md5$x$y'))
+
+    def test_profile_update_without_password_keeps_the_hash(self):
+        user, profile = make_volunteer()
+        stored = profile.password
+        response = api_client(user).put('/api/user/%d/' % profile.id, {'city': 'Delhi'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        profile.refresh_from_db()
+        self.assertEqual(profile.city, 'Delhi')
+        self.assertEqual(profile.password, stored)
+
+    def test_create_hashes_the_password(self):
+        user = User.objects.create(username='ana', email='ana@example.org', password='secret-password')
+        profile = userProfile.objects.create(name='ana', password='md5$x$y')
+        self.assertTrue(user.check_password('secret-password'))
+        self.assertTrue(check_password('md5$x$y', profile.password))
+
+    def test_save_keeps_an_unchanged_hash(self):
+        _, organization = make_company()
+        organization = Organization.objects.get(pk=organization.pk)
+        organization.password = 'secret-password'
+        organization.save()
+        stored = organization.password
+        organization = Organization.objects.get(pk=organization.pk)
+        organization.city = 'Delhi'
+        organization.save()
+        self.assertEqual(Organization.objects.get(pk=organization.pk).password, stored)
+        self.assertTrue(check_password('secret-password', stored))
+
+    def test_set_password_is_hashed_once(self):
+        user = User.objects.create(username='ana', email='ana@example.org')
+        user.set_password('secret-password')
+        user.save()
+        self.assertTrue(User.objects.get(pk=user.pk).check_password('secret-password'))
+
+    def test_profile_update_with_password_hashes_it(self):
+        user, profile = make_volunteer()
+        response = api_client(user).put('/api/user/%d/' % profile.id, {'password': 'md5$x$y'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        profile.refresh_from_db()
+        self.assertTrue(check_password('md5$x$y', profile.password))
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        self.user, _ = make_volunteer()
+        _, self.organization = make_company()
+
+    def test_save_bumps_the_generation_on_commit(self):
+        before = caching.get_generations([Organization])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization.save()
+        self.assertNotEqual(caching.get_generations([Organization]), before)
+
+    def test_write_by_another_process_invalidates_cached_lists(self):
+        client = api_client(self.user)
+        self.assertEqual(client.get('/api/organization/all/')['X-Cache'], 'MISS')
+        self.assertEqual(client.get('/api/organization/all/')['X-Cache'], 'HIT')
+        # Another worker only moves the generation in the database; this process's cache is untouched
+        Organization.objects.filter(pk=self.organization.pk).update(city='Delhi')
+        caching.bump_generation(Organization)
+        response = client.get('/api/organization/all/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['city'], 'Delhi')
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        # A process that has not synced yet
+        self.invalidations = tokens.ClaimsInvalidations()
+        self.enterContext(mock.patch.object(tokens, 'invalidations', self.invalidations))
+
+    def authenticate(self, token):
+        return ClaimsJWTAuthentication().get_user(token)
+
+    @override_settings(CLAIMS_SYNC_SECONDS=60)
+    def test_claims_are_trusted_without_queries(self):
+        user, profile = make_volunteer()
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.authenticate(token)  # The first check reads the invalidations
+        with self.assertNumQueries(0):
+            authenticated = self.authenticate(token)
+        self.assertIsInstance(authenticated, ClaimsUser)
+        self.assertEqual((authenticated.id, authenticated.is_user, authenticated.profile_id), (user.id, True, profile.id))
+
+    def test_tokens_without_claims_use_the_database(self):
+        user, _ = make_volunteer()
+        self.assertIsInstance(self.authenticate(RefreshToken.for_user(user).access_token), User)
+
+    def test_invalidated_claims_fall_back_to_the_database(self):
+        user, _ = make_volunteer()
+        token = ClaimsRefreshToken.for_user(user).access_token
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=user.pk).update(is_user=False)
+            tokens.invalidate_claims_on_commit([user.pk])
+        authenticated = self.authenticate(token)
+        self.assertIsInstance(authenticated, User)
+        self.assertFalse(authenticated.is_user)
+        self.assertIsInstance(self.authenticate(ClaimsRefreshToken.for_user(authenticated).access_token), ClaimsUser)
+
+    def test_invalidation_by_another_process_is_seen_after_the_sync_delay(self):
+        user, _ = make_volunteer()
+        token = ClaimsRefreshToken.for_user(user).access_token
+        with override_settings(CLAIMS_SYNC_SECONDS=60):
+            self.authenticate(token)
+            # Another process only writes the row
+            ClaimsInvalidation.objects.create(user_id=user.pk, invalidated_at=timezone.now())
+            self.assertIsInstance(self.authenticate(token), ClaimsUser)
+        with override_settings(CLAIMS_SYNC_SECONDS=0):
+            self.assertIsInstance(self.authenticate(token), User)
+
+    def test_revoked_owner_is_refused(self):
+        user, organization = make_company()
+        client = api_client(user)
+        self.assertEqual(client.get('/api/organization/%d/' % organization.pk).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            organization.name = 'renamed'
+            organization.save()  # The user no longer owns it
+        self.assertEqual(client.get('/api/organization/%d/' % organization.pk).status_code, 403)
+
+    def test_only_the_owner_may_change_opportunities_and_events(self):
+        user, organization = make_company()
+        other, _ = make_company('other')
+        opportunity = make_opportunity(organization)
+        event = Event.objects.create(title='Meetup', description='Meet', date=timezone.now() + timedelta(days=1),
+                                     location='Pune', Organization=organization)
+        urls = ['/api/organization/%d/opportunities/%d/' % (organization.pk, opportunity.pk),
+                '/api/organization/%d/events/%d/' % (organization.pk, event.pk)]
+        for url in urls:
+            self.assertEqual(api_client(user).get(url).status_code, 200, url)
+            self.assertEqual(api_client(other).get(url).status_code, 403, url)
+
+class BlacklistFilterTests(TestCase):
+    def test_blacklisting_by_another_process_is_seen_after_the_sync_delay(self):
+        user, _ = make_volunteer()
+        jti = ClaimsRefreshToken.for_user(user)['jti']
+        blacklist = BlacklistFilter()  # This process's filter
+        with override_settings(BLACKLIST_SYNC_SECONDS=60):
+            self.assertFalse(blacklist.is_blacklisted(jti))
+            # Another process blacklists the token; only the database and its generation change
+            with self.captureOnCommitCallbacks(execute=True):
+                BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=jti))
+            self.assertFalse(blacklist.is_blacklisted(jti))
+        with override_settings(BLACKLIST_SYNC_SECONDS=0):
+            self.assertTrue(blacklist.is_blacklisted(jti))
+
+    @override_settings(BLACKLIST_SYNC_SECONDS=60)
+    def test_checks_between_syncs_run_no_queries(self):
+        blacklist = BlacklistFilter()
+        blacklist.is_blacklisted('first')
+        with self.assertNumQueries(0):
+            self.assertFalse(blacklist.is_blacklisted('second'))
+
+    def test_blacklisted_refresh_token_is_refused(self):
+        user, _ = make_volunteer()
+        refresh = ClaimsRefreshToken.for_user(user)
+        ClaimsRefreshToken(str(refresh))
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh.blacklist()
+        with self.assertRaises(TokenError):
+            ClaimsRefreshToken(str(refresh))
+
+    def test_logout_revokes_the_access_token(self):
+        user, profile = make_volunteer()
+        refresh = ClaimsRefreshToken.for_user(user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer %s' % refresh.access_token)
+        self.assertEqual(client.get('/api/user/%d/' % profile.pk).status_code, 200)
+        client.cookies['refresh_token'], client.cookies['access_token'] = str(refresh), str(refresh.access_token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/api/user/logout/').status_code, 205)
+        self.assertEqual(client.get('/api/user/%d/' % profile.pk).status_code, 401)
+
+    def test_refresh_rotates_and_refuses_the_old_token(self):
+        user, profile = make_volunteer()
+        refresh = str(ClaimsRefreshToken.for_user(user))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer %s' % response.json()['access'])
+        self.assertEqual(client.get('/api/user/%d/' % profile.pk).status_code, 200)
+        self.assertEqual(APIClient().post('/api/token/refresh/', {'refresh': refresh}, format='json').status_code, 401)
+
+    def test_prune_tokens_deletes_expired_tokens_only(self):
+        user, _ = make_volunteer()
+        refreshes = [ClaimsRefreshToken.for_user(user) for _ in range(3)]
+        expired = [OutstandingToken.objects.get(jti=refresh['jti']) for refresh in refreshes[:2]]
+        OutstandingToken.objects.filter(pk__in=[token.pk for token in expired]).update(expires_at=timezone.now() - timedelta(seconds=1))
+        BlacklistedToken.objects.create(token=expired[0])
+        out = io.StringIO()
+        call_command('prune_tokens', batch_size=1, stdout=out)
+        self.assertIn('Pruned 2 expired tokens', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [refreshes[2]['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.volunteer, _ = make_volunteer()
+        self.company, self.organization = make_company()
+        self.skill = Skill.objects.create(name='Swimming')
+        self.opportunity = make_opportunity(self.organization)
+        self.opportunity.skills.add(self.skill)
+        # Older than anything the test writes, so every change moves `updated`
+        Opportunity.objects.filter(pk=self.opportunity.pk).update(updated=timezone.now() - timedelta(days=1))
+        self.detail = '/api/organization/%d/opportunities/%d/' % (self.organization.pk, self.opportunity.pk)
+
+    def test_unchanged_list_is_not_modified(self):
+        client = api_client(self.volunteer)
+        etag = client.get('/api/opportunities/all/')['ETag']
+        self.assertEqual(client.get('/api/opportunities/all/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(CACHES=NO_CACHES)
+    def test_write_by_another_process_changes_the_list_etag(self):
+        client = api_client(self.volunteer)
+        etag = client.get('/api/opportunities/all/')['ETag']
+        Opportunity.objects.filter(pk=self.opportunity.pk).update(title='River cleanup')
+        caching.bump_generation(Opportunity)
+        response = client.get('/api/opportunities/all/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['title'], 'River cleanup')
+
+    def test_unchanged_detail_is_not_modified(self):
+        client = api_client(self.company)
+        etag = client.get(self.detail)['ETag']
+        self.assertEqual(client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def assert_skills_change_is_seen(self, change):
+        client = api_client(self.company)
+        etag = client.get(self.detail)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['skills'], [])
+
+    def test_removing_skills_changes_the_detail_etag(self):
+        self.assert_skills_change_is_seen(lambda: self.opportunity.skills.remove(self.skill))
+
+    def test_clearing_a_skill_changes_the_detail_etag(self):
+        self.assert_skills_change_is_seen(lambda: self.skill.opportunity_set.clear())
+
+    def test_deleting_a_skill_changes_the_detail_etag(self):
+        self.assert_skills_change_is_seen(lambda: self.skill.delete())
+
+    def test_registration_changes_the_event_etags(self):
+        event = Event.objects.create(title='Meetup', description='Meet', date=timezone.now() + timedelta(days=1),
+                                     location='Pune', Organization=self.organization)
+        Event.objects.filter(pk=event.pk).update(updated=timezone.now() - timedelta(days=1))
+        company = api_client(self.company)
+        urls = ['/api/organization/%d/events/all/' % self.organization.pk,
+                '/api/organization/%d/events/%d/' % (self.organization.pk, event.pk)]
+        etags = [company.get(url)['ETag'] for url in urls]
+        self.assertEqual(api_client(self.volunteer).post('/api/events/%d/register' % event.pk).status_code, 200)
+        for url, etag in zip(urls, etags):
+            response = company.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(response.json()['registered_count'], 1)
+
+@override_settings(ENFORCE_QUERY_BUDGETS=True)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.company, self.organization = make_company()
+        for i in range(5):
+            Event.objects.create(title='Event %d' % i, description='Meet', date=timezone.now() + timedelta(days=i + 1),
+                                 location='Pune', Organization=self.organization)
+        self.url = '/api/organization/%d/events/all/' % self.organization.pk
+
+    def test_list_within_budget_passes(self):
+        _, organization = make_company('other')
+        skill = Skill.objects.create(name='Teaching')
+        for i in range(5):
+            make_opportunity(organization, 'Opportunity %d' % i).skills.add(skill)
+        client = api_client(make_volunteer()[0])
+        self.assertEqual(client.get('/api/opportunities/all/').status_code, 200)  # Skills of every row in one query
+        self.assertEqual(client.get(self.url).status_code, 200)
+
+    def test_view_over_budget_raises(self):
+        with mock.patch.object(OrganizationEventsView, 'query_budget', 1):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'OrganizationEventsView ran'):
+                api_client(self.company).get(self.url)
+
+    @override_settings(CLAIMS_SYNC_SECONDS=0, BLACKLIST_SYNC_SECONDS=0)
+    def test_filter_syncs_are_not_counted(self):
+        # A process syncing its claims invalidations and blacklist filter during the request
+        self.enterContext(mock.patch.object(tokens, 'invalidations', tokens.ClaimsInvalidations()))
+        self.enterContext(mock.patch('main.authentication.blacklist_filter', BlacklistFilter()))
+        self.assertEqual(api_client(self.company).get(self.url).status_code, 200)
+
+class SearchTests(TestCase):
+    def setUp(self):
+        _, organization = make_company()
+        make_opportunity(organization, 'Tree planting', description='Plant trees behind the beach')
+        make_opportunity(organization, 'Beach cleanup')
+        make_opportunity(organization, 'River walk', description='Walk along the river')
+        self.client = api_client(make_volunteer()[0])
+
+    def test_matches_ranked_title_first(self):
+        response = self.client.get('/api/opportunities/all/', {'search': 'beach'})
+        self.assertEqual([row['title'] for row in response.json()['results']], ['Beach cleanup', 'Tree planting'])
+
+    def test_last_term_matches_as_prefix(self):
+        response = self.client.get('/api/organization/all/', {'search': 'comp'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['company'])
+        response = self.client.get('/api/opportunities/all/', {'search': 'walk riv'})
+        self.assertEqual([row['title'] for row in response.json()['results']], ['River walk'])
+
+class GeoTests(TestCase):
+    def setUp(self):
+        _, self.organization = make_company()
+        self.client = api_client(make_volunteer()[0])
+
+    def place(self, title, latitude, longitude):
+        # An opportunity the gazetteer cannot locate, so it keeps the coordinates given
+        return make_opportunity(self.organization, title, location='Nowhere', latitude=latitude, longitude=longitude)
+
+    def nearby(self, **params):
+        response = self.client.get('/api/opportunities/all/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['title'], row['distance_km']) for row in response.json()['results']]
+
+    def test_grid_cells_split_at_cell_boundaries(self):
+        self.assertEqual(geo.grid_cell(-90, -180), 0)
+        self.assertEqual(geo.grid_cell(0.05, 0.05), geo.grid_cell(0, 0))
+        self.assertEqual(geo.grid_cell(0.15, 0), geo.grid_cell(0, 0) + geo.GRID_COLUMNS)
+        self.assertEqual(geo.grid_cell(0, 0.15), geo.grid_cell(0, 0) + 1)
+        self.assertEqual(geo.grid_cell(-0.01, 0), geo.grid_cell(0, 0) - geo.GRID_COLUMNS)
+        self.assertEqual(geo.grid_cell(0, 180), geo.grid_cell(0, -180))  # The antimeridian wraps around
+
+    def test_cell_ranges_split_at_the_antimeridian(self):
+        south, west, north, east = geo.bounding_box(0.05, 179.99, 5)
+        self.assertGreater(west, east)
+        ranges = geo.cell_ranges(south, west, north, east)
+        row = geo.grid_cell(0, 0) // geo.GRID_COLUMNS
+        self.assertIn((row * geo.GRID_COLUMNS + geo.grid_cell(0, west) % geo.GRID_COLUMNS, (row + 1) * geo.GRID_COLUMNS - 1), ranges)
+        self.assertIn((row * geo.GRID_COLUMNS, row * geo.GRID_COLUMNS + geo.grid_cell(0, east) % geo.GRID_COLUMNS), ranges)
+
+    def test_saving_a_location_fills_its_cell(self):
+        opportunity = make_opportunity(self.organization, location='Koregaon Park, Pune')
+        self.assertEqual((opportunity.latitude, opportunity.longitude), (18.5204, 73.8567))
+        self.assertEqual(opportunity.geo_cell, geo.grid_cell(18.5204, 73.8567))
+
+    def test_radius_search_filters_and_orders_by_distance(self):
+        self.place('Ten km east', 18.5, 73.5 + 10 / (geo.KM_PER_DEGREE * math.cos(math.radians(18.5))))
+        self.place('One km north', 18.5 + 1 / geo.KM_PER_DEGREE, 73.5)
+        self.place('Thirty km south', 18.5 - 30 / geo.KM_PER_DEGREE, 73.5)
+        self.place('Across a cell boundary', 18.4999, 73.4999)
+        make_opportunity(self.organization, 'Unlocated', location='Nowhere')
+
+        results = self.nearby(near='18.5,73.5', radius=20)
+        self.assertEqual([title for title, _ in results], ['Across a cell boundary', 'One km north', 'Ten km east'])
+        self.assertAlmostEqual(results[1][1], 1, places=2)
+        self.assertAlmostEqual(results[2][1], 10, places=1)
+        self.assertEqual([title for title, _ in self.nearby(near='18.5,73.5', radius=50)][-1], 'Thirty km south')
+
+    def test_radius_search_by_place_name(self):
+        make_opportunity(self.organization, 'In Pune', location='Pune')
+        make_opportunity(self.organization, 'In Mumbai', location='Mumbai')
+        self.assertEqual([title for title, _ in self.nearby(near='Poona')], ['In Pune'])
+        self.assertEqual([title for title, _ in self.nearby(near='Poona', radius=200)], ['In Pune', 'In Mumbai'])
+
+    def test_bad_radius_search_is_rejected(self):
+        for params in ({'near': 'Atlantis'}, {'near': '91,0'}, {'near': 'Pune', 'radius': 0},
+                       {'near': 'Pune', 'radius': 'far'}):
+            self.assertEqual(self.client.get('/api/opportunities/all/', params).status_code, 400)
+
+    def test_migration_cells_match_the_grid(self):
+        migration = importlib.import_module('main.migrations.0020_geo_coordinates')
+        for point in ((-90, -180), (18.5204, 73.8567), (-33.87, 151.21), (0.1, 179.99)):
+            self.assertEqual(migration.grid_cell(*point), geo.grid_cell(*point))
+        self.assertEqual(migration.geocode(migration.load_gazetteer(), 'Navi Mumbai'), geo.geocode('Navi Mumbai'))
+
+        opportunity = make_opportunity(self.organization, location='Koregaon Park, Pune')
+        Opportunity.objects.update(latitude=None, longitude=None, geo_cell=None)
+        migration.geocode_locations(django_apps, None)
+        opportunity.refresh_from_db()
+        self.assertEqual(opportunity.geo_cell, geo.grid_cell(18.5204, 73.8567))
+
+class RatingTests(TestCase):
+    def setUp(self):
+        self.author, _ = make_volunteer()
+        self.company, self.organization = make_company()
+        self.path = '/api/organization/%d/reviews/' % self.organization.pk
+
+    def aggregates(self, organization=None):
+        organization = Organization.objects.get(pk=(organization or self.organization).pk)
+        return organization.rating_count, organization.rating_sum, organization.rating_average, ratings.rating_histogram(organization)
+
+    def histogram(self, **counts):
+        return {stars: counts.get('stars_%d' % stars, 0) for stars in range(6)}
+
+    def review(self, rating, user=None, organization=None):
+        review = Review.objects.create(user=user or self.author, org=organization or self.organization, rating=rating, message='Good')
+        ratings.add_rating(review.org_id, rating)
+        return review
+
+    def test_apply_rating_keeps_the_aggregates(self):
+        for rating in (5, 4, 4):
+            ratings.apply_rating(self.organization.pk, rating, 1)
+        self.assertEqual(self.aggregates(), (3, 13, 13 / 3, self.histogram(stars_4=2, stars_5=1)))
+        ratings.apply_rating(self.organization.pk, 5, -1)
+        self.assertEqual(self.aggregates(), (2, 8, 4.0, self.histogram(stars_4=2)))
+        ratings.change_rating(self.organization.pk, 4, self.organization.pk, 0)
+        self.assertEqual(self.aggregates(), (2, 4, 2.0, self.histogram(stars_0=1, stars_4=1)))
+
+    def test_removing_never_goes_below_zero(self):
+        ratings.apply_rating(self.organization.pk, 3, -1)
+        self.assertEqual(self.aggregates(), (0, 0, 0.0, self.histogram()))
+
+    def test_rebuild_matches_the_reviews(self):
+        _, other = make_company('other')
+        self.review(5)
+        self.review(2)
+        self.review(3, organization=other)
+        expected = [self.aggregates(), self.aggregates(other)]
+        Organization.objects.update(rating_count=7, rating_sum=1, rating_average=9, rating_5=4)  # Drifted
+        call_command('rebuild_ratings', batch_size=1, stdout=io.StringIO())
+        self.assertEqual([self.aggregates(), self.aggregates(other)], expected)
+        self.assertEqual(expected[0], (2, 7, 3.5, self.histogram(stars_2=1, stars_5=1)))
+
+    def test_reviews_through_the_api_update_the_aggregates(self):
+        client = api_client(self.author)
+        self.assertEqual(client.post(self.path + 'create/', {'rating': 4, 'message': 'Good'}, format='json').status_code, 201)
+        review = Review.objects.get()
+        response = client.put(self.path + '%d/update/' % review.pk, {'rating': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.aggregates(), (1, 2, 2.0, self.histogram(stars_2=1)))
+
+    def test_only_the_author_deletes_a_review(self):
+        review = self.review(4)
+        delete = self.path + '%d/delete/' % review.pk
+        self.assertEqual(api_client(self.company).delete(delete).status_code, 403)
+        self.assertEqual(api_client(make_volunteer('other')[0]).delete(delete).status_code, 403)
+        self.assertEqual(self.aggregates()[0], 1)
+
+        self.assertEqual(api_client(self.author).delete(delete).status_code, 204)
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(self.aggregates(), (0, 0, 0.0, self.histogram()))
+        self.assertEqual(api_client(self.author).delete(delete).status_code, 404)
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        _, self.organization = make_company()
+        self.user, profile = make_volunteer()
+        userProfile.objects.filter(pk=profile.pk).update(city='Pune')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = make_opportunity(self.organization)
+        self.refresher = recommendations.MatrixRefresher()
+        self.enterContext(mock.patch.object(recommendations, 'refresher', self.refresher))
+        self.enterContext(mock.patch.object(self.refresher, 'start'))  # Refreshed by the tests instead of a thread
+        self.client = api_client(self.user)
+
+    def recommended_ids(self):
+        response = self.client.get('/api/opportunities/recommended/')
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_requests_never_build_the_matrix(self):
+        response = self.client.get('/api/opportunities/recommended/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(recommendations.REFRESH_INTERVAL))
+        self.assertIsNone(self.refresher.snapshot)
+        self.refresher.start.assert_called_once_with()
+
+        self.refresher.refresh()
+        self.assertEqual(self.recommended_ids(), [self.first.pk])
+
+    def test_serving_processes_start_the_refresher_on_first_use(self):
+        for module in ('VolunteerApp.wsgi', 'VolunteerApp.asgi'):
+            importlib.reload(importlib.import_module(module))
+        self.refresher.start.assert_not_called()
+
+    def test_refresh_publishes_a_new_snapshot(self):
+        old = self.refresher.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            second = make_opportunity(self.organization, 'Tree planting')
+        self.assertEqual(self.recommended_ids(), [self.first.pk])  # Until the next refresh
+        self.assertIs(self.refresher.refresh(), self.refresher.snapshot)
+        self.assertIsNot(self.refresher.snapshot, old)
+        self.assertEqual(sorted(self.recommended_ids()), sorted([self.first.pk, second.pk]))
+        self.assertEqual(old.row_ids.tolist(), [self.first.pk])  # Published snapshots are never changed
+        self.assertIs(self.refresher.refresh(), self.refresher.snapshot)  # Nothing new to read
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        _, organization = make_company()
+        make_opportunity(organization)
+        self.user = make_volunteer()[0]
+
+    def phases(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    @override_settings(SERVER_TIMING=True)
+    def test_middleware_reports_the_phases(self):
+        response = api_client(self.user).get('/api/opportunities/all/')
+        phases = self.phases(response)
+        self.assertEqual(set(phases), {'view', 'db', 'render', 'total'})
+        self.assertRegex(phases['db'], r'desc="[1-9]\d* queries"')
+        self.assertEqual(connections['default'].execute_wrappers, [])  # Only added while the request runs
+
+    @override_settings(SERVER_TIMING=True)
+    async def test_async_requests_report_their_queries(self):
+        client = AsyncClient()
+        token = await sync_to_async(lambda: str(ClaimsRefreshToken.for_user(self.user).access_token))()
+        response = await client.get('/api/async/opportunities/all/', headers={'Authorization': 'Bearer ' + token})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(self.phases(response)['db'], r'desc="[1-9]\d* queries"')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_and_log_line_are_opt_in(self):
+        # Off at the configured level
+        with mock.patch.object(logging.getLogger('main.requests'), 'handle') as handle:
+            response = api_client(self.user).get('/api/opportunities/all/')
+        handle.assert_not_called()
+        self.assertNotIn('Server-Timing', response)
+        with self.assertLogs('main.requests', 'DEBUG') as logs:
+            api_client(self.user).get('/api/opportunities/all/')
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].timings['status'], 200)
+
+class MetricsTests(TestCase):
+    def test_scrapes_need_the_token_or_an_internal_address(self):
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(INTERNAL_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_files_of_exited_processes_are_merged(self):
+        directory = tempfile.mkdtemp()
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        key = metrics.sample_key('api_requests_total', {'route': 'all-opportunities', 'method': 'GET', 'status': '200'})
+        for pid, count in ((exited.pid, 2), (os.getpid(), 1)):
+            values = metrics.MmapValues(os.path.join(directory, '%d.db' % pid))
+            index = values.index(key)
+            values.values[index] += count
+            values.close()
+
+        self.assertEqual(metrics.collect(directory)[key], 3)
+        self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith('.db')),
+                         ['%d.db' % os.getpid(), metrics.MERGED_FILE])
+        self.assertEqual(metrics.collect(directory)[key], 3)  # Merged once only
+
+    def test_merging_grows_the_merged_file(self):
+        directory = tempfile.mkdtemp()
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        values = metrics.MmapValues(os.path.join(directory, '%d.db' % exited.pid))
+        keys = [metrics.sample_key('api_requests_total', {'route': 'route-%d' % i}) for i in range(5000)]
+        for key in keys:
+            index = values.index(key)
+            values.values[index] += 1
+        values.close()
+        totals = metrics.collect(directory)
+        self.assertEqual([totals[key] for key in keys], [1] * len(keys))
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.company, organization = make_company()
+        opportunity = make_opportunity(organization)
+        self.path = '/api/organization/%d/opportunities/%d/applications/export/' % (organization.pk, opportunity.pk)
+
+    def test_formats(self):
+        client = api_client(self.company)
+        response = client.get(self.path, {'output': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(client.get(self.path)['Content-Type'], 'text/csv; charset=utf-8')
+
+    def test_unsupported_format_is_a_bad_request(self):
+        response = api_client(self.company).get(self.path, {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'output': ['Unknown export format, use one of: csv, ndjson']})
+
+class MediaTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+
+    def store(self, name, content=b'content'):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def test_compressed_files_are_served_as_stored(self):
+        self.store('docs/report.tar.gz')
+        response = self.client.get('/media/docs/report.tar.gz', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_precompressed_copy_for_clients_accepting_it(self):
+        digest = 'a' * 64
+        self.store('logos/aa/%s.svg' % digest, b'<svg/>')
+        self.store('logos/aa/%s.svg.gz' % digest, b'gzipped')
+        path = '/media/logos/aa/%s.svg' % digest
+
+        response = self.client.get(path, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertEqual(response['ETag'], '"%s-gzip"' % digest)
+        self.assertEqual(b''.join(response.streaming_content), b'gzipped')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        response = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['ETag'], '"%s"' % digest)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_digest_cache_is_bounded(self):
+        with mock.patch.object(media, 'DIGEST_CACHE_SIZE', 2), mock.patch.object(media, '_digests', collections.OrderedDict()):
+            for i in range(3):
+                self.store('legacy/%d.txt' % i, b'%d' % i)
+                self.assertEqual(self.client.get('/media/legacy/%d.txt' % i).status_code, 200)
+            self.assertEqual(self.client.get('/media/legacy/1.txt').status_code, 200)  # Now the most recently used
+            self.store('legacy/3.txt')
+            self.client.get('/media/legacy/3.txt')
+            self.assertEqual([os.path.basename(key[0]) for key in media._digests], ['1.txt', '3.txt'])
+
+class FeedPaginationTests(TestCase):
+    def setUp(self):
+        _, organization = make_company()
+        self.opportunities = [make_opportunity(organization, 'Opportunity %d' % i) for i in range(5)]
+        for i, opportunity in enumerate(self.opportunities):  # Newest last, whatever the clock resolution
+            Opportunity.objects.filter(pk=opportunity.pk).update(date_posted=timezone.now() - timedelta(days=10 - i))
+        self.newest_first = [opportunity.pk for opportunity in reversed(self.opportunities)]
+        self.client = api_client(make_volunteer()[0])
+
+    def walk(self, url, params):
+        ids, page = [], self.client.get(url, params).json()
+        while True:
+            self.assertNotIn('count', page)  # Cursor pages never count the table
+            ids.extend(row['id'] for row in page['results'])
+            if not page['next']:
+                return ids
+            page = self.client.get(page['next']).json()
+
+    def test_cursor_pages_walk_the_feed_newest_first(self):
+        self.assertEqual(self.walk('/api/opportunities/all/', {'limit': 2}), self.newest_first)
+
+    def test_cursor_is_stable_across_inserts(self):
+        first = self.client.get('/api/opportunities/all/', {'limit': 2}).json()
+        make_opportunity(self.opportunities[0].organization, 'Posted meanwhile')
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], self.newest_first[2:4])
+
+    def test_offset_pagination_on_request(self):
+        response = self.client.get('/api/opportunities/all/', {'pagination': 'offset', 'limit': 2, 'offset': 2}).json()
+        self.assertEqual(response['count'], 5)
+        self.assertEqual([row['id'] for row in response['results']], self.newest_first[2:4])
+        self.assertIsNotNone(response['next'])
+        self.assertIsNotNone(response['previous'])
+
+    def test_ranked_search_pages_by_offset(self):
+        response = self.client.get('/api/opportunities/all/', {'search': 'opportunity', 'limit': 2}).json()
+        self.assertEqual(response['count'], 5)
+        self.assertEqual(len(response['results']), 2)
+
+    def test_limit_is_capped(self):
+        response = self.client.get('/api/opportunities/all/', {'pagination': 'offset', 'limit': 1000})
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_events_feed_is_soonest_first(self):
+        organization = self.opportunities[0].organization
+        soon = timezone.now() + timedelta(days=1)
+        events = [Event.objects.create(title='Event %d' % i, description='Meet', date=soon + timedelta(days=3 - i),
+                                       location='Pune', Organization=organization) for i in range(3)]
+        self.assertEqual(self.walk('/api/events/all/', {'limit': 2}), [event.pk for event in reversed(events)])
+
+class OpportunityBulkCreateTests(TestCase):
+    def setUp(self):
+        self.company, self.organization = make_company()
+        self.cause_area = CauseArea.objects.create(title='Education')
+        self.skill = Skill.objects.create(name='Teaching')
+        self.client = api_client(self.company)
+        self.url = '/api/organization/%d/opportunities/bulk/' % self.organization.pk
+
+    def item(self, title, **kwargs):
+        item = {'title': title, 'opportunity_type': 'volunteer', 'start_date': '2030-01-01', 'end_date': '2030-01-02',
+                'location': 'Pune', 'description': 'Teach', 'cause_area': self.cause_area.pk, 'skills': [self.skill.pk]}
+        item.update(kwargs)
+        return item
+
+    def test_creates_every_item(self):
+        before = caching.get_generations([Opportunity])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, [self.item('Math'), self.item('Reading')], format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['created'], 2)
+        created = Opportunity.objects.filter(organization=self.organization).order_by('title')
+        self.assertEqual([opportunity.title for opportunity in created], ['Math', 'Reading'])
+        self.assertEqual(list(created[0].skills.values_list('pk', flat=True)), [self.skill.pk])
+        self.assertNotEqual(caching.get_generations([Opportunity]), before)
+
+    def test_invalid_item_rejects_the_batch(self):
+        response = self.client.post(self.url, [self.item('Math'), self.item('Reading', skills=[0])], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertFalse(Opportunity.objects.exists())
+
+    def test_partial_creates_the_valid_items(self):
+        response = self.client.post(self.url + '?partial=true', [self.item('Math'), self.item('Reading', cause_area=0)],
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual([entry['index'] for entry in body['opportunity_ids']], [0])
+        self.assertEqual([error['index'] for error in body['errors']], [1])
+
+    def test_other_organization_is_refused(self):
+        _, other = make_company('other')
+        response = self.client.post('/api/organization/%d/opportunities/bulk/' % other.pk, [self.item('Math')], format='json')
+        self.assertEqual(response.status_code, 403)
+
+class ApplicationBulkStatusTests(TestCase):
+    def setUp(self):
+        self.company, self.organization = make_company()
+        self.client = api_client(self.company)
+
+    def applications(self):
+        _, profile = make_volunteer()
+        opportunity = make_opportunity(self.organization)
+        _, other = make_company('other')
+        return (Application.objects.create(user=profile, opportunity=opportunity),
+                Application.objects.create(user=profile, opportunity=opportunity, status='accepted'),
+                Application.objects.create(user=profile, opportunity=make_opportunity(other)))
+
+    def test_status_change_by_ids(self):
+        pending, accepted, foreign = self.applications()
+        response = self.client.post('/api/organization/%d/applications/status/' % self.organization.pk,
+                                    {'status': 'accepted', 'ids': [pending.pk, accepted.pk, foreign.pk, 0]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual({key: response.json()[key] for key in ['changed', 'unchanged', 'forbidden', 'not_found']},
+                         {'changed': 1, 'unchanged': 1, 'forbidden': 1, 'not_found': 1})
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'pending')
+
+    def test_status_change_by_filter(self):
+        pending, accepted, foreign = self.applications()
+        response = self.client.post('/api/organization/%d/applications/status/' % self.organization.pk,
+                                    {'status': 'rejected', 'current_status': 'pending'}, format='json')
+        self.assertEqual(response.json()['changed'], 1)
+        self.assertEqual(Application.objects.filter(status='rejected').get(), pending)
+
+    def test_status_change_needs_ids_or_a_filter(self):
+        url = '/api/organization/%d/applications/status/' % self.organization.pk
+        self.assertEqual(self.client.post(url, {'status': 'accepted'}, format='json').status_code, 400)
+        response = self.client.post(url, {'status': 'accepted', 'ids': [1], 'current_status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        _, self.organization = make_company()
+        self.opportunity = make_opportunity(self.organization)
+        self.client = api_client(make_volunteer()[0])
+
+    def first(self, params):
+        response = self.client.get('/api/opportunities/all/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results'][0]
+
+    def test_fields_selects_keys(self):
+        self.assertEqual(self.first({'fields': 'id,title'}), {'id': self.opportunity.pk, 'title': 'Beach cleanup'})
+
+    def test_expand_nests_the_related_object(self):
+        row = self.first({'expand': 'organization'})
+        self.assertEqual(row['organization']['name'], 'company')
+        self.assertNotIn('password', row['organization'])
+        self.assertEqual(self.first({})['organization'], self.organization.pk)
+
+    def test_fields_of_an_expanded_object(self):
+        row = self.first({'fields': 'id,organization.name', 'expand': 'organization'})
+        self.assertEqual(row, {'id': self.opportunity.pk, 'organization': {'name': 'company'}})
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get('/api/opportunities/all/', {'fields': 'id,nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+        response = self.client.get('/api/opportunities/all/', {'expand': 'description'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.json())
+
+class RendererTests(TestCase):
+    data = {'text': 'caf\u00e9 \u2028 \u2029 "quoted"', 'when': datetime(2030, 1, 2, 3, 4, 5, 600000),
+            'day': date(2030, 1, 2), 'amount': Decimal('1.50'), 'items': [1, 2.5, None, True], 'nested': {'a': []}}
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_indented_output_falls_back(self):
+        indented = renderers.FastJSONRenderer().render(self.data, 'application/json; indent=4')
+        self.assertEqual(indented, JSONRenderer().render(self.data, 'application/json; indent=4'))
+        self.assertIn(b'\n    ', indented)
+
+    def test_invalid_json_body_is_a_bad_request(self):
+        company, organization = make_company()
+        response = api_client(company).post('/api/organization/%d/opportunities/bulk/' % organization.pk, '[{',
+                                            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+
+    @skipUnless(renderers.msgpack, 'msgpack is not installed')
+    def test_msgpack_round_trip(self):
+        self.assertEqual(renderers.msgpack.unpackb(renderers.MessagePackRenderer().render({'a': [1, 'b']})), {'a': [1, 'b']})
+        _, organization = make_company()
+        make_opportunity(organization)
+        client = api_client(make_volunteer()[0])
+        response = client.get('/api/opportunities/all/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(renderers.msgpack.unpackb(response.content), client.get('/api/opportunities/all/').json())
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.volunteer, _ = make_volunteer()
+        self.company, self.organization = make_company()
+        self.opportunity = make_opportunity(self.organization)
+        Review.objects.create(user=self.volunteer, org=self.organization, rating=4, message='Good')
+        self.refresh = ClaimsRefreshToken.for_user(self.volunteer)
+        self.token = str(self.refresh.access_token)
+
+    async def get(self, path, token=None):
+        headers = {'Authorization': 'Bearer %s' % token} if token else {}
+        return await self.async_client.get('/api/async/' + path, headers=headers)
+
+    async def test_lists_match_the_sync_views(self):
+        for path in ('opportunities/all/', 'organization/all/', 'organization/%d/reviews/' % self.organization.pk):
+            response = await self.get(path, self.token)
+            self.assertEqual(response.status_code, 200)
+            sync = await sync_to_async(lambda: api_client(self.volunteer).get('/api/' + path))()
+            self.assertEqual(response.json()['results'], sync.json()['results'])
+
+    async def test_authentication_and_permissions(self):
+        response = await self.get('opportunities/all/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        company_token = await sync_to_async(lambda: str(ClaimsRefreshToken.for_user(self.company).access_token))()
+        self.assertEqual((await self.get('opportunities/all/', company_token)).status_code, 403)
+        self.assertEqual((await self.get('opportunities/all/', 'not-a-token')).status_code, 401)
+
+    async def test_revoked_access_token_is_refused(self):
+        self.assertEqual((await self.get('opportunities/all/', self.token)).status_code, 200)
+        await sync_to_async(self.refresh.blacklist)()
+        self.assertEqual((await self.get('opportunities/all/', self.token)).status_code, 401)
+
+    async def test_database_fallback_checks_the_password_hash(self):
+        # A token without claims loads the user, and is refused once the password changes
+        self.enterContext(mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True))
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.volunteer).access_token))()
+        self.assertEqual((await self.get('opportunities/all/', token)).status_code, 200)
+        self.volunteer.set_password('changed-password')
+        await self.volunteer.asave()
+        response = await self.get('opportunities/all/', token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'password_changed')
+
+class CommandTests(TestCase):
+    def test_generate_data(self):
+        out = io.StringIO()
+        call_command('generate_data', organizations=2, volunteers=5, opportunities=10, events=4, applications=8,
+                     reviews=6, registrations=6, partitions=2, stdout=out)
+        self.assertIn('Generated', out.getvalue())
+        self.assertEqual(Organization.objects.count(), 2)
+        self.assertEqual(userProfile.objects.count(), 5)
+        self.assertEqual(Opportunity.objects.count(), 10)
+        self.assertEqual(Event.objects.count(), 4)
+        self.assertEqual(Review.objects.count(), 6)
+        # Aggregates that bulk inserts skip are rebuilt
+        self.assertEqual(sum(Organization.objects.values_list('rating_count', flat=True)), 6)
+
+    def test_advise_indexes(self):
+        _, organization = make_company()
+        make_opportunity(organization)
+        out = io.StringIO()
+        call_command('advise_indexes', stdout=out)
+        self.assertRegex(out.getvalue(), r'\d+ of [1-9]\d* combinations have full scans or sorts')
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Routing against two SQLite databases: the test database as the primary
+    and a file copied from it as a replica that is never updated again, so
+    reads that reach it see the data as of the copy.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test runner has set up its databases, which never include the replica
+        cls.replica_path = os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')
+        connections.settings['replica1'] = dict(connections.settings['default'], NAME=cls.replica_path)
+        cls.databases = cls.databases | {'replica1'}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+
+    def setUp(self):
+        self.volunteer, _ = make_volunteer()
+        self.company, self.organization = make_company()
+        self.opportunity = make_opportunity(self.organization)
+        self.detail = '/api/organization/%d/opportunities/%d/' % (self.organization.pk, self.opportunity.pk)
+
+        # Written long enough ago for lists to read it from a replica; copy the primary into the replica file
+        CacheGeneration.objects.update(bumped_at=timezone.now() - timedelta(minutes=10))
+        connections['replica1'].close()
+        connections['default'].ensure_connection()
+        with sqlite3.connect(self.replica_path) as replica:
+            connections['default'].connection.backup(replica)
+        # Pins go to a file cache, which worker processes on one host share
+        pins = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()}
+        self.enterContext(override_settings(DATABASE_REPLICA_WEIGHTS={'replica1': 1}, REPLICA_PIN_SECONDS=60,
+                                            REPLICA_MAX_LAG_SECONDS=5, REPLICA_LAG_CHECK_SECONDS=0,
+                                            CACHES=dict(settings.CACHES, pins=pins), REPLICA_PIN_CACHE_ALIAS='pins'))
+        self.enterContext(mock.patch.object(routers, 'lag', routers.ReplicaLag()))
+        caching.get_cache().clear()
+
+    def run_request(self, client, method, path, **kwargs):
+        # Make a request and count its queries per database alias
+        counts = collections.Counter()
+
+        def counter(alias):
+            def wrapper(execute, sql, params, many, context):
+                counts[alias] += 1
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for alias in ('default', 'replica1'):
+                stack.enter_context(connections[alias].execute_wrapper(counter(alias)))
+            response = getattr(client, method)(path, **kwargs)
+        return response, counts
+
+    def rename_on_primary(self, title):
+        # A write the replica never receives; it bumps no generation, so the replica is not seen as lagging
+        Opportunity.objects.filter(pk=self.opportunity.pk).update(title=title)
+
+    def test_replicas_need_a_shared_pin_cache(self):
+        with override_settings(REPLICA_PIN_CACHE_ALIAS='responses'):
+            with self.assertRaises(ImproperlyConfigured):
+                routers.ReplicaPinMiddleware(lambda request: None)
+        with override_settings(DATABASE_REPLICA_WEIGHTS={}, REPLICA_PIN_CACHE_ALIAS='responses'):
+            routers.ReplicaPinMiddleware(lambda request: None)
+
+    def test_reads_go_to_the_replica(self):
+        self.rename_on_primary('River cleanup')
+        response, counts = self.run_request(api_client(self.volunteer), 'get', '/api/opportunities/all/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(counts['replica1'], 0)
+        self.assertEqual(response.json()['results'][0]['title'], 'Beach cleanup')
+
+    def test_writer_reads_its_writes_from_the_primary(self):
+        client = api_client(self.company)
+        response, counts = self.run_request(client, 'patch', self.detail, data={'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(counts['replica1'], 0)
+        client.cookies.clear()  # Pinned through its credentials as well, as for API clients
+        response, counts = self.run_request(client, 'get', self.detail)
+        self.assertEqual(response.json()['title'], 'Renamed')
+        self.assertEqual(counts['replica1'], 0)
+
+    def test_lists_read_recently_bumped_data_from_the_primary(self):
+        client = api_client(self.volunteer)
+        self.rename_on_primary('River cleanup')
+        caching.bump_generation(Opportunity)
+        response, counts = self.run_request(client, 'get', '/api/opportunities/all/')
+        self.assertEqual(response.json()['results'][0]['title'], 'River cleanup')
+        etag = response['ETag']
+        self.assertEqual(client.get('/api/opportunities/all/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_lagging_sqlite_replica_is_skipped(self):
+        caching.bump_generation(Opportunity)
+        CacheGeneration.objects.filter(label='main.opportunity').update(bumped_at=timezone.now() - timedelta(minutes=1))
+        self.assertGreaterEqual(routers.lag.measure('replica1'), 59)
+        self.assertIsNone(routers.choose_replica({'replica1': 1}))
+        self.rename_on_primary('River cleanup')
+        response = api_client(self.volunteer).get('/api/opportunities/all/')
+        self.assertEqual(response.json()['results'][0]['title'], 'River cleanup')
+
+    def test_replicas_are_picked_by_weight(self):
+        with mock.patch.object(routers.lag, 'is_healthy', return_value=True):
+            picks = collections.Counter(routers.choose_replica({'replica1': 3, 'replica2': 1}) for _ in range(4000))
+        self.assertAlmostEqual(picks['replica1'] / 4000.0, 0.75, delta=0.05)
+
+class EventRegistrationConcurrencyTests(TransactionTestCase):
+    """
+    Registrations and cancellations sent from several threads at once, each
+    with its own database connection, as from concurrent workers.
+    """
+
+    def setUp(self):
+        _, organization = make_company()
+        self.event = Event.objects.create(title='Popular event', description='Limited seats', date=timezone.now(),
+                                          location='Pune', Organization=organization, capacity=3)
+        self.path = '/api/events/%d/register' % self.event.pk
+        self.volunteers = [make_volunteer('volunteer%d' % i) for i in range(12)]
+        self.clients = {profile.pk: api_client(user) for user, profile in self.volunteers}
+
+    def send(self, method, profile_ids):
+        # One request per profile, released together from one thread each; returns the status codes
+        barrier = threading.Barrier(len(profile_ids))
+        statuses = []
+
+        def worker(profile_id):
+            barrier.wait()
+            try:
+                statuses.append(getattr(self.clients[profile_id], method)(self.path).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(profile_id,)) for profile_id in profile_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def registered(self):
+        return set(EventRegistration.objects.filter(event=self.event).values_list('user_id', flat=True))
+
+    def waitlisted(self):
+        return list(EventWaitlistEntry.objects.filter(event=self.event).order_by('joined_at', 'id').values_list('user_id', flat=True))
+
+    def assertConsistent(self):
+        self.event.refresh_from_db()
+        self.assertLessEqual(len(self.registered()), self.event.capacity)
+        self.assertEqual(self.event.registered_count, len(self.registered()))
+
+    def test_capacity_is_never_exceeded(self):
+        profile_ids = [profile.pk for _, profile in self.volunteers]
+        statuses = self.send('post', profile_ids)
+        self.assertEqual(statuses, [200] * 3 + [202] * 9)
+        self.assertConsistent()
+        self.assertEqual(len(self.registered()), 3)
+        self.assertEqual(set(self.waitlisted()), set(profile_ids) - self.registered())
+
+    def test_waitlist_is_promoted_in_order(self):
+        profile_ids = [profile.pk for _, profile in self.volunteers]
+        for profile_id in profile_ids:
+            self.clients[profile_id].post(self.path)
+        self.assertEqual(self.waitlisted(), profile_ids[3:])
+
+        statuses = self.send('delete', profile_ids[:2])
+        self.assertEqual(statuses, [204, 204])
+        self.assertConsistent()
+        self.assertEqual(self.registered(), {profile_ids[2]} | set(profile_ids[3:5]))
+        self.assertEqual(self.waitlisted(), profile_ids[5:])
+
+        # Leaving the waitlist frees no seat and keeps the others' places
+        self.assertEqual(self.clients[profile_ids[6]].delete(self.path).status_code, 204)
+        self.assertEqual(self.clients[profile_ids[2]].delete(self.path).status_code, 204)
+        self.assertEqual(self.registered(), set(profile_ids[3:6]))
+        self.assertEqual(self.waitlisted(), profile_ids[7:])
+        self.assertConsistent()
+
+    def test_concurrent_registrations_and_cancellations(self):
+        profile_ids = [profile.pk for _, profile in self.volunteers]
+        for profile_id in profile_ids[:6]:
+            self.clients[profile_id].post(self.path)
+        statuses = self.send('delete', profile_ids[:3]) + self.send('post', profile_ids[6:])
+        self.assertEqual(statuses.count(204), 3)
+        self.assertConsistent()
+        self.assertEqual(self.registered() & set(profile_ids[:6]), set(profile_ids[3:6]))
+        self.assertEqual(len(self.waitlisted()), 6)
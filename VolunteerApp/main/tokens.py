@@ -0,0 +1,131 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import blacklist_filter
+from .models import ClaimsInvalidation, Organization, userProfile
+from .queryplans import unbudgeted
+
+# Claims copied from the user into every token issued by LoginView
+ROLE_CLAIMS = ['username', 'email', 'is_user', 'is_company']
+CLAIMS_AT_CLAIM = 'claims_at'  # Unix time the claims were read at
+REFRESH_JTI_CLAIM = 'refresh_jti'  # Refresh token an access token was derived from
+
+COMMIT_SKEW = timedelta(minutes=1)  # Re-read this far back to catch rows committed out of order
+
+class ClaimsInvalidations:
+    """
+    Per-process copy of the recent ClaimsInvalidation rows.
+
+    Claims read before their user's last invalidation are not trusted. The
+    rows are re-read at most every CLAIMS_SYNC_SECONDS, so a change made by
+    another process is seen within that delay without a query per request.
+    Rows older than the access token lifetime can no longer affect a valid
+    token and are forgotten.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invalidated = {}  # User id -> unix time of the last invalidation
+        self.synced_at = None
+        self.checked = float('-inf')
+
+    def sync(self):
+        interval = getattr(settings, 'CLAIMS_SYNC_SECONDS', 1)
+        if time.monotonic() - self.checked < interval:
+            return
+        with self._lock, unbudgeted():
+            if time.monotonic() - self.checked < interval:
+                return  # Synced by another thread meanwhile
+            now = timezone.now()
+            horizon = now - api_settings.ACCESS_TOKEN_LIFETIME
+            since = max(horizon, self.synced_at - COMMIT_SKEW) if self.synced_at else horizon
+            rows = ClaimsInvalidation.objects.using(DEFAULT_DB_ALIAS).filter(invalidated_at__gte=since)
+            for user_id, invalidated_at in rows.values_list('user_id', 'invalidated_at'):
+                self._record(user_id, invalidated_at.timestamp())
+            self.invalidated = {user_id: at for user_id, at in self.invalidated.items() if at >= horizon.timestamp()}
+            self.synced_at = now
+            self.checked = time.monotonic()
+
+    def _record(self, user_id, at):
+        self.invalidated[user_id] = max(at, self.invalidated.get(user_id, at))
+
+    def record(self, user_id, at):
+        # An invalidation committed by this process applies here at once
+        with self._lock:
+            self._record(user_id, at)
+
+    def are_current(self, user_id, claims_at):
+        self.sync()
+        invalidated_at = self.invalidated.get(int(user_id))
+        return invalidated_at is None or claims_at > invalidated_at
+
+invalidations = ClaimsInvalidations()
+
+def has_current_claims(token):
+    # Whether the token's role and ownership claims are still true
+    claims_at = token.get(CLAIMS_AT_CLAIM)
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    return claims_at is not None and user_id is not None and invalidations.are_current(user_id, claims_at)
+
+def invalidate_claims(user_ids, using=None):
+    """
+    Stop trusting the role/ownership claims of every token issued to these
+    users. The tokens stay valid but are authenticated against the database
+    until the users log in again and receive fresh claims.
+    """
+    now = timezone.now()
+    rows = [ClaimsInvalidation(user_id=user_id, invalidated_at=now) for user_id in user_ids]
+    ClaimsInvalidation.objects.using(using or DEFAULT_DB_ALIAS).bulk_create(
+        rows, update_conflicts=True, unique_fields=['user_id'], update_fields=['invalidated_at'])
+    for row in rows:
+        invalidations.record(row.user_id, now.timestamp())
+
+def invalidate_claims_on_commit(user_ids, using=None):
+    # Invalidate once the write is visible, so a login racing it reads the new data or is not trusted
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_claims(user_ids, using), using=using)
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying role flags and owned object ids. Access tokens
+    derived from it inherit the same claims and name it in `refresh_jti`, so
+    blacklisting it (logout) revokes them too. Blacklist checks go through
+    the in-memory blacklist filter.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[CLAIMS_AT_CLAIM] = time.time()  # Before reading them, so an invalidation committed meanwhile wins
+        for claim in ROLE_CLAIMS:
+            token[claim] = getattr(user, claim)
+        # Ownership mirrors the checks the views used to run per request
+        token['organization_id'] = Organization.objects.filter(name=user.username).values_list('id', flat=True).first()
+        token['profile_id'] = userProfile.objects.filter(email=user.email).values_list('id', flat=True).first()
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        access[REFRESH_JTI_CLAIM] = self.payload[api_settings.JTI_CLAIM]
+        return access
+
+    # Only tokens the filter cannot rule out are looked up in the blacklist table
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
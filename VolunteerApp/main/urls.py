@@ -6,15 +6,17 @@ from .views import (
     UserSignUpView,UserReadUpdateDeleteView,
     LoginView,LogoutView,
     OrganizationRegisterView,OrganizationListView,OrganizationReadUpdateDeleteView,
-    AllOpportunitiesView,OpportunityCreateView,ApplicationsForOpportunityView,OpportunityReadUpdateDeleteView,
+    AllOpportunitiesView,OpportunityCreateView,OpportunityBulkCreateView,ApplicationsForOpportunityView,OpportunityReadUpdateDeleteView,
     OrganizationOpportunitiesView,
     OrganizationReviews,CreateReviewView,UpdateReviewView,DeleteReviewView,
     OrganizationEventsView,EventsView,CreateEventView,EventDetailView,
-    ApplicationUpdateView,ApplicationDeleteView,ApplicationReadView,ApplicationCreateView,
-    EventRegistrationView,EventAttendeesListView
+    ApplicationUpdateView,ApplicationBulkStatusView,ApplicationDeleteView,ApplicationReadView,ApplicationCreateView,
+    EventRegistrationView,EventAttendeesListView,RecommendationsView,
+    ApplicationsExportView,EventAttendeesExportView
 )
 
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.views import TokenRefreshView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
@@ -37,6 +39,7 @@ urlpatterns = [
     path('user/login/',LoginView.as_view(),name="user-login"),
     path('user/<int:pk>/', UserReadUpdateDeleteView.as_view(), name='user-detail-update-delete'),
     path('user/logout/', LogoutView.as_view(), name='user-logout'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),  # Rotates the refresh token, see ClaimsTokenRefreshSerializer
 
     path('organization/register/',OrganizationRegisterView.as_view(),name="organization-register"),
     path('organization/login/',LoginView.as_view(),name="organization-login"),
@@ -46,6 +49,7 @@ urlpatterns = [
 
     path('organization/<int:org_id>/opportunities/all',OrganizationOpportunitiesView.as_view(),name="organization-opportunities"),
     path('organization/<int:org_id>/opportunities/create/',OpportunityCreateView.as_view(),name="opportunity-create"),
+    path('organization/<int:org_id>/opportunities/bulk/',OpportunityBulkCreateView.as_view(),name="opportunity-bulk-create"),
     path('organization/<int:org_id>/opportunities/<int:opp_id>/',OpportunityReadUpdateDeleteView.as_view(),name="opportunity-detail-update-delete"),
 
     path(
@@ -53,6 +57,11 @@ urlpatterns = [
         ApplicationsForOpportunityView.as_view(),
         name="opportunity-applications"
     ),
+    path(
+        'organization/<int:org_id>/opportunities/<int:opp_id>/applications/export/',
+        ApplicationsExportView.as_view(),
+        name="opportunity-applications-export"
+    ),
     path(
         'organization/<int:org_id>/opportunities/<int:opp_id>/applications/create/',
         ApplicationCreateView.as_view(),
@@ -74,7 +83,14 @@ urlpatterns = [
         name="application-delete"
     ),
 
+    path(
+        'organization/<int:org_id>/applications/status/',
+        ApplicationBulkStatusView.as_view(),
+        name="application-bulk-status"
+    ),
+
     path('opportunities/all/',AllOpportunitiesView.as_view(),name="all-opportunities"),
+    path('opportunities/recommended/',RecommendationsView.as_view(),name="recommended-opportunities"),
 
     path('organization/<int:org_id>/reviews/',OrganizationReviews.as_view(),name="organization-reviews"),
     path('organization/<int:org_id>/reviews/create/',CreateReviewView.as_view(),name="review-create"),
@@ -87,7 +103,8 @@ urlpatterns = [
     path('organization/<int:org_id>/events/create/',CreateEventView.as_view(),name="event-create"),
     path('organization/<int:org_id>/events/<int:pk>/',EventDetailView.as_view(),name="event-detail-update-delete"),
     path('organization/<int:org_id>/events/<int:event_id>/',EventAttendeesListView.as_view(),name="event-attendees-list"),
-    path('events/int:<event_id>/register',EventRegistrationView.as_view(),name="event-register"),
+    path('organization/<int:org_id>/events/<int:event_id>/attendees/export/',EventAttendeesExportView.as_view(),name="event-attendees-export"),
+    path('events/<int:event_id>/register',EventRegistrationView.as_view(),name="event-register"),
 
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='swagger-schema'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='redoc'),
@@ -2,6 +2,8 @@ from django.shortcuts import render
 
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import login, authenticate, logout
+from django.db import transaction
+from django.db.models.functions import Now
 
 from rest_framework.response import Response
 
@@ -12,19 +14,29 @@ from rest_framework import status, permissions
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 
-from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 
-from .permissions import IsCompany, IsUser
+from .permissions import IsCompany, IsUser, IsOrganizationOwner, IsProfileOwner, owns_organization
+from .tokens import ClaimsRefreshToken
+from .pagination import OpportunityCursorPagination, EventCursorPagination
+from .search import FullTextSearchFilter
+from .geo import NearbyFilter
+from .queryplans import QueryPlanMixin
+from .caching import CachedListMixin, bump_generation_on_commit
+from .conditional import ConditionalListMixin, ConditionalRetrieveMixin
+from .exports import EXPORT_FORMATS, export_response
+from . import ratings, recommendations, registrations, search
 from .models import *
 from .serializers import (LoginSerializer, user_create_serializer, user_serializer, 
                           organization_create_serializer, organization_serializer, 
                           opportunity_serializer, cause_area_serializer, 
                           skill_serializer, event_serializer, review_serializer, 
-                          application_serializer, event_register_serializer)
+                          application_serializer, event_register_serializer,
+                          opportunity_bulk_item_serializer, application_bulk_status_serializer)
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -62,7 +74,7 @@ class LoginView(CreateAPIView):
         if user is None:
             return Response({'detail': 'User not Found with this email'}, status=status.HTTP_400_BAD_REQUEST)  # Return error if user not found
 
-        refresh = RefreshToken.for_user(user)  # Create refresh token for the user
+        refresh = ClaimsRefreshToken.for_user(user)  # Create refresh token carrying role and ownership claims
 
         response = Response()
         response.data = {
@@ -86,15 +98,12 @@ class LoginView(CreateAPIView):
         return response
 
 class UserReadUpdateDeleteView(APIView):
-    permission_classes = [IsAuthenticated, IsUser]
+    permission_classes = [IsAuthenticated, IsUser, IsProfileOwner]
 
     # Retrieve user profile object
     def get_object(self, request, pk):
         try:
-            profile = userProfile.objects.get(pk=pk)  # Get the profile by primary key
-            if profile.email != request.user.email:
-                raise PermissionDenied(detail="You do not have permission to access this user's data.")  # Check if user has access
-            return profile
+            return userProfile.objects.get(pk=pk)  # Get the profile by primary key, ownership is checked by IsProfileOwner
         except userProfile.DoesNotExist:
             raise NotFound(detail="User not found")  # Handle profile not found
 
@@ -144,7 +153,7 @@ class LogoutView(APIView):
         if not refresh_token or not access_token:
             return Response({'detail': 'Tokens are required in cookies'}, status=status.HTTP_400_BAD_REQUEST)  # Check if tokens are present
 
-        token = RefreshToken(refresh_token)
+        token = ClaimsRefreshToken(refresh_token)
         token.blacklist()  # Blacklist the refresh token
 
         response = Response({'detail': 'Successfully logged out'}, status=status.HTTP_205_RESET_CONTENT)
@@ -169,30 +178,23 @@ class OrganizationRegisterView(CreateAPIView):
             },
             status=status.HTTP_200_OK)
 
-class OrganizationListView(ListAPIView):
+class OrganizationListView(ConditionalListMixin, CachedListMixin, QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsUser]
+    query_budget = 4  # auth, cache generations, count, page
+    cache_models = [Organization]  # Cached responses are dropped when these change
     queryset = Organization.objects.all()  # List all organizations
     serializer_class = organization_serializer
-    filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
-    ordering_fields = ['name']  # Allow ordering by name
-    search_fields = ['=city', '^name', '^address']  # Enable searching
+    filter_backends = [FullTextSearchFilter, DjangoFilterBackend, OrderingFilter]
+    ordering_fields = ['name', 'rating_average', 'rating_count']  # Allow ordering by name and stored rating aggregates
+    search_fields = ['=city', '^name', '^address']  # Fallback when full-text search is unavailable
     filterset_fields = ['city']  # Allow filtering by city
 
-class OrganizationReadUpdateDeleteView(RetrieveUpdateDestroyAPIView):
+class OrganizationReadUpdateDeleteView(ConditionalRetrieveMixin, RetrieveUpdateDestroyAPIView):
     queryset = Organization.objects.all()
-    permission_classes = [IsAuthenticated, IsCompany]
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
+    organization_kwarg = 'pk'  # The organization is addressed by its primary key here
     serializer_class = organization_serializer
 
-    # Retrieve organization object
-    def get_object(self):
-        organization = super().get_object()
-        try:
-            if organization.name != self.request.user.username:
-                raise PermissionDenied(detail="You do not have permission to access this company's data.")  # Check permission
-            return organization
-        except Organization.DoesNotExist:
-            raise NotFound(detail="Company not found")  # Handle organization not found
-
     # Update organization details
     def put(self, request):
         organization = self.get_object()
@@ -216,37 +218,32 @@ class OrganizationReadUpdateDeleteView(RetrieveUpdateDestroyAPIView):
             user.delete()  # Delete the user
         return Response({'message': 'Deleted'}, status=status.HTTP_204_NO_CONTENT)
 
-class AllOpportunitiesView(ListAPIView):
+class AllOpportunitiesView(ConditionalListMixin, CachedListMixin, QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsUser]
+    query_budget = 8  # auth, cache generations, filter lookups (organization, cause_area, skills), count (offset mode only), page, skills
+    cache_models = [Opportunity, Organization, Skill, CauseArea]  # Cached responses are dropped when these change
     queryset = Opportunity.objects.all()  # List all opportunities
     serializer_class = opportunity_serializer
-    filter_backends = [SearchFilter, DjangoFilterBackend]
-    search_fields = ['location']  # Enable searching by location
+    pagination_class = OpportunityCursorPagination  # Keyset pagination, ?pagination=offset for old clients
+    filter_backends = [FullTextSearchFilter, DjangoFilterBackend, NearbyFilter]  # ?near=<lat>,<lng>|<place>&radius=<km>
+    search_fields = ['location']  # Fallback when full-text search is unavailable
     filterset_fields = ['location', 'organization', 'cause_area', 'skills', 'status']  # Allow filtering
 
-class OrganizationOpportunitiesView(ListAPIView):
+class OrganizationOpportunitiesView(QueryPlanMixin, ListAPIView):
     serializer_class = opportunity_serializer
-    permission_classes = [IsAuthenticated, IsCompany]
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
+    query_budget = 5  # auth and ownership (tokens without current claims only), count, page, skills
     
     # Retrieve opportunities for a specific organization
     def get_queryset(self):
-        org_id = self.kwargs.get('org_id')
-        request = self.request
-        org = Organization.objects.filter(id=org_id).first()
-        if org.name != request.user.username:
-            raise PermissionDenied(detail="You do not have permission to access this company's data")  # Check permission
-        opportunities = Opportunity.objects.filter(organization=org_id)
-        return opportunities
+        return Opportunity.objects.filter(organization=self.kwargs.get('org_id'))
 
 class OpportunityCreateView(CreateAPIView):
-    permission_classes = [IsAuthenticated, IsCompany]
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
     serializer_class = opportunity_serializer
 
     # Create a new opportunity
     def post(self, request, org_id):
-        org = Organization.objects.get(id=org_id)
-        if org.name != request.user.username:
-            raise PermissionDenied(detail="You do not have permission to create opportunities for this company")  # Check permission
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)  # Validate input data
         serializer.save()  # Save the opportunity
@@ -257,26 +254,182 @@ class OpportunityCreateView(CreateAPIView):
             },
             status=status.HTTP_200_OK)
 
-class OpportunityReadUpdateDeleteView(RetrieveUpdateDestroyAPIView):
+class OpportunityBulkCreateView(CreateAPIView):
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
+    serializer_class = opportunity_bulk_item_serializer
+    max_batch_size = 1000
+
+    @swagger_auto_schema(
+        request_body=opportunity_bulk_item_serializer(many=True),
+        manual_parameters=[
+            openapi.Parameter('partial', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description='Create the valid items even if some items are invalid'),
+        ],
+    )
+    # Create many opportunities in one transaction
+    def post(self, request, org_id):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non-empty list of opportunities'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_batch_size:
+            return Response({'detail': 'At most %d opportunities per request' % self.max_batch_size}, status=status.HTTP_400_BAD_REQUEST)
+        allow_partial = request.query_params.get('partial', '').lower() in ('1', 'true', 'yes')
+
+        # Load every referenced cause area and skill in two queries
+        cause_area_ids, skill_ids = set(), set()
+        for item in items:
+            if isinstance(item, dict):
+                cause_area_ids.update(_int_ids([item.get('cause_area')]))
+                if isinstance(item.get('skills'), list):
+                    skill_ids.update(_int_ids(item['skills']))
+        context = self.get_serializer_context()
+        context['cause_area_ids'] = set(CauseArea.objects.filter(id__in=cause_area_ids).values_list('id', flat=True))
+        context['skill_ids'] = set(Skill.objects.filter(id__in=skill_ids).values_list('id', flat=True))
+
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer_class()(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        if errors and not allow_partial:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        opportunities, skill_lists = [], []
+        for index, data in valid:
+            data = dict(data)
+            skill_lists.append(data.pop('skills', []))
+            cause_area = data.pop('cause_area')
+            opportunity = Opportunity(organization_id=org_id, cause_area_id=cause_area, **data)
+            opportunity.fill_coordinates()  # bulk_create skips save()
+            opportunities.append(opportunity)
+
+        with transaction.atomic():
+            Opportunity.objects.bulk_create(opportunities)
+            Opportunity.skills.through.objects.bulk_create([
+                Opportunity.skills.through(opportunity_id=opportunity.id, skill_id=skill_id)
+                for opportunity, skills in zip(opportunities, skill_lists)
+                for skill_id in skills
+            ])
+            search.index_objects(Opportunity, opportunities)  # bulk_create sends no save signals
+            bump_generation_on_commit(Opportunity)
+
+        return Response(
+            {
+                'message': 'Opportunities created successfully',
+                'created': len(opportunities),
+                'opportunity_ids': [{'index': index, 'id': opportunity.id} for (index, _), opportunity in zip(valid, opportunities)],
+                'errors': errors,
+            },
+            status=status.HTTP_201_CREATED)
+
+def _profile_id(request):
+    # Find the requesting user's profile (from the token claim when there is one)
+    profile_id = getattr(request.user, 'profile_id', None)
+    if profile_id is None:
+        profile_id = userProfile.objects.filter(email=request.user.email).values_list('id', flat=True).first()
+    if profile_id is None:
+        raise NotFound(detail="User profile not found")
+    return profile_id
+
+def _int_ids(values):
+    # Keep only values usable as primary keys
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+class OpportunityReadUpdateDeleteView(ConditionalRetrieveMixin, QueryPlanMixin, RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated, IsCompany]
     serializer_class = opportunity_serializer
+    select_related = ['organization']  # Needed by the permission check
 
     # Retrieve opportunity object
     def get_object(self):
         opp_id = self.kwargs.get('opp_id')
-        opportunity = Opportunity.objects.get(id=opp_id)
-        if opportunity.organization.name != self.request.user.username:
+        opportunity = self.plan_queryset(Opportunity.objects.all()).get(id=opp_id)
+        if not owns_organization(self.request.user, opportunity.organization):
             raise PermissionDenied(detail="You do not have permission to update this opportunity")  # Check permission
         return opportunity
 
-class ApplicationsForOpportunityView(ListAPIView):
+class RecommendationsView(APIView):
+    permission_classes = [IsAuthenticated, IsUser]
+    default_limit = 20
+    max_limit = 100
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Number of recommendations (max 100)'),
+        ],
+    )
+    # Recommend open opportunities from the user's applications, registrations and city
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        scored = recommendations.recommend(_profile_id(request), k=2 * limit)  # Spare rows for deleted opportunities
+        if scored is None:
+            return Response({'detail': 'Recommendations are not ready yet, try again shortly'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': str(recommendations.REFRESH_INTERVAL)})
+        opportunities = Opportunity.objects.filter(id__in=[opportunity_id for opportunity_id, _ in scored], status='open')
+        by_id = {opportunity.id: opportunity for opportunity in opportunities.prefetch_related('skills')}
+        results = []
+        for opportunity_id, score in scored:
+            if opportunity_id in by_id and len(results) < limit:
+                data = opportunity_serializer(by_id[opportunity_id]).data
+                data['score'] = round(score, 4)
+                results.append(data)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+class ApplicationsForOpportunityView(QueryPlanMixin, ListAPIView):
     serializer_class = application_serializer
+    query_budget = 3  # auth, count, page
 
     # Retrieve applications for a specific opportunity
     def get_queryset(self):
         opp_id = self.kwargs.get('opp_id')
         return Application.objects.filter(opportunity=opp_id)
 
+class ExportView(APIView):
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
+    format_query_param = 'output'  # `format` is taken by DRF's content negotiation
+
+    # Read the requested export format
+    def get_export_format(self, request):
+        export_format = request.query_params.get(self.format_query_param, 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({self.format_query_param: ["Unknown export format, use one of: %s" % ', '.join(EXPORT_FORMATS)]})
+        return export_format
+
+class ApplicationsExportView(ExportView):
+    fields = [
+        'id', 'status', 'created_at', 'opportunity_id',
+        'user__id', 'user__name', 'user__email', 'user__phone_number', 'user__city', 'user__country',
+    ]
+
+    # Stream every application for an opportunity with the applicant's profile
+    def get(self, request, org_id, opp_id):
+        export_format = self.get_export_format(request)
+        queryset = Application.objects.filter(opportunity_id=opp_id, opportunity__organization_id=org_id).order_by('id')
+        return export_response(queryset, self.fields, export_format, 'opportunity-%s-applications' % opp_id)
+
+class EventAttendeesExportView(ExportView):
+    fields = [
+        'id', 'register_at', 'event_id',
+        'user__id', 'user__name', 'user__email', 'user__phone_number', 'user__city', 'user__country',
+    ]
+
+    # Stream every registration for an event with the attendee's profile
+    def get(self, request, org_id, event_id):
+        export_format = self.get_export_format(request)
+        queryset = EventRegistration.objects.filter(event_id=event_id, event__Organization_id=org_id).order_by('id')
+        return export_response(queryset, self.fields, export_format, 'event-%s-attendees' % event_id)
+
 class ApplicationCreateView(CreateAPIView):
     serializer_class = application_serializer
     permission_classes = [IsAuthenticated, IsUser]
@@ -297,15 +450,15 @@ class ApplicationReadView(RetrieveAPIView):
     serializer_class = application_serializer
     permission_classes = [IsAuthenticated, IsCompany]
 
-class ApplicationUpdateView(UpdateAPIView):
-    permission_classes = [IsAuthenticated, IsCompany]
+class ApplicationUpdateView(QueryPlanMixin, UpdateAPIView):
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
     serializer_class = application_serializer
 
     # Update application details
     def put(self, request, org_id, opp_id, app_id):
-        application = Application.objects.get(id=app_id)
-        if application.opportunity.organization.name != request.user.username:
-            raise PermissionDenied(detail="You do not have permission to update this application")  # Check permission
+        application = self.plan_queryset(Application.objects.all()).filter(opportunity__organization_id=org_id, id=app_id).first()
+        if application is None:
+            raise PermissionDenied(detail="You do not have permission to update this application")  # Not one of this company's applications
         serializer = self.get_serializer(application, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()  # Save the updated application
@@ -313,6 +466,48 @@ class ApplicationUpdateView(UpdateAPIView):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ApplicationBulkStatusView(CreateAPIView):
+    permission_classes = [IsAuthenticated, IsCompany, IsOrganizationOwner]
+    serializer_class = application_bulk_status_serializer
+
+    # Move many applications to one status
+    def post(self, request, org_id):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)  # Validate input data
+        data = serializer.validated_data
+        target = data['status']
+
+        owned = Application.objects.filter(opportunity__organization_id=org_id)
+        if 'ids' in data:
+            ids = set(data['ids'])
+            # One join tells which applications belong to this organization
+            rows = Application.objects.filter(id__in=ids).values_list('id', 'status', 'opportunity__organization_id')
+            allowed = {app_id for app_id, _, owner in rows if owner == org_id}
+            unchanged = sum(1 for app_id, app_status, owner in rows if owner == org_id and app_status == target)
+            forbidden = len(rows) - len(allowed)
+            not_found = len(ids) - len(rows)
+            with transaction.atomic():
+                changed = owned.filter(id__in=allowed).exclude(status=target).update(status=target, updated=Now())
+        else:
+            if 'opportunity' in data:
+                owned = owned.filter(opportunity_id=data['opportunity'])
+            if 'current_status' in data:
+                owned = owned.filter(status=data['current_status'])
+            forbidden = not_found = 0
+            with transaction.atomic():
+                unchanged = owned.filter(status=target).count()
+                changed = owned.exclude(status=target).update(status=target, updated=Now())
+
+        return Response(
+            {
+                'detail': 'Application statuses updated',
+                'changed': changed,
+                'unchanged': unchanged,
+                'forbidden': forbidden,
+                'not_found': not_found,
+            },
+            status=status.HTTP_200_OK)
+
 class ApplicationDeleteView(DestroyAPIView):
     queryset = Application.objects.all()
     serializer_class = application_serializer
@@ -323,9 +518,10 @@ class ApplicationDeleteView(DestroyAPIView):
         response = super().delete(request, *args, **kwargs)
         return Response({'detail': 'Application successfully deleted'}, status=status.HTTP_204_NO_CONTENT)
 
-class OrganizationReviews(ListAPIView):
+class OrganizationReviews(QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = review_serializer
+    query_budget = 3  # auth, count, page
 
     # Retrieve reviews for a specific organization
     def get_queryset(self):
@@ -342,7 +538,9 @@ class CreateReviewView(CreateAPIView):
         request.data["user"] = request.user.id  # Associate review with the user
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()  # Save the review
+            with transaction.atomic():
+                review = serializer.save()  # Save the review
+                ratings.add_rating(review.org_id, review.rating)  # Update the organization's aggregates
             return Response({'detail': 'Review added successfully'}, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -354,41 +552,55 @@ class UpdateReviewView(UpdateAPIView):
 
     # Update an existing review
     def put(self, request, org_id, pk):
-        review = Review.objects.get(id=pk)
-        if review.user != request.user.id:
-            raise PermissionDenied(detail="You do not have permission to update this review")  # Check permission
-        serializer = self.get_serializer(review, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()  # Save the updated review
-            return Response({'detail': 'Review updated successfully'}, status=status.HTTP_201_CREATED)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            review = Review.objects.select_for_update().get(id=pk)
+            if review.user_id != request.user.id:
+                raise PermissionDenied(detail="You do not have permission to update this review")  # Check permission
+            old_org_id, old_rating = review.org_id, review.rating
+            serializer = self.get_serializer(review, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            review = serializer.save()  # Save the updated review
+            ratings.change_rating(old_org_id, old_rating, review.org_id, review.rating)  # Move the rating between aggregates
+        return Response({'detail': 'Review updated successfully'}, status=status.HTTP_201_CREATED)
 
 class DeleteReviewView(DestroyAPIView):
     queryset = Review.objects.all()
     serializer_class = review_serializer
-    permission_classes = [IsAuthenticated, IsUser, IsCompany]
+    permission_classes = [IsAuthenticated, IsUser]  # Reviews are written by users, so only their author may delete one
 
     # Delete a review
     def delete(self, request, *args, **kwargs):
         response = super().delete(request, *args, **kwargs)
         return Response({'detail': 'Review successfully deleted'}, status=status.HTTP_204_NO_CONTENT)
 
-class OrganizationEventsView(ListAPIView):
+    # Remove the review's rating from its organization in the same transaction
+    def perform_destroy(self, instance):
+        if instance.user_id != self.request.user.id:
+            raise PermissionDenied(detail="You do not have permission to delete this review")  # Check permission
+        with transaction.atomic():
+            deleted, _ = instance.delete()
+            if deleted:  # Not already deleted by a concurrent request
+                ratings.remove_rating(instance.org_id, instance.rating)
+
+class OrganizationEventsView(ConditionalListMixin, QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = event_serializer
+    query_budget = 4  # auth, validator (row count and latest update), count, page
 
     # Retrieve events for a specific organization
     def get_queryset(self):
         org_id = self.kwargs['org_id']
         return Event.objects.filter(Organization=org_id)
 
-class EventsView(ListAPIView):
+class EventsView(QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsUser]
+    query_budget = 4  # auth, Organization filter lookup, count (offset mode only), page
     queryset = Event.objects.all()
     serializer_class = event_serializer
-    filter_backends = [SearchFilter, DjangoFilterBackend]
-    search_fields = ['location']  # Enable searching by location
+    pagination_class = EventCursorPagination  # Keyset pagination, ?pagination=offset for old clients
+    filter_backends = [FullTextSearchFilter, DjangoFilterBackend, NearbyFilter]  # ?near=<lat>,<lng>|<place>&radius=<km>
+    search_fields = ['location']  # Fallback when full-text search is unavailable
     filterset_fields = ['location', 'Organization', 'date']  # Allow filtering
 
 class CreateEventView(CreateAPIView):
@@ -405,45 +617,48 @@ class CreateEventView(CreateAPIView):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UpdateEventView(UpdateAPIView):
+class UpdateEventView(QueryPlanMixin, UpdateAPIView):
     permission_classes = [IsAuthenticated, IsCompany]
     serializer_class = event_serializer
+    select_related = ['Organization']  # Needed by the permission check
 
     # Update event details
     def get_object(self):
         pk = self.kwargs.get('pk')
-        event = Event.objects.get(id=pk)
-        if event.Organization.name != self.request.user.username:
+        event = self.plan_queryset(Event.objects.all()).get(id=pk)
+        if not owns_organization(self.request.user, event.Organization):
             raise PermissionDenied(detail="You do not have permission to update this event")  # Check permission
         return event
 
-class EventDetailView(RetrieveUpdateDestroyAPIView):
+class EventDetailView(ConditionalRetrieveMixin, QueryPlanMixin, RetrieveUpdateDestroyAPIView):
     queryset = Event.objects.all()
     serializer_class = event_serializer
-    permission_classes = [IsAuthenticated, IsUser, IsCompany]
+    permission_classes = [IsAuthenticated, IsCompany]
+    select_related = ['Organization']  # Needed by the permission check
 
     # Retrieve or update event details
     def get_object(self):
         event = super().get_object()
-        if event.Organization.name != self.request.user.username:
+        if not owns_organization(self.request.user, event.Organization):
             raise PermissionDenied(detail="You do not have permission to update this event")  # Check permission
         return event
 
     def put(self, request, *args, **kwargs):
-        response = super().put(self, request, *args, **kwargs)
+        response = super().put(request, *args, **kwargs)
         return Response({'detail': 'Event updated successfully'}, status=status.HTTP_204_NO_CONTENT)
 
     def patch(self, request, *args, **kwargs):
-        response = super().patch(self, request, *args, **kwargs)
+        response = super().patch(request, *args, **kwargs)
         return Response({'detail': 'Event updated successfully'}, status=status.HTTP_204_NO_CONTENT)
 
     def delete(self, request, *args, **kwargs):
         response = super().delete(request, *args, **kwargs)
         return Response({'detail': 'Event deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
-class EventAttendeesListView(ListAPIView):
+class EventAttendeesListView(QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsCompany]
     serializer_class = user_serializer
+    query_budget = 3  # auth, count, page
 
     # Retrieve attendees for a specific event
     def get_queryset(self):
@@ -455,14 +670,22 @@ class EventRegistrationView(CreateAPIView):
     serializer_class = event_register_serializer
     permission_classes = [IsAuthenticated, IsUser]
 
-    # Register a user for an event
+    # Register a user for an event, or waitlist them when it is full
     def post(self, request, event_id):
-        email = request.user.email
-        userprofile = userProfile.objects.filter(email=email).first()
-        serializer = event_register_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)  # Validate input data
-        entity = serializer.save(commit=False)
-        entity.user = userprofile.id  # Associate registration with the user
-        entity.event = event_id  # Associate registration with the event
-        entity.save()  # Save the registration
-        return Response({'detail': 'Successfully Registered'}, status=status.HTTP_200_OK)
+        try:
+            outcome = registrations.register(event_id, _profile_id(request))
+        except Event.DoesNotExist:
+            raise NotFound(detail="Event not found")
+        if outcome == registrations.REGISTERED:
+            return Response({'detail': 'Successfully Registered'}, status=status.HTTP_200_OK)
+        if outcome == registrations.WAITLISTED:
+            return Response({'detail': 'Event is full, added to the waitlist'}, status=status.HTTP_202_ACCEPTED)
+        if outcome == registrations.ALREADY_WAITLISTED:
+            return Response({'detail': 'Already on the waitlist for this event'}, status=status.HTTP_409_CONFLICT)
+        return Response({'detail': 'Already registered for this event'}, status=status.HTTP_409_CONFLICT)
+
+    # Cancel a registration or waitlist entry, promoting waitlisted users into the freed seat
+    def delete(self, request, event_id):
+        if not registrations.cancel(event_id, _profile_id(request)):
+            raise NotFound(detail="Not registered for this event")
+        return Response({'detail': 'Registration cancelled'}, status=status.HTTP_204_NO_CONTENT)